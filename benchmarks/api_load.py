@@ -0,0 +1,408 @@
+import argparse
+import asyncio
+import json
+import platform
+import random
+import re
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from uuid import uuid4
+
+from benchmarks.common import percentile, run_worker
+
+DEFAULT_CONCURRENCY_LEVELS = [1, 10, 50]
+DEFAULT_REGRESSION_THRESHOLD = 0.1
+# Latency percentiles of rarely picked operations are too noisy to compare below this many requests
+MIN_COMPARED_REQUESTS = 50
+# Concurrent runs interleave differently each time (principal cache misses, lazy stats rebuilds), so statement
+# counts drift slightly; an N+1 regression adds at least one statement per request
+QUERY_COUNT_TOLERANCE = 0.25
+TASK_BATCH_SIZE = 500
+SEARCH_WORDS = ["report", "invoice", "garden", "meeting", "groceries", "review", "holiday", "budget"]
+STATUSES = ["not_started", "in_progress", "done"]
+SERVER_TIMING_STATEMENTS = re.compile(r'db;[^,]*desc="(\d+) statements"')
+
+# Relative weights of each operation. read_heavy approximates the app's traffic: clients page through and
+# search their tasks far more often than they change them.
+MIXES = {
+    "read_heavy": {
+        "list_tasks": 30,
+        "list_tasks_filtered": 10,
+        "read_task": 15,
+        "search_tasks": 10,
+        "task_stats": 5,
+        "list_categories": 10,
+        "read_category": 3,
+        "read_user": 5,
+        "create_task": 5,
+        "update_task": 4,
+        "delete_task": 1,
+        "update_category": 1,
+        "update_user": 0.5,
+        "login": 0.5,
+    },
+    "write_heavy": {
+        "list_tasks": 15,
+        "read_task": 10,
+        "search_tasks": 5,
+        "list_categories": 5,
+        "create_task": 25,
+        "update_task": 25,
+        "delete_task": 10,
+        "update_category": 3,
+        "update_user": 1,
+        "login": 1,
+    },
+    "auth": {"login": 60, "read_user": 30, "update_user": 10},
+}
+
+
+@dataclass
+class BenchmarkUser:
+    id: str
+    email: str
+    password: str
+    headers: dict[str, str]
+    task_ids: list[str] = field(default_factory=list)
+    category_ids: list[str] = field(default_factory=list)
+
+
+def _task_create(rng: random.Random, number: int, category_ids: list[str]) -> dict:
+    words = rng.sample(SEARCH_WORDS, 2)
+    due_date = date.today() + timedelta(days=rng.randint(-14, 30)) if rng.random() < 0.6 else None
+    return {
+        "name": f"{words[0].capitalize()} {number}",
+        "description": f"Benchmark task about the {words[0]} and the {words[1]}",
+        "due_date": due_date.isoformat() if due_date else None,
+        "status": rng.choice(STATUSES),
+        "category_ids": rng.sample(category_ids, min(len(category_ids), rng.randint(0, 2))),
+    }
+
+
+async def seed(client, args: argparse.Namespace, rng: random.Random) -> list[BenchmarkUser]:
+    # Emails are unique per run so the same server can be benchmarked repeatedly; the shape of the data only
+    # depends on --seed
+    run_id = uuid4().hex[:8]
+    users = []
+    for user_number in range(args.users):
+        email = f"benchmark-{run_id}-{user_number}@example.com"
+        password = f"benchmark-{user_number}"
+        signup_response = await client.post("/users", json={"email": email, "password": password})
+        signup_response.raise_for_status()
+        signup = signup_response.json()
+        user = BenchmarkUser(
+            id=signup["id"],
+            email=email,
+            password=password,
+            headers={"Authorization": f"Bearer {signup['access_token']}"},
+        )
+        for category_number in range(args.categories):
+            category_create = {"name": f"Category {category_number}", "colour": rng.randint(0, 0xFFFFFF)}
+            response = await client.post("/categories", json=category_create, headers=user.headers)
+            response.raise_for_status()
+        categories_response = await client.get("/categories", headers=user.headers)
+        user.category_ids = [category["id"] for category in categories_response.json()]
+
+        task_creates = [_task_create(rng, number, user.category_ids) for number in range(args.tasks)]
+        for batch_start in range(0, len(task_creates), TASK_BATCH_SIZE):
+            batch = task_creates[batch_start : batch_start + TASK_BATCH_SIZE]
+            response = await client.post("/tasks/batch", json=batch, headers=user.headers)
+            response.raise_for_status()
+            user.task_ids.extend(result["task_id"] for result in response.json() if result["task_id"])
+        users.append(user)
+    return users
+
+
+async def _request(client, operation: str, user: BenchmarkUser, rng: random.Random):
+    if operation == "list_tasks":
+        return await client.get("/tasks", params={"limit": 50}, headers=user.headers)
+    if operation == "list_tasks_filtered":
+        params = {"status": rng.choice(STATUSES), "sort": "name", "limit": 50}
+        return await client.get("/tasks", params=params, headers=user.headers)
+    if operation == "read_task":
+        return await client.get(f"/tasks/{rng.choice(user.task_ids)}", headers=user.headers)
+    if operation == "search_tasks":
+        return await client.get("/tasks/search", params={"q": rng.choice(SEARCH_WORDS)}, headers=user.headers)
+    if operation == "task_stats":
+        return await client.get("/tasks/stats", headers=user.headers)
+    if operation == "create_task":
+        response = await client.post("/tasks", json=_task_create(rng, 0, user.category_ids), headers=user.headers)
+        if response.status_code == 200:
+            user.task_ids.append(response.json()["id"])
+        return response
+    if operation == "update_task":
+        task_update = {"status": rng.choice(STATUSES), "name": f"Updated {rng.randint(0, 9999)}"}
+        return await client.patch(f"/tasks/{rng.choice(user.task_ids)}", json=task_update, headers=user.headers)
+    if operation == "delete_task":
+        # Removed before the request is sent so no concurrent operation picks the same task
+        task_id = user.task_ids.pop(rng.randrange(len(user.task_ids)))
+        return await client.delete(f"/tasks/{task_id}", headers=user.headers)
+    if operation == "list_categories":
+        return await client.get("/categories", headers=user.headers)
+    if operation == "read_category":
+        return await client.get(f"/categories/{rng.choice(user.category_ids)}", headers=user.headers)
+    if operation == "update_category":
+        category_update = {"colour": rng.randint(0, 0xFFFFFF)}
+        return await client.patch(
+            f"/categories/{rng.choice(user.category_ids)}", json=category_update, headers=user.headers
+        )
+    if operation == "read_user":
+        return await client.get("/users", headers=user.headers)
+    if operation == "update_user":
+        user_update = {"first_name": f"Bench{rng.randint(0, 9999)}"}
+        return await client.patch(f"/users/{user.id}", json=user_update, headers=user.headers)
+    if operation == "login":
+        return await client.post("/auth/login", data={"username": user.email, "password": user.password})
+    raise ValueError(f"Unknown operation {operation}")
+
+
+def _choose_operation(rng: random.Random, mix: dict[str, float], user: BenchmarkUser) -> str:
+    operations = list(mix)
+    operation = rng.choices(operations, weights=[mix[operation] for operation in operations])[0]
+    # Keep at least one task per user so task reads always have a target
+    if operation == "delete_task" and len(user.task_ids) <= 1:
+        return "create_task"
+    if operation in ("read_task", "update_task") and not user.task_ids:
+        return "create_task"
+    return operation
+
+
+def _summarise(samples: list[tuple[float, int, int | None]], elapsed: float) -> dict:
+    latencies = sorted(latency for latency, _, _ in samples)
+    statements = [statement_count for _, _, statement_count in samples if statement_count is not None]
+    status_codes: dict[str, int] = {}
+    for _, status_code, _ in samples:
+        status_codes[str(status_code)] = status_codes.get(str(status_code), 0) + 1
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for _, status_code, _ in samples if status_code >= 400),
+        "status_codes": status_codes,
+        "requests_per_second": round(len(samples) / elapsed, 1),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        # Counted by the server and reported in its Server-Timing header; None if the header is disabled
+        "queries_per_request": round(sum(statements) / len(statements), 2) if statements else None,
+    }
+
+
+async def run_level(client, users: list[BenchmarkUser], mix: dict[str, float], concurrency: int, args) -> dict:
+    rng = random.Random(f"{args.seed}-{concurrency}")
+    samples: dict[str, list[tuple[float, int, int | None]]] = {}
+    remaining = args.warmup + args.requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            warmup = remaining >= args.requests
+            user = rng.choice(users)
+            operation = _choose_operation(rng, mix, user)
+            started_at = time.perf_counter()
+            response = await _request(client, operation, user, rng)
+            latency = time.perf_counter() - started_at
+            if warmup:
+                continue
+            match = SERVER_TIMING_STATEMENTS.search(response.headers.get("server-timing", ""))
+            statement_count = int(match.group(1)) if match else None
+            samples.setdefault(operation, []).append((latency, response.status_code, statement_count))
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started_at
+
+    all_samples = [sample for operation_samples in samples.values() for sample in operation_samples]
+    return {
+        "overall": _summarise(all_samples, elapsed),
+        "operations": {
+            operation: _summarise(operation_samples, elapsed)
+            for operation, operation_samples in sorted(samples.items())
+        },
+    }
+
+
+async def run_benchmark(client, args: argparse.Namespace) -> dict:
+    rng = random.Random(args.seed)
+    users = await seed(client, args, rng)
+    mix = MIXES[args.mix]
+    return {
+        str(concurrency): await run_level(client, users, mix, concurrency, args) for concurrency in args.concurrency
+    }
+
+
+async def _run_in_process(args: argparse.Namespace) -> dict:
+    import httpx
+
+    from tasks_backend.app import app
+    from tasks_backend.db import get_engine
+    from tasks_backend.migrations import upgrade
+
+    upgrade(get_engine())
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        return await run_benchmark(client, args)
+
+
+async def _run_over_http(args: argparse.Namespace) -> dict:
+    import httpx
+
+    limits = httpx.Limits(max_connections=max(args.concurrency))
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=None) as client:
+        return await run_benchmark(client, args)
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _worker_args(args: argparse.Namespace) -> list[str]:
+    return [
+        f"--mix={args.mix}",
+        f"--users={args.users}",
+        f"--tasks={args.tasks}",
+        f"--categories={args.categories}",
+        f"--requests={args.requests}",
+        f"--warmup={args.warmup}",
+        f"--seed={args.seed}",
+        f"--concurrency={','.join(str(concurrency) for concurrency in args.concurrency)}",
+    ]
+
+
+def run(args: argparse.Namespace):
+    if args.worker:
+        print(json.dumps(asyncio.run(_run_in_process(args))))
+        return
+
+    if args.base_url:
+        results = asyncio.run(_run_over_http(args))
+    else:
+        env_overrides = {"DB_MODE": args.db_mode, "BCRYPT_ROUNDS": str(args.bcrypt_rounds)}
+        results = run_worker("benchmarks.api_load", ["run", *_worker_args(args)], env_overrides, db_url=args.db_url)
+
+    report = {
+        "meta": {
+            "target": args.base_url or "in-process",
+            "db_mode": None if args.base_url else args.db_mode,
+            "db_url": None if args.base_url else args.db_url or "temporary sqlite",
+            "mix": args.mix,
+            "users": args.users,
+            "tasks_per_user": args.tasks,
+            "categories_per_user": args.categories,
+            "requests": args.requests,
+            "seed": args.seed,
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+    print(output)
+
+
+def _change(baseline: float, candidate: float) -> float:
+    return (candidate - baseline) / baseline if baseline else 0.0
+
+
+def _format_queries(stats: dict) -> str:
+    return "-" if stats["queries_per_request"] is None else str(stats["queries_per_request"])
+
+
+def compare(args: argparse.Namespace):
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)["results"]
+    with open(args.candidate) as candidate_file:
+        candidate = json.load(candidate_file)["results"]
+
+    regressions = []
+    print(f"{'concurrency':>11}  {'operation':<20} {'p95 ms':>17} {'req/s':>17} {'queries':>13}")
+    for concurrency, baseline_level in baseline.items():
+        candidate_level = candidate.get(concurrency)
+        if candidate_level is None:
+            continue
+        rows = [("overall", baseline_level["overall"], candidate_level["overall"])]
+        rows.extend(
+            (operation, baseline_stats, candidate_level["operations"][operation])
+            for operation, baseline_stats in baseline_level["operations"].items()
+            if operation in candidate_level["operations"]
+        )
+        for operation, before, after in rows:
+            flags = []
+            p95_change = _change(before["p95_ms"], after["p95_ms"])
+            enough_requests = min(before["requests"], after["requests"]) >= MIN_COMPARED_REQUESTS
+            if enough_requests and p95_change > args.threshold:
+                flags.append(f"p95 +{p95_change:.0%}")
+            throughput_change = _change(before["requests_per_second"], after["requests_per_second"])
+            if operation == "overall" and throughput_change < -args.threshold:
+                flags.append(f"throughput {throughput_change:.0%}")
+            before_queries = before["queries_per_request"] or 0
+            if (after["queries_per_request"] or 0) > before_queries + QUERY_COUNT_TOLERANCE:
+                flags.append("more queries")
+            if after["errors"] > before["errors"]:
+                flags.append("more errors")
+            print(
+                f"{concurrency:>11}  {operation:<20} "
+                f"{before['p95_ms']:>8} → {after['p95_ms']:<6} "
+                f"{before['requests_per_second']:>8} → {after['requests_per_second']:<6} "
+                f"{_format_queries(before):>5} → {_format_queries(after):<5}"
+                f"{'  REGRESSION: ' + ', '.join(flags) if flags else ''}"
+            )
+            if flags:
+                regressions.append((concurrency, operation, flags))
+
+    if regressions:
+        print(f"{len(regressions)} regression(s) above the {args.threshold:.0%} threshold")
+        sys.exit(1)
+    print("No regressions")
+
+
+def _concurrency_levels(value: str) -> list[int]:
+    return [int(level) for level in value.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seeded load test of the API routes, with run comparison.")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Seed a database, drive a request mix and report latencies")
+    run_parser.add_argument("--mix", choices=sorted(MIXES), default="read_heavy")
+    run_parser.add_argument("--users", type=int, default=10)
+    run_parser.add_argument("--tasks", type=int, default=200, help="Tasks seeded per user")
+    run_parser.add_argument("--categories", type=int, default=3, help="Categories seeded per user on top of defaults")
+    run_parser.add_argument("--requests", type=int, default=2000, help="Measured requests per concurrency level")
+    run_parser.add_argument("--warmup", type=int, default=100, help="Unmeasured requests per concurrency level")
+    run_parser.add_argument("--concurrency", type=_concurrency_levels, default=DEFAULT_CONCURRENCY_LEVELS)
+    run_parser.add_argument("--seed", type=int, default=1)
+    run_parser.add_argument("--base-url", help="Benchmark a running server (e.g. http://localhost:8000 from run.py)")
+    run_parser.add_argument("--db-url", help="In-process database (defaults to a temporary SQLite file)")
+    run_parser.add_argument("--db-mode", choices=["async", "sync"], default="async")
+    run_parser.add_argument("--bcrypt-rounds", type=int, default=4, help="In-process only; keeps signup cheap")
+    run_parser.add_argument("--output", help="Write the JSON report to this file")
+
+    compare_parser = subparsers.add_parser("compare", help="Flag regressions between two saved reports")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_REGRESSION_THRESHOLD)
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    else:
+        compare(args)
+
+
+if __name__ == "__main__":
+    main()
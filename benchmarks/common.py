@@ -0,0 +1,24 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+
+def run_worker(module: str, worker_args: list[str], env_overrides: dict[str, str], db_url: str | None = None) -> dict:
+    with tempfile.TemporaryDirectory() as temp_dir:
+        env = {
+            **os.environ,
+            "DB_URL": db_url or f"sqlite:///{temp_dir}/benchmark.db",
+            "JWT_SECRET_KEY": os.environ.get("JWT_SECRET_KEY", "benchmark-secret-key-benchmark-secret-key"),
+            "SCHEMA_CHECK_ON_STARTUP": "False",
+            **env_overrides,
+        }
+        command = [sys.executable, "-m", module, "--worker", *worker_args]
+        completed_process = subprocess.run(command, env=env, capture_output=True, text=True, check=True)
+    return json.loads(completed_process.stdout.strip().splitlines()[-1])
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, int(len(sorted_values) * fraction + 0.5) - 1))
+    return sorted_values[index]
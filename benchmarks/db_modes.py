@@ -0,0 +1,76 @@
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.common import percentile, run_worker
+
+DB_MODES = ["sync", "async"]
+
+
+async def _run_worker(requests: int, concurrency: int, tasks: int):
+    import httpx
+
+    from tasks_backend.app import app
+    from tasks_backend.db import get_engine
+    from tasks_backend.migrations import upgrade
+
+    upgrade(get_engine())
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        signup_response = await client.post("/users", json={"email": "benchmark@example.com", "password": "benchmark"})
+        headers = {"Authorization": f"Bearer {signup_response.json()['access_token']}"}
+        category_id = (await client.get("/categories", headers=headers)).json()[0]["id"]
+        for task_number in range(tasks):
+            task_create = {"name": f"Task {task_number}", "category_ids": [category_id]}
+            await client.post("/tasks", json=task_create, headers=headers)
+
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def read_tasks():
+            async with semaphore:
+                started_at = time.perf_counter()
+                response = await client.get("/tasks", headers=headers)
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started_at)
+
+        started_at = time.perf_counter()
+        await asyncio.gather(*(read_tasks() for _ in range(requests)))
+        elapsed = time.perf_counter() - started_at
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "requests_per_second": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+def _run_mode(db_mode: str, args: argparse.Namespace) -> dict:
+    worker_args = [f"--requests={args.requests}", f"--concurrency={args.concurrency}", f"--tasks={args.tasks}"]
+    return run_worker("benchmarks.db_modes", worker_args, {"DB_MODE": db_mode}, db_url=args.db_url)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare GET /tasks throughput of the sync and async DB modes.")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--tasks", type=int, default=20, help="Tasks seeded for the benchmark user")
+    parser.add_argument("--db-url", help="Database to benchmark against (defaults to a temporary SQLite file)")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = asyncio.run(_run_worker(args.requests, args.concurrency, args.tasks))
+        print(json.dumps(result))
+        return
+
+    results = {db_mode: _run_mode(db_mode, args) for db_mode in DB_MODES}
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
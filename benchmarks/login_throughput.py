@@ -0,0 +1,81 @@
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.common import percentile, run_worker
+
+POOL_SIZES = [1, 2, 4, 8]
+
+
+async def _run_worker(logins: int, concurrency: int):
+    import httpx
+
+    from tasks_backend.app import app
+    from tasks_backend.db import get_engine
+    from tasks_backend.migrations import upgrade
+
+    upgrade(get_engine())
+    credentials = {"username": "benchmark@example.com", "password": "benchmark"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        await client.post("/users", json={"email": credentials["username"], "password": credentials["password"]})
+
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+        status_codes: dict[int, int] = {}
+
+        async def login():
+            async with semaphore:
+                started_at = time.perf_counter()
+                response = await client.post("/auth/login", data=credentials)
+                status_codes[response.status_code] = status_codes.get(response.status_code, 0) + 1
+                if response.status_code == 200:
+                    latencies.append(time.perf_counter() - started_at)
+
+        started_at = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(logins)))
+        elapsed = time.perf_counter() - started_at
+
+    latencies.sort()
+    return {
+        "logins": logins,
+        "concurrency": concurrency,
+        "status_codes": status_codes,
+        "successful_logins_per_second": round(status_codes.get(200, 0) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure /auth/login throughput against the password hashing pool size."
+    )
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--pool-sizes", type=int, nargs="+", default=POOL_SIZES)
+    parser.add_argument("--queue-limit", type=int, default=16)
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt cost factor")
+    parser.add_argument("--db-url", help="Database to benchmark against (defaults to a temporary SQLite file)")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(asyncio.run(_run_worker(args.logins, args.concurrency))))
+        return
+
+    results = {}
+    for pool_size in args.pool_sizes:
+        env_overrides = {
+            "BCRYPT_ROUNDS": str(args.rounds),
+            "PASSWORD_HASHING_WORKERS": str(pool_size),
+            "PASSWORD_HASHING_QUEUE_LIMIT": str(args.queue_limit),
+        }
+        worker_args = [f"--logins={args.logins}", f"--concurrency={args.concurrency}"]
+        results[pool_size] = run_worker("benchmarks.login_throughput", worker_args, env_overrides, db_url=args.db_url)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,512 @@
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import tempfile
+from collections.abc import Awaitable, Callable
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Any
+from uuid import UUID, uuid4
+
+DEFAULT_COST_BUDGET = 1000.0
+SEARCH_WORDS = ["report", "invoice", "garden", "meeting"]
+# In one task per account, so a search for it is selective enough that Postgres should go through the tsvector index
+RARE_SEARCH_WORD = "quarterly"
+# Only these statements have a plan worth checking; inserts of literal rows always go straight into the table
+EXPLAINED_STATEMENT = re.compile(
+    r"\s*(SELECT|WITH|UPDATE|DELETE|INSERT\s+INTO\s+\S+\s*\([^)]*\)\s*SELECT)\b", re.IGNORECASE
+)
+
+
+@dataclass
+class Scenario:
+    name: str
+    run: Callable[[Any, dict], Awaitable[None]]
+    # Postgres only; SQLite's EXPLAIN QUERY PLAN has no costs
+    cost_budget: float = DEFAULT_COST_BUDGET
+    # Postgres only; an index one of the scenario's statements must use
+    required_index: str | None = None
+    # Jobs that go through every user read whole tables by design, so only their plans are listed
+    reads_whole_tables: bool = False
+
+
+@dataclass
+class CapturedStatement:
+    engine: Any
+    statement: str
+    parameters: Any
+
+
+@dataclass
+class PlanResult:
+    name: str
+    statement: str
+    plan: list[str]
+    cost: float | None
+    problems: list[str] = field(default_factory=list)
+
+
+# Every route and job the app runs, in order: each one's statements are captured as the app issues them and then
+# explained. Add a scenario here alongside any new route or query.
+SCENARIOS: list[Scenario] = []
+
+
+def scenario(name: str, **options):
+    def register(run):
+        SCENARIOS.append(Scenario(name, run, **options))
+        return run
+
+    return register
+
+
+async def call(client, method: str, path: str, headers: dict, **kwargs):
+    response = await client.request(method, path, headers=headers, **kwargs)
+    if response.status_code >= 400:
+        raise RuntimeError(f"{method} {path} returned {response.status_code}: {response.text}")
+    return response
+
+
+@scenario("users: read")
+async def read_user(client, sample):
+    await call(client, "GET", "/users", sample["headers"])
+
+
+@scenario("tasks: list each sort and the next page")
+async def list_tasks(client, sample):
+    from tasks_backend.models.tasks import TaskSort
+
+    for sort in TaskSort:
+        page = (await call(client, "GET", "/tasks", sample["headers"], params={"sort": sort.value})).json()
+        params = {"sort": sort.value, "cursor": page["next_cursor"]}
+        await call(client, "GET", "/tasks", sample["headers"], params=params)
+
+
+@scenario("tasks: list filtered")
+async def list_tasks_filtered(client, sample):
+    today = date.today()
+    for params in (
+        {"status": "done"},
+        {"due_from": today.isoformat(), "due_to": (today + timedelta(days=7)).isoformat()},
+        {"category_id": str(sample["category_id"])},
+        {"include": ""},
+    ):
+        await call(client, "GET", "/tasks", sample["headers"], params=params)
+
+
+@scenario("tasks: read one")
+async def read_task(client, sample):
+    await call(client, "GET", f"/tasks/{sample['task_ids'][0]}", sample["headers"])
+
+
+@scenario("tasks: search and the next page")
+async def search_tasks(client, sample):
+    page = (await call(client, "GET", "/tasks/search", sample["headers"], params={"q": SEARCH_WORDS[0]})).json()
+    params = {"q": SEARCH_WORDS[0], "cursor": page["next_cursor"]}
+    await call(client, "GET", "/tasks/search", sample["headers"], params=params)
+
+
+@scenario("tasks: search a large account for a rare word", required_index="ix_task_search_vector")
+async def search_large_account(client, sample):
+    await call(client, "GET", "/tasks/search", sample["large_headers"], params={"q": RARE_SEARCH_WORD})
+
+
+@scenario("tasks: stats")
+async def read_task_stats(client, sample):
+    # The first read builds the user's stats from their tasks
+    for _ in range(2):
+        await call(client, "GET", "/tasks/stats", sample["headers"])
+
+
+@scenario("tasks: export")
+async def export_tasks(client, sample):
+    for export_format in ("ndjson", "csv"):
+        await call(client, "GET", "/tasks/export", sample["headers"], params={"format": export_format})
+
+
+@scenario("sync: full, paged and incremental")
+async def sync(client, sample):
+    page = (await call(client, "GET", "/sync", sample["headers"], params={"limit": 3})).json()
+    while page["has_more"]:
+        params = {"since": page["next_token"], "limit": 100}
+        page = (await call(client, "GET", "/sync", sample["headers"], params=params)).json()
+    await call(client, "GET", "/sync", sample["headers"], params={"since": page["next_token"]})
+
+
+@scenario("categories: list and read one")
+async def read_categories(client, sample):
+    await call(client, "GET", "/categories", sample["headers"], params={"include": ""})
+    await call(client, "GET", f"/categories/{sample['category_id']}", sample["headers"])
+
+
+# Returns every task in the account, which Postgres prices at an index lookup each: about 1000 for the 200 tasks
+# seeded per user by default
+@scenario("categories: list with their tasks", cost_budget=3 * DEFAULT_COST_BUDGET)
+async def read_categories_with_tasks(client, sample):
+    await call(client, "GET", "/categories", sample["headers"])
+
+
+@scenario("archive: move done tasks")
+async def archive_tasks(client, sample):
+    from tasks_backend.archive_cli import archive
+
+    # Seeded tasks were last changed a minute apart going back from now, so most of the done ones are archived
+    await asyncio.to_thread(archive, 1 / 24)
+
+
+@scenario("archive: list with archived tasks")
+async def list_archived_tasks(client, sample):
+    from tasks_backend.models.tasks import TaskSort
+
+    for sort in TaskSort:
+        params = {"sort": sort.value, "include_archived": "true"}
+        page = (await call(client, "GET", "/tasks", sample["headers"], params=params)).json()
+        await call(client, "GET", "/tasks", sample["headers"], params={**params, "cursor": page["next_cursor"]})
+    params = {"include_archived": "true", "category_id": str(sample["category_id"]), "status": "done"}
+    await call(client, "GET", "/tasks", sample["headers"], params=params)
+
+
+@scenario("archive: unarchive and delete")
+async def unarchive_task(client, sample):
+    params = {"include_archived": "true", "status": "done", "limit": 2, "include": ""}
+    page = (await call(client, "GET", "/tasks", sample["headers"], params=params)).json()
+    restored_task, deleted_task = page["items"]
+    await call(client, "POST", f"/tasks/{restored_task['id']}/unarchive", sample["headers"])
+    await call(client, "DELETE", f"/tasks/{deleted_task['id']}", sample["headers"])
+
+
+@scenario("tasks: create, update and delete")
+async def write_tasks(client, sample):
+    category_ids = [str(category_id) for category_id in sample["category_ids"][:2]]
+    task_create = {"name": "Plan check task", "category_ids": category_ids}
+    task = (await call(client, "POST", "/tasks", sample["headers"], json=task_create)).json()
+    batch = (await call(client, "POST", "/tasks/batch", sample["headers"], json=[task_create] * 5)).json()
+    batch_task_ids = [result["task_id"] for result in batch]
+    task_update = {"status": "in_progress", "category_ids": category_ids[:1]}
+    await call(client, "PATCH", f"/tasks/{task['id']}", sample["headers"], json=task_update)
+    task_updates = [{"id": task_id, "status": "done"} for task_id in batch_task_ids]
+    await call(client, "PATCH", "/tasks/batch", sample["headers"], json=task_updates)
+    await call(client, "DELETE", f"/tasks/{task['id']}", sample["headers"])
+    await call(client, "DELETE", "/tasks/batch", sample["headers"], json=batch_task_ids)
+
+
+@scenario("tasks: import")
+async def import_tasks(client, sample):
+    task_imports = [
+        {"name": f"Imported {number}", "category_names": ["Category 0", "Imported category"]} for number in range(5)
+    ]
+    body = "".join(f"{json.dumps(task_import)}\n" for task_import in task_imports)
+    await call(client, "POST", "/tasks/import", sample["headers"], params={"format": "ndjson"}, content=body)
+
+
+@scenario("categories: create, update, delete and restore defaults")
+async def write_categories(client, sample):
+    category = (
+        await call(client, "POST", "/categories", sample["headers"], json={"name": "Plans", "colour": 1})
+    ).json()
+    await call(client, "PATCH", f"/categories/{category['id']}", sample["headers"], json={"colour": 2})
+    # A category with tasks, so its tasks are touched for sync as it goes
+    await call(client, "DELETE", f"/categories/{sample['category_id']}", sample["headers"])
+    await call(client, "DELETE", f"/categories/{category['id']}", sample["headers"])
+    await call(client, "POST", "/categories/restore-defaults", sample["headers"])
+
+
+@scenario("users: sign up, log in, update and delete")
+async def write_users(client, sample):
+    user_create = {"email": f"plans-{uuid4().hex}@example.com", "password": "password1"}
+    user = (await call(client, "POST", "/users", {}, json=user_create)).json()
+    headers = {"Authorization": f"Bearer {user['access_token']}"}
+    login = {"username": user_create["email"], "password": user_create["password"]}
+    await call(client, "POST", "/auth/login", {}, data=login)
+    await call(client, "PATCH", f"/users/{user['id']}", headers, json={"email": f"plans-{uuid4().hex}@example.com"})
+    await call(client, "DELETE", f"/users/{user['id']}", headers)
+    # An account with tasks, categories and archived tasks, deleted in one statement
+    await call(client, "DELETE", f"/users/{sample['user_id']}", sample["headers"])
+
+
+@scenario("users: schedule a large account's deletion and purge it")
+async def purge_large_account(client, sample):
+    from tasks_backend.purge_cli import purge
+    from tasks_backend.routers import users
+
+    # However large the seeded account, it goes to the purge job, which deletes it a few batches at a time
+    max_synchronous_delete_tasks = users.MAX_SYNCHRONOUS_DELETE_TASKS
+    users.MAX_SYNCHRONOUS_DELETE_TASKS = 0
+    try:
+        await call(client, "DELETE", f"/users/{sample['large_user_id']}", sample["large_headers"])
+    finally:
+        users.MAX_SYNCHRONOUS_DELETE_TASKS = max_synchronous_delete_tasks
+    # Batches small next to the table, as they are in production, where the planner looks each one up by id
+    await asyncio.to_thread(purge, 100)
+
+
+@scenario("tombstones: prune")
+async def prune_tombstones(client, sample):
+    from tasks_backend.tombstones_cli import prune
+
+    await asyncio.to_thread(prune, 0)
+
+
+@scenario("stats: rebuild every user", reads_whole_tables=True)
+async def rebuild_task_stats(client, sample):
+    from tasks_backend.task_stats_cli import rebuild
+
+    await asyncio.to_thread(rebuild)
+
+
+def seed(engine, users: int, tasks: int, categories: int, large_account_tasks: int) -> dict[str, Any]:
+    from sqlalchemy import insert
+
+    from tasks_backend.models.categories import Category
+    from tasks_backend.models.data_versions import UserDataVersion
+    from tasks_backend.models.links import TaskCategoryLink
+    from tasks_backend.models.tasks import Task
+    from tasks_backend.models.tombstones import Tombstone
+    from tasks_backend.models.users import User
+    from tasks_backend.utils.utils import get_current_utc_time
+
+    now = get_current_utc_time()
+    sample = {}
+    with engine.begin() as connection:
+        for user_number in range(users):
+            user_id = uuid4()
+            connection.execute(
+                insert(User).values(
+                    id=user_id, email=f"plans-{uuid4().hex}@example.com", hashed_password=b"x", created_at=now
+                )
+            )
+            connection.execute(insert(UserDataVersion).values(user_id=user_id, version=1))
+            category_rows = [
+                {"id": uuid4(), "user_id": user_id, "name": f"Category {number}", "colour": 0, "updated_at": now}
+                for number in range(categories)
+            ]
+            connection.execute(insert(Category), category_rows)
+            task_rows = _task_rows(user_id, tasks, now)
+            connection.execute(insert(Task), task_rows)
+            link_rows = [
+                {"task_id": task_row["id"], "category_id": category_rows[number % categories]["id"]}
+                for number, task_row in enumerate(task_rows)
+            ]
+            connection.execute(insert(TaskCategoryLink), link_rows)
+            connection.execute(
+                insert(Tombstone).values(id=uuid4(), user_id=user_id, entity="task", entity_id=uuid4(), deleted_at=now)
+            )
+            if user_number == 0:
+                sample = {
+                    "user_id": user_id,
+                    "task_ids": [task_row["id"] for task_row in task_rows[:50]],
+                    "category_id": category_rows[0]["id"],
+                    "category_ids": [category_row["id"] for category_row in category_rows],
+                }
+        # Large enough that a selective search is cheaper through the tsvector index than through the user's tasks
+        large_user_id = uuid4()
+        connection.execute(
+            insert(User).values(
+                id=large_user_id, email=f"plans-{uuid4().hex}@example.com", hashed_password=b"x", created_at=now
+            )
+        )
+        connection.execute(insert(UserDataVersion).values(user_id=large_user_id, version=1))
+        connection.execute(insert(Task), _task_rows(large_user_id, large_account_tasks, now))
+        sample["large_user_id"] = large_user_id
+    return sample
+
+
+def _task_rows(user_id: UUID, task_count: int, now) -> list[dict]:
+    from tasks_backend.models.tasks import Status
+
+    statuses = list(Status)
+    return [
+        {
+            "id": uuid4(),
+            "user_id": user_id,
+            "name": f"{SEARCH_WORDS[number % len(SEARCH_WORDS)]} {number}",
+            "description": f"Seeded for query plan checks{f' {RARE_SEARCH_WORD}' if number == 0 else ''}",
+            "due_date": now.date() + timedelta(days=number % 30),
+            "status": statuses[number % len(statuses)],
+            "created_at": now - timedelta(minutes=number),
+            "updated_at": now - timedelta(minutes=number),
+        }
+        for number in range(task_count)
+    ]
+
+
+@contextmanager
+def capture_statements(engines: list):
+    from sqlalchemy import event
+
+    captured = []
+
+    def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        if not executemany and EXPLAINED_STATEMENT.match(statement):
+            captured.append(CapturedStatement(connection.engine, statement, parameters))
+
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield captured
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+async def explain(captured: CapturedStatement, async_engines: dict) -> list:
+    # Run on the engine that issued the statement, as each driver has its own parameter style
+    from sqlalchemy import text
+
+    dialect_name = captured.engine.dialect.name
+    explain_statement = ("EXPLAIN (FORMAT JSON) " if dialect_name == "postgresql" else "EXPLAIN QUERY PLAN ") + (
+        captured.statement
+    )
+    parameters = captured.parameters or None
+    if captured.engine in async_engines:
+        async with async_engines[captured.engine].connect() as connection:
+            if dialect_name == "postgresql":
+                await connection.execute(text("SET enable_seqscan = off"))
+            return (await connection.exec_driver_sql(explain_statement, parameters)).all()
+    with captured.engine.connect() as connection:
+        if dialect_name == "postgresql":
+            connection.execute(text("SET enable_seqscan = off"))
+        return connection.exec_driver_sql(explain_statement, parameters).all()
+
+
+def _postgres_nodes(plan_node: dict, depth: int = 0):
+    yield depth, plan_node
+    for child_node in plan_node.get("Plans", []):
+        yield from _postgres_nodes(child_node, depth + 1)
+
+
+def check_plan(name: str, captured: CapturedStatement, plan_rows: list, cost_budget: float) -> PlanResult:
+    if captured.engine.dialect.name == "postgresql":
+        # asyncpg hands JSON back undecoded when no column type asks for it
+        explained = plan_rows[0][0]
+        root_node = (json.loads(explained) if isinstance(explained, str) else explained)[0]["Plan"]
+        plan = []
+        problems = []
+        for depth, plan_node in _postgres_nodes(root_node):
+            relation = f" on {plan_node['Relation Name']}" if "Relation Name" in plan_node else ""
+            index = f" using {plan_node['Index Name']}" if "Index Name" in plan_node else ""
+            plan.append(f"{'  ' * depth}{plan_node['Node Type']}{relation}{index} (cost={plan_node['Total Cost']})")
+            if plan_node["Node Type"] == "Seq Scan":
+                problems.append(f"sequential scan on {plan_node['Relation Name']}")
+        cost = root_node["Total Cost"]
+        if cost > cost_budget:
+            problems.append(f"cost {cost} is over the budget of {cost_budget}")
+        return PlanResult(name, captured.statement, plan, cost, problems)
+
+    plan = [detail for _, _, _, detail in plan_rows]
+    # Subqueries SQLite runs as co-routines or materializes are scanned in memory, not read from a table
+    subqueries = {detail.split()[-1] for detail in plan if detail.startswith(("CO-ROUTINE ", "MATERIALIZE "))}
+    problems = [
+        detail
+        for detail in plan
+        # Full-text virtual tables are scanned through their own index
+        if detail.startswith("SCAN ")
+        and "VIRTUAL TABLE" not in detail
+        and not detail.endswith(("CONSTANT ROW", "CONSTANT ROWS"))
+        and detail.split()[1] not in subqueries
+    ]
+    return PlanResult(name, captured.statement, plan, None, problems)
+
+
+async def check_query_plans(
+    users: int, tasks: int, categories: int, large_account_tasks: int, cost_budget: float | None = None
+) -> list[PlanResult]:
+    # Seeds the app's database, runs every scenario through the app and returns the plan of each distinct
+    # statement they issued
+    import httpx
+    from sqlalchemy import text
+
+    from tasks_backend.app import app
+    from tasks_backend.auth import create_access_token
+    from tasks_backend.db import get_async_engine, get_engine
+    from tasks_backend.migrations import upgrade
+    from tasks_backend.models.users import User
+
+    engine = get_engine()
+    async_engine = get_async_engine()
+    upgrade(engine)
+    sample = seed(engine, users, tasks, categories, large_account_tasks)
+    for user_id_key, headers_key in (("user_id", "headers"), ("large_user_id", "large_headers")):
+        access_token = create_access_token(User(id=sample[user_id_key])).access_token
+        sample[headers_key] = {"Authorization": f"Bearer {access_token}"}
+    if engine.dialect.name == "postgresql":
+        # Also flushes the GIN pending list the seeded tasks went into, which is priced as if scanned row by row
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.execute(text("VACUUM ANALYZE"))
+
+    results = []
+    explained_statements = set()
+    async_engines = {async_engine.sync_engine: async_engine}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testserver/Prod") as client:
+        for checked_scenario in SCENARIOS:
+            with capture_statements([engine, async_engine.sync_engine]) as captured_statements:
+                await checked_scenario.run(client, sample)
+            scenario_results = []
+            for captured in captured_statements:
+                # Statements already checked are skipped, except where the scenario must show an index in use
+                if captured.statement in explained_statements and checked_scenario.required_index is None:
+                    continue
+                explained_statements.add(captured.statement)
+                plan_rows = await explain(captured, async_engines)
+                budget = checked_scenario.cost_budget if cost_budget is None else cost_budget
+                name = f"{checked_scenario.name} #{len(scenario_results) + 1}"
+                result = check_plan(name, captured, plan_rows, budget)
+                if checked_scenario.reads_whole_tables:
+                    result.problems = []
+                scenario_results.append(result)
+            required_index = checked_scenario.required_index
+            plan_lines = [line for result in scenario_results for line in result.plan]
+            if (
+                required_index
+                and engine.dialect.name == "postgresql"
+                and not any(f" using {required_index} " in line for line in plan_lines)
+            ):
+                results.append(PlanResult(checked_scenario.name, "", [], None, [f"does not use {required_index}"]))
+            results.extend(scenario_results)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run every route and job, EXPLAIN each statement they issue and fail on sequential scans or "
+        "plans over budget."
+    )
+    parser.add_argument("--db-url", help="Scratch database to seed (defaults to a temporary SQLite file)")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--tasks", type=int, default=200, help="Tasks seeded per user")
+    parser.add_argument(
+        "--large-account-tasks", type=int, default=5000, help="Tasks seeded for one extra, much larger account"
+    )
+    parser.add_argument("--categories", type=int, default=5, help="Categories seeded per user")
+    parser.add_argument("--cost-budget", type=float, help="Overrides every query's Postgres cost budget")
+    parser.add_argument("--verbose", action="store_true", help="Print every plan, not just failing ones")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        os.environ["DB_URL"] = args.db_url or f"sqlite:///{temp_dir}/query_plans.db"
+        os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret-key-benchmark-secret-key")
+        os.environ.setdefault("SCHEMA_CHECK_ON_STARTUP", "False")
+        results = asyncio.run(
+            check_query_plans(args.users, args.tasks, args.categories, args.large_account_tasks, args.cost_budget)
+        )
+    failures = 0
+    for result in results:
+        cost = "" if result.cost is None else f" (cost {result.cost})"
+        print(f"{'FAIL' if result.problems else 'ok':<5}{result.name}{cost}")
+        if result.problems or args.verbose:
+            if result.statement:
+                print(f"       {result.statement}")
+            for line in result.plan:
+                print(f"       {line}")
+        for problem in result.problems:
+            print(f"     ! {problem}")
+        failures += bool(result.problems)
+    print(f"{failures} of {len(results)} statements failed their plan checks")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import argparse
+import json
+import time
+from uuid import uuid4
+
+DEFAULT_TASK_COUNTS = [10, 100, 1000, 10000]
+CATEGORIES_PER_TASK = 2
+
+
+def _build_tasks(task_count: int) -> list:
+    from tasks_backend.app import app  # noqa: F401 - configures the ORM mappers
+    from tasks_backend.models.categories import Category
+    from tasks_backend.models.tasks import Task
+
+    user_id = uuid4()
+    categories = [Category(name=f"Category {number}", colour=0x66BB6A, user_id=user_id) for number in range(5)]
+    return [
+        Task(
+            name=f"Task {number}",
+            description="Benchmark task description",
+            user_id=user_id,
+            categories=[categories[(number + offset) % len(categories)] for offset in range(CATEGORIES_PER_TASK)],
+        )
+        for number in range(task_count)
+    ]
+
+
+def _serializers() -> dict:
+    from fastapi.encoders import jsonable_encoder
+
+    from tasks_backend.models.shared import TaskPublicWithCategories
+    from tasks_backend.utils.serialization import get_type_adapter, json_response
+
+    response_type = list[TaskPublicWithCategories]
+    type_adapter = get_type_adapter(response_type)
+
+    def response_model(tasks: list) -> bytes:
+        # FastAPI's classic response_model path: validate, dump to JSON-compatible Python, then json.dumps
+        validated_tasks = type_adapter.validate_python(tasks, from_attributes=True)
+        return json.dumps(type_adapter.dump_python(validated_tasks, mode="json")).encode()
+
+    def encoded_models(tasks: list) -> bytes:
+        validated_tasks = type_adapter.validate_python(tasks, from_attributes=True)
+        return json.dumps(jsonable_encoder(validated_tasks)).encode()
+
+    def fast_path(tasks: list) -> bytes:
+        return json_response(response_type, tasks).body
+
+    serializers = {"response_model": response_model, "jsonable_encoder": encoded_models, "json_response": fast_path}
+    try:
+        import orjson
+
+        def orjson_dumps(tasks: list) -> bytes:
+            validated_tasks = type_adapter.validate_python(tasks, from_attributes=True)
+            return orjson.dumps(type_adapter.dump_python(validated_tasks, mode="json"))
+
+        serializers["orjson"] = orjson_dumps
+    except ImportError:
+        pass
+    return serializers
+
+
+def _time_serializer(serializer, tasks: list, min_seconds: float) -> dict:
+    serializer(tasks)
+    timings = []
+    started_at = time.perf_counter()
+    while not timings or time.perf_counter() - started_at < min_seconds:
+        iteration_started_at = time.perf_counter()
+        serializer(tasks)
+        timings.append(time.perf_counter() - iteration_started_at)
+    timings.sort()
+    median_seconds = timings[len(timings) // 2]
+    return {
+        "iterations": len(timings),
+        "median_ms": round(median_seconds * 1000, 3),
+        "per_task_us": round(median_seconds / len(tasks) * 1_000_000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the cost of serializing task lists to JSON.")
+    parser.add_argument("--tasks", type=int, nargs="+", default=DEFAULT_TASK_COUNTS, help="Task counts to measure")
+    parser.add_argument("--min-seconds", type=float, default=1.0, help="Minimum time spent per measurement")
+    args = parser.parse_args()
+
+    serializers = _serializers()
+    results = {}
+    for task_count in args.tasks:
+        tasks = _build_tasks(task_count)
+        outputs = {name: json.loads(serializer(tasks)) for name, serializer in serializers.items()}
+        if any(output != outputs["response_model"] for output in outputs.values()):
+            raise RuntimeError(f"Serializers disagree for {task_count} tasks")
+        results[task_count] = {
+            name: _time_serializer(serializer, tasks, args.min_seconds) for name, serializer in serializers.items()
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
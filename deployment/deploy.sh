@@ -21,3 +21,4 @@ echo "$PROJECT_ROOT" >> "$REQUIREMENTS_FILEPATH"
 
 sam build --debug --template "$PROJECT_ROOT/template.yaml"
 sam deploy
+sam remote invoke MigrationFunction
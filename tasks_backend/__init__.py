@@ -0,0 +1,3 @@
+import time
+
+IMPORT_STARTED_AT = time.perf_counter()
@@ -0,0 +1,350 @@
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import sqlite3
+import time
+from collections import defaultdict
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager, closing
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Protocol
+
+import anyio
+from fastapi import HTTPException, Request, status
+from starlette.concurrency import run_in_threadpool
+
+from tasks_backend import metrics
+from tasks_backend.utils.ttl_cache import TTLCache
+
+# memory: state is private to the process. sqlite: state lives in a local SQLite file, so every worker process
+# on the host shares the same limits.
+ADMISSION_STORE = os.environ.get("ADMISSION_STORE", "memory").lower()
+ADMISSION_STORE_PATH = os.environ.get("ADMISSION_STORE_PATH", "/tmp/tasks-backend-admission.db")
+ADMISSION_RETRY_AFTER_SECONDS = 1
+# How often a queued request rechecks a shared store, where slots freed by other processes send no wake-up
+ADMISSION_POLL_SECONDS = 0.02
+# A slot held by a process that died is freed after this long. Live processes renew the slots they hold every
+# third of it, so a slow request keeps its slot however long it runs.
+ADMISSION_LEASE_SECONDS = 30
+RATE_LIMIT_PER_SECOND = float(os.environ.get("RATE_LIMIT_PER_SECOND", "0"))
+RATE_LIMIT_BURST = float(os.environ.get("RATE_LIMIT_BURST", "20"))
+RATE_LIMIT_MAX_KEYS = 10000
+
+
+class Priority(IntEnum):
+    # Lower values are admitted first and are the last to be shed
+    AUTH = 0
+    WRITE = 1
+    READ = 2
+    LIST_READ = 3
+
+
+# Routes whose priority differs from the one their method and path give them
+ROUTE_PRIORITIES = {
+    ("POST", "/users"): Priority.AUTH,
+    ("GET", "/users"): Priority.READ,
+    ("GET", "/tasks/stats"): Priority.READ,
+}
+
+
+def route_priority(request: Request) -> Priority:
+    route = request.scope.get("route")
+    path = getattr(route, "path", request.url.path)
+    if (request.method, path) in ROUTE_PRIORITIES:
+        return ROUTE_PRIORITIES[request.method, path]
+    if path.startswith("/auth"):
+        return Priority.AUTH
+    if request.method not in ("GET", "HEAD"):
+        return Priority.WRITE
+    return Priority.READ if "{" in path else Priority.LIST_READ
+
+
+class AdmissionStore(Protocol):
+    poll_seconds: float | None
+    lease_seconds: float | None
+
+    async def try_acquire(self, name: str, limit: int) -> int | None: ...
+
+    async def renew(self, name: str, lease_id: int): ...
+
+    async def release(self, name: str, lease_id: int): ...
+
+    async def take_token(self, key: str, rate: float, burst: float) -> float: ...
+
+
+def _refill(tokens: float, updated_at: float, now: float, rate: float, burst: float) -> float:
+    return min(burst, tokens + (now - updated_at) * rate)
+
+
+class MemoryAdmissionStore:
+    poll_seconds = None
+    # Slots die with the process that holds them, so they never expire
+    lease_seconds = None
+
+    def __init__(self):
+        self._in_flight: dict[str, int] = defaultdict(int)
+        self._lease_ids = itertools.count(1)
+        self._buckets = TTLCache(max_size=RATE_LIMIT_MAX_KEYS, ttl_seconds=60)
+
+    async def try_acquire(self, name: str, limit: int) -> int | None:
+        if self._in_flight[name] >= limit:
+            return None
+        self._in_flight[name] += 1
+        return next(self._lease_ids)
+
+    async def renew(self, name: str, lease_id: int):
+        pass
+
+    async def release(self, name: str, lease_id: int):
+        self._in_flight[name] -= 1
+
+    async def take_token(self, key: str, rate: float, burst: float) -> float:
+        # Returns 0 if a token was taken, otherwise the seconds until one is available
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(key, (burst, now))
+        tokens = _refill(tokens, updated_at, now, rate, burst)
+        retry_after = 0.0 if tokens >= 1 else (1 - tokens) / rate
+        if not retry_after:
+            tokens -= 1
+        # An entry that expires has refilled, so forgetting it is the same as keeping a full bucket
+        self._buckets.set(key, (tokens, now), ttl_seconds=burst / rate)
+        return retry_after
+
+
+SQLITE_STORE_SCHEMA = """
+PRAGMA journal_mode = WAL;
+CREATE TABLE IF NOT EXISTS admission_lease (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_admission_lease_name ON admission_lease (name);
+CREATE TABLE IF NOT EXISTS rate_limit_bucket (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL);
+"""
+
+
+class SQLiteAdmissionStore:
+    poll_seconds = ADMISSION_POLL_SECONDS
+
+    def __init__(self, path: str, lease_seconds: float = ADMISSION_LEASE_SECONDS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self._schema_created = False
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        # The state only matters while the processes sharing it are running, so it is never synced to disk
+        connection.execute("PRAGMA synchronous = OFF")
+        if not self._schema_created:
+            connection.executescript(SQLITE_STORE_SCHEMA)
+            self._schema_created = True
+        return connection
+
+    def _try_acquire(self, name: str, limit: int) -> int | None:
+        with closing(self._connect()) as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            connection.execute("DELETE FROM admission_lease WHERE expires_at <= ?", (now,))
+            (in_flight,) = connection.execute("SELECT count(*) FROM admission_lease WHERE name = ?", (name,)).fetchone()
+            lease_id = None
+            if in_flight < limit:
+                lease_id = connection.execute(
+                    "INSERT INTO admission_lease (name, expires_at) VALUES (?, ?)",
+                    (name, now + self.lease_seconds),
+                ).lastrowid
+            connection.execute("COMMIT")
+            return lease_id
+
+    def _renew(self, lease_id: int):
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "UPDATE admission_lease SET expires_at = ? WHERE id = ?", (time.time() + self.lease_seconds, lease_id)
+            )
+
+    def _release(self, lease_id: int):
+        with closing(self._connect()) as connection:
+            connection.execute("DELETE FROM admission_lease WHERE id = ?", (lease_id,))
+
+    def _take_token(self, key: str, rate: float, burst: float) -> float:
+        with closing(self._connect()) as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            bucket = connection.execute(
+                "SELECT tokens, updated_at FROM rate_limit_bucket WHERE key = ?", (key,)
+            ).fetchone()
+            if bucket is None:
+                # Buckets that have refilled are indistinguishable from new ones, so they are dropped
+                connection.execute("DELETE FROM rate_limit_bucket WHERE updated_at < ?", (now - burst / rate,))
+            tokens = _refill(*bucket, now, rate, burst) if bucket else burst
+            retry_after = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            if not retry_after:
+                tokens -= 1
+            connection.execute(
+                "INSERT INTO rate_limit_bucket (key, tokens, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+                (key, tokens, now),
+            )
+            connection.execute("COMMIT")
+            return retry_after
+
+    async def try_acquire(self, name: str, limit: int) -> int | None:
+        return await run_in_threadpool(self._try_acquire, name, limit)
+
+    async def renew(self, name: str, lease_id: int):
+        await run_in_threadpool(self._renew, lease_id)
+
+    async def release(self, name: str, lease_id: int):
+        await run_in_threadpool(self._release, lease_id)
+
+    async def take_token(self, key: str, rate: float, burst: float) -> float:
+        return await run_in_threadpool(self._take_token, key, rate, burst)
+
+
+ADMISSION_STORES = {"memory": MemoryAdmissionStore, "sqlite": lambda: SQLiteAdmissionStore(ADMISSION_STORE_PATH)}
+if ADMISSION_STORE not in ADMISSION_STORES:
+    raise ValueError(f"Unknown ADMISSION_STORE {ADMISSION_STORE}, expected one of {', '.join(ADMISSION_STORES)}")
+
+admission_store: AdmissionStore | None = None
+
+
+def get_admission_store() -> AdmissionStore:
+    global admission_store
+    if admission_store is None:
+        admission_store = ADMISSION_STORES[ADMISSION_STORE]()
+    return admission_store
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    sequence: int
+    event: asyncio.Event = field(default_factory=asyncio.Event, compare=False)
+    evicted: bool = field(default=False, compare=False)
+
+
+class AdmissionController:
+    # Caps the requests using a resource at once. Requests over the cap wait in a bounded queue, most important
+    # first; a full queue sheds its least important request, and a request that waits too long is shed, so
+    # overload turns into fast 503s instead of requests timing out behind each other.
+    def __init__(
+        self,
+        name: str,
+        limit: int,
+        queue_limit: int,
+        max_wait_seconds: float,
+        shed_detail: str = "Server is busy",
+        retry_after_seconds: int = ADMISSION_RETRY_AFTER_SECONDS,
+    ):
+        self.name = name
+        self.limit = limit
+        self.queue_limit = queue_limit
+        self.max_wait_seconds = max_wait_seconds
+        self.shed_detail = shed_detail
+        self.retry_after_seconds = retry_after_seconds
+        self._waiters: list[_Waiter] = []
+        self._sequence = itertools.count()
+
+    def _shed(self, priority: Priority, reason: str):
+        metrics.increment("admission_shed_total", controller=self.name, priority=priority.name.lower(), reason=reason)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=self.shed_detail,
+            headers={"Retry-After": str(self.retry_after_seconds)},
+        )
+
+    def _report_queue_depth(self):
+        metrics.set_gauge("admission_queue_depth", len(self._waiters), controller=self.name)
+
+    def _wake_next(self):
+        if self._waiters:
+            self._waiters[0].event.set()
+
+    def _enqueue(self, priority: Priority) -> _Waiter:
+        if len(self._waiters) >= self.queue_limit:
+            least_important = max(self._waiters, default=None)
+            if least_important is None or least_important.priority <= priority:
+                self._shed(priority, "queue_full")
+            self._waiters.remove(least_important)
+            heapq.heapify(self._waiters)
+            least_important.evicted = True
+            least_important.event.set()
+        waiter = _Waiter(priority, next(self._sequence))
+        heapq.heappush(self._waiters, waiter)
+        self._report_queue_depth()
+        return waiter
+
+    async def _acquire(self, priority: Priority) -> int:
+        store = get_admission_store()
+        if not self._waiters:
+            lease_id = await store.try_acquire(self.name, self.limit)
+            if lease_id is not None:
+                return lease_id
+        waiter = self._enqueue(priority)
+        started_at = time.monotonic()
+        try:
+            while True:
+                if waiter.evicted:
+                    self._shed(priority, "evicted")
+                waiter.event.clear()
+                if self._waiters[0] is waiter:
+                    lease_id = await store.try_acquire(self.name, self.limit)
+                    if lease_id is not None:
+                        metrics.observe(
+                            "admission_wait_seconds",
+                            time.monotonic() - started_at,
+                            controller=self.name,
+                            priority=priority.name.lower(),
+                        )
+                        return lease_id
+                remaining = started_at + self.max_wait_seconds - time.monotonic()
+                if remaining <= 0:
+                    self._shed(priority, "timeout")
+                if store.poll_seconds is not None:
+                    remaining = min(remaining, store.poll_seconds)
+                with anyio.move_on_after(remaining):
+                    await waiter.event.wait()
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+                heapq.heapify(self._waiters)
+            self._report_queue_depth()
+            # The slot this request took, or gave up waiting for, may leave room for the next one
+            self._wake_next()
+
+    async def _renew_lease(self, store: AdmissionStore, lease_id: int):
+        while True:
+            await asyncio.sleep(store.lease_seconds / 3)
+            await store.renew(self.name, lease_id)
+
+    @asynccontextmanager
+    async def admit(self, priority: Priority) -> AsyncIterator[None]:
+        lease_id = await self._acquire(priority)
+        metrics.adjust_gauge("admission_in_flight", 1, controller=self.name)
+        store = get_admission_store()
+        # A task of its own rather than one in a task group, as the request may leave this context from another task
+        renewal = asyncio.create_task(self._renew_lease(store, lease_id)) if store.lease_seconds is not None else None
+        try:
+            yield
+        finally:
+            if renewal is not None:
+                renewal.cancel()
+            metrics.adjust_gauge("admission_in_flight", -1, controller=self.name)
+            with anyio.CancelScope(shield=True):
+                await store.release(self.name, lease_id)
+            self._wake_next()
+
+
+async def check_rate_limit(key: str):
+    # Token bucket per key: RATE_LIMIT_PER_SECOND requests a second on average, in bursts of up to
+    # RATE_LIMIT_BURST. Disabled when the rate is 0.
+    if RATE_LIMIT_PER_SECOND <= 0:
+        return
+    retry_after = await get_admission_store().take_token(f"rate:{key}", RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST)
+    if retry_after:
+        metrics.increment("rate_limited_total", scope=key.split(":", 1)[0])
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
@@ -1,20 +1,48 @@
+import json
 import logging
 import os
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from mangum import Mangum
 
-from tasks_backend.db import create_tables
-from tasks_backend.routers import auth, categories, tasks, users
+from tasks_backend import metrics
+from tasks_backend.db import DB_MODE, get_engine, get_pool_metrics
+from tasks_backend.instrumentation import InstrumentationMiddleware
+from tasks_backend.migrations import check_schema_version, upgrade
+from tasks_backend.routers import auth, categories, sync, tasks, users
+from tasks_backend.utils import startup_profiler
+
+AUTO_MIGRATE = os.environ.get("AUTO_MIGRATE", "False").lower() == "true"
+SCHEMA_CHECK_ON_STARTUP = os.environ.get("SCHEMA_CHECK_ON_STARTUP", "True").lower() == "true"
+LOG_POOL_METRICS = os.environ.get("LOG_POOL_METRICS", "False").lower() == "true"
+# Set by run.py; never exposed on Lambda, where metrics leave through EMF log lines instead
+METRICS_ENDPOINT = os.environ.get("METRICS_ENDPOINT", "False").lower() == "true"
 
 _invocation_count = 0
+_container_initialised = False
+
+
+def initialise_container():
+    global _container_initialised
+    if _container_initialised:
+        return
+    if AUTO_MIGRATE or SCHEMA_CHECK_ON_STARTUP:
+        engine = get_engine()
+        if AUTO_MIGRATE:
+            upgrade(engine)
+        if SCHEMA_CHECK_ON_STARTUP:
+            check_schema_version(engine)
+        if DB_MODE == "async":
+            # Routes only use the async engine, so don't hold an idle sync connection open in the container
+            engine.dispose()
+    _container_initialised = True
 
 
 @asynccontextmanager
 async def lifespan(_: FastAPI):
-    create_tables()
+    initialise_container()
     yield
 
 
@@ -29,7 +57,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+app.add_middleware(InstrumentationMiddleware)
 
 
 @app.get("/")
@@ -45,18 +75,30 @@ async def root(request: Request):
     return {"message": message}
 
 
+if METRICS_ENDPOINT:
+
+    @app.get("/metrics", include_in_schema=False)
+    async def read_metrics():
+        return Response(content=metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
 app.include_router(auth.router)
 app.include_router(categories.router)
+app.include_router(sync.router)
 app.include_router(tasks.router)
 app.include_router(users.router)
 
+asgi_handler = Mangum(app, lifespan="off")
+startup_profiler.mark("app_imported")
+
 
 def lambda_handler(event, context):
     global _invocation_count
     _invocation_count += 1
     logging.info(f"Invocation count: {_invocation_count}")
-    logging.info(event)
-    asgi_handler = Mangum(app, lifespan="auto")
+    initialise_container()
     response = asgi_handler(event, context)
-
+    startup_profiler.report_first_response()
+    if LOG_POOL_METRICS:
+        logging.info(json.dumps({"pool_metrics": get_pool_metrics()}))
     return response
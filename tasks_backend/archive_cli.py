@@ -0,0 +1,65 @@
+import argparse
+import logging
+import os
+import time
+from datetime import timedelta
+
+from sqlmodel import Session
+
+import tasks_backend.app  # noqa: F401 - registers every model with the ORM before the mappers are configured
+from tasks_backend.db import get_engine
+from tasks_backend.models.archived_tasks import archive_done_tasks
+from tasks_backend.utils.utils import get_current_utc_time
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_AFTER_DAYS = float(os.environ.get("ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_BATCH_SIZE = int(os.environ.get("ARCHIVE_BATCH_SIZE", "500"))
+# Stops starting batches this long before the Lambda timeout, so the last one can commit
+ARCHIVE_TIME_MARGIN_SECONDS = 10
+
+
+def archive(
+    after_days: float = ARCHIVE_AFTER_DAYS,
+    batch_size: int = ARCHIVE_BATCH_SIZE,
+    time_limit_seconds: float | None = None,
+) -> tuple[int, bool]:
+    # Returns how many tasks were archived and whether every task due for archiving was reached. Each batch is its
+    # own transaction, so a run stopped by its time limit loses nothing; the next run carries on.
+    deadline = time.monotonic() + time_limit_seconds if time_limit_seconds is not None else None
+    done_before = get_current_utc_time() - timedelta(days=after_days)
+    archived_count = 0
+    with Session(get_engine()) as session:
+        while True:
+            if deadline is not None and time.monotonic() > deadline:
+                return archived_count, False
+            batch_count = archive_done_tasks(session, done_before, batch_size)
+            archived_count += batch_count
+            if batch_count < batch_size:
+                return archived_count, True
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="archive-tasks", description="Move tasks done for longer than a given age into the archive tables."
+    )
+    parser.add_argument(
+        "--after-days", type=float, default=ARCHIVE_AFTER_DAYS, help="Days since a task was done before archiving it"
+    )
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE, help="Tasks moved per transaction")
+    parser.add_argument("--time-limit", type=float, help="Seconds after which no further batch is started")
+    args = parser.parse_args()
+
+    archived_count, finished = archive(args.after_days, args.batch_size, args.time_limit)
+    print(f"Archived {archived_count} tasks{'' if finished else ', stopped at the time limit'}")
+
+
+def lambda_handler(event, context):
+    time_limit_seconds = context.get_remaining_time_in_millis() / 1000 - ARCHIVE_TIME_MARGIN_SECONDS
+    archived_count, finished = archive(time_limit_seconds=time_limit_seconds)
+    logger.info(f"Archived {archived_count} tasks{'' if finished else ', stopped at the time limit'}")
+    return {"archived_tasks": archived_count, "finished": finished}
+
+
+if __name__ == "__main__":
+    main()
@@ -1,40 +1,105 @@
+import asyncio
+import os
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
+from typing import Any
 from uuid import UUID
 
-import bcrypt
 import jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.encoders import jsonable_encoder
 from fastapi.security import OAuth2PasswordBearer
-from jwt.exceptions import InvalidTokenError
-from sqlmodel import Session, select
+from jwt.exceptions import InvalidSignatureError, InvalidTokenError
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
+from tasks_backend.admission import AdmissionController, Priority, check_rate_limit
 from tasks_backend.db import get_session
+from tasks_backend.instrumentation import timed
 from tasks_backend.models.shared import AccessTokenResponse
-from tasks_backend.models.users import User
-from tasks_backend.utils.get_jwt_secret_key import get_jwt_secret_key
+from tasks_backend.models.users import User, UserPublic
+from tasks_backend.utils.get_jwt_secret_key import get_jwt_secret_key, get_jwt_verification_keys
+from tasks_backend.utils.ttl_cache import TTLCache
 from tasks_backend.utils.utils import get_current_utc_time
 
 DEFAULT_ACCESS_TOKEN_EXPIRY_MINUTES = 30
 JWT_ALGORITHM = "HS256"
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASHING_WORKERS = int(os.environ.get("PASSWORD_HASHING_WORKERS", os.cpu_count() or 1))
+PASSWORD_HASHING_QUEUE_LIMIT = int(os.environ.get("PASSWORD_HASHING_QUEUE_LIMIT", "16"))
+PASSWORD_HASHING_MAX_WAIT_SECONDS = float(os.environ.get("PASSWORD_HASHING_MAX_WAIT_SECONDS", "5"))
+PASSWORD_HASHING_RETRY_AFTER_SECONDS = 1
+PRINCIPAL_CACHE_MAX_SIZE = int(os.environ.get("PRINCIPAL_CACHE_MAX_SIZE", "1024"))
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.environ.get("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+TRUST_TOKEN_CLAIMS = os.environ.get("TRUST_TOKEN_CLAIMS", "False").lower() == "true"
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
+# bcrypt releases the GIL while hashing, so a thread pool gives real parallelism without the memory cost of
+# worker processes on a 128 MB Lambda
+_password_hashing_executor: ThreadPoolExecutor | None = None
+# Keeps bcrypt to one hash per worker thread, with a bounded queue of requests waiting for one
+password_hashing_admission = AdmissionController(
+    "password_hashing",
+    limit=PASSWORD_HASHING_WORKERS,
+    queue_limit=PASSWORD_HASHING_QUEUE_LIMIT,
+    max_wait_seconds=PASSWORD_HASHING_MAX_WAIT_SECONDS,
+    shed_detail="Too many password operations in progress",
+    retry_after_seconds=PASSWORD_HASHING_RETRY_AFTER_SECONDS,
+)
 
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt())
+# Verified principals keyed by user id. Entries are only invalidated in this container, so the TTL bounds how
+# long other containers can keep serving a user that was updated or deleted elsewhere.
+principal_cache = TTLCache(max_size=PRINCIPAL_CACHE_MAX_SIZE, ttl_seconds=PRINCIPAL_CACHE_TTL_SECONDS)
 
 
-def verify_password(password: str, hashed_password: str):
+def _hash_password(password: str) -> bytes:
+    import bcrypt
+
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(BCRYPT_ROUNDS))
+
+
+def _verify_password(password: str, hashed_password: bytes) -> bool:
+    import bcrypt
+
     return bcrypt.checkpw(password.encode(), hashed_password)
 
 
-def authenticate_user(email: str, password: str, session: Session):
-    user = session.exec(select(User).where(User.email == email)).first()
-    if not user:
+def _get_password_hashing_executor() -> ThreadPoolExecutor:
+    global _password_hashing_executor
+    if _password_hashing_executor is None:
+        _password_hashing_executor = ThreadPoolExecutor(
+            max_workers=PASSWORD_HASHING_WORKERS, thread_name_prefix="password-hashing"
+        )
+    return _password_hashing_executor
+
+
+async def _run_password_hashing(fn: Callable[..., Any], *args: Any) -> Any:
+    async with password_hashing_admission.admit(Priority.AUTH):
+        with timed("password_hashing"):
+            return await asyncio.wrap_future(_get_password_hashing_executor().submit(fn, *args))
+
+
+async def hash_password(password: str) -> bytes:
+    return await _run_password_hashing(_hash_password, password)
+
+
+async def verify_password(password: str, hashed_password: bytes) -> bool:
+    return await _run_password_hashing(_verify_password, password, hashed_password)
+
+
+def password_needs_rehash(hashed_password: bytes) -> bool:
+    # bcrypt hashes have the form $2b$<cost>$<salt and hash>
+    return int(hashed_password.split(b"$")[2]) != BCRYPT_ROUNDS
+
+
+async def authenticate_user(email: str, password: str, session: AsyncSession):
+    user = (await session.exec(select(User).where(User.email == email))).first()
+    if not user or user.deleted_at:
         return False
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password(password, user.hashed_password):
         return False
     return user
 
@@ -49,20 +114,69 @@ def create_access_token(user: User) -> AccessTokenResponse:
     return AccessTokenResponse(access_token=access_token, token_type="bearer")
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), session: Session = Depends(get_session)) -> User:
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+def invalidate_principal(user_id: UUID):
+    principal_cache.pop(user_id)
+
+
+def _decode_access_token(token: str) -> dict[str, Any]:
+    jwt_secret_keys = get_jwt_verification_keys()
+    for jwt_secret_key in jwt_secret_keys[:-1]:
+        try:
+            return jwt.decode(token, jwt_secret_key, [JWT_ALGORITHM])
+        except InvalidSignatureError:
+            continue
+    return jwt.decode(token, jwt_secret_keys[-1], [JWT_ALGORITHM])
+
+
+def _get_token_user_id(token: str) -> UUID:
     try:
-        payload = jwt.decode(token, get_jwt_secret_key(), [JWT_ALGORITHM])
-        user_id = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-    except InvalidTokenError:
-        raise credentials_exception
-    user = session.get(User, user_id)
-    if user is None:
-        raise credentials_exception
-    return user
+        payload = _decode_access_token(token)
+        return UUID(payload["sub"])
+    except (InvalidTokenError, KeyError, TypeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+async def _load_current_user(token: str, session: AsyncSession) -> UserPublic:
+    user_id = _get_token_user_id(token)
+    current_user = principal_cache.get(user_id)
+    if current_user is None:
+        user = await session.get(User, user_id)
+        if user is None or user.deleted_at:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Could not validate credentials",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        current_user = UserPublic.model_validate(user)
+        principal_cache.set(user_id, current_user)
+    return current_user
+
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme), session: AsyncSession = Depends(get_session)
+) -> UserPublic:
+    # Every route that writes depends on this, so the account's existence and deleted_at are checked whatever
+    # TRUST_TOKEN_CLAIMS is set to. Deleting an account invalidates its principal only in the container that handled
+    # the request; others keep accepting its token for up to PRINCIPAL_CACHE_TTL_SECONDS.
+    with timed("auth"):
+        current_user = await _load_current_user(token, session)
+        await check_rate_limit(f"user:{current_user.id}")
+        return current_user
+
+
+async def get_current_user_id(
+    token: str = Depends(oauth2_scheme), session: AsyncSession = Depends(get_session)
+) -> UUID:
+    # For read-only routes. With TRUST_TOKEN_CLAIMS set it only verifies the token, so a deleted account can read
+    # what is left of its data until the token expires; writes go through get_current_user instead.
+    with timed("auth"):
+        if TRUST_TOKEN_CLAIMS:
+            current_user_id = _get_token_user_id(token)
+        else:
+            current_user_id = (await _load_current_user(token, session)).id
+        await check_rate_limit(f"user:{current_user_id}")
+        return current_user_id
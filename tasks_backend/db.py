@@ -1,37 +1,354 @@
 import logging
-from typing import Generator
+import os
+import time
+from collections.abc import AsyncGenerator, AsyncIterator, Callable
+from contextlib import AbstractAsyncContextManager, asynccontextmanager
+from typing import Any
 
+import anyio
 from dotenv import load_dotenv
-from sqlalchemy.engine import Engine
-from sqlmodel import Session, SQLModel, create_engine
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, Pool, QueuePool
+from sqlmodel import Session, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.concurrency import run_in_threadpool
 
-from tasks_backend.utils.get_db_url import get_db_url
+from tasks_backend import metrics
+from tasks_backend.admission import AdmissionController, Priority, route_priority
+from tasks_backend.instrumentation import instrument_engine
+from tasks_backend.utils.get_db_url import get_db_credentials, get_db_url, get_reader_db_url
+from tasks_backend.utils.ttl_cache import TTLCache
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+DB_MODE = os.environ.get("DB_MODE", "async").lower()
+DB_ECHO = os.environ.get("DB_ECHO", "False").lower() == "true"
+DEFAULT_DB_POOL_PROFILE = "serverless" if "AWS_LAMBDA_FUNCTION_NAME" in os.environ else "server"
+DB_POOL_PROFILE = os.environ.get("DB_POOL_PROFILE", DEFAULT_DB_POOL_PROFILE).lower()
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+# serverless: one connection per container, recycled before Aurora's idle auto-pause and pinged on checkout
+# so a resumed cluster never hands out a dead connection. null: open and close a connection per session.
+# server: a long-running process serving concurrent requests.
+POOL_PROFILES: dict[str, dict[str, Any]] = {
+    "serverless": {"pool_size": 1, "max_overflow": 1, "pool_timeout": 5, "pool_recycle": 240, "pool_pre_ping": True},
+    "null": {"poolclass": NullPool},
+    "server": {"pool_size": 10, "max_overflow": 10, "pool_timeout": 10, "pool_recycle": 1800, "pool_pre_ping": True},
+}
+if DB_POOL_PROFILE not in POOL_PROFILES:
+    raise ValueError(f"Unknown DB_POOL_PROFILE {DB_POOL_PROFILE}, expected one of {', '.join(POOL_PROFILES)}")
+pool_profile = POOL_PROFILES[DB_POOL_PROFILE]
+DB_SYNC_SESSION_LIMIT = int(
+    os.environ.get("DB_SYNC_SESSION_LIMIT", pool_profile.get("pool_size", 10) + pool_profile.get("max_overflow", 0))
+)
+
+# Requests beyond the pool's capacity wait for a session in priority order, or are shed, before they reach the
+# pool, where they would all wait first come first served until pool_timeout
+DB_ADMISSION_LIMIT = int(
+    os.environ.get("DB_ADMISSION_LIMIT", pool_profile.get("pool_size", 10) + pool_profile.get("max_overflow", 0))
+)
+DB_ADMISSION_QUEUE_LIMIT = int(os.environ.get("DB_ADMISSION_QUEUE_LIMIT", "100"))
+DB_ADMISSION_MAX_WAIT_SECONDS = float(os.environ.get("DB_ADMISSION_MAX_WAIT_SECONDS", "2"))
+
+READ_YOUR_WRITES_SECONDS = float(os.environ.get("READ_YOUR_WRITES_SECONDS", "5"))
+READ_YOUR_WRITES_MAX_USERS = 10000
+
 engine: Engine | None = None
+async_engine: AsyncEngine | None = None
+sync_session_limiter: anyio.CapacityLimiter | None = None
+reader_engine: Engine | None = None
+async_reader_engine: AsyncEngine | None = None
+reader_sync_session_limiter: anyio.CapacityLimiter | None = None
+reader_db_url: str | None = None
+reader_db_url_loaded = False
+
+# Users who wrote through this container within READ_YOUR_WRITES_SECONDS. Their reads skip the reader
+# without having to ask it whether it has caught up.
+recent_writes = TTLCache(max_size=READ_YOUR_WRITES_MAX_USERS, ttl_seconds=READ_YOUR_WRITES_SECONDS)
+
+db_admission = AdmissionController(
+    "db",
+    limit=DB_ADMISSION_LIMIT,
+    queue_limit=DB_ADMISSION_QUEUE_LIMIT,
+    max_wait_seconds=DB_ADMISSION_MAX_WAIT_SECONDS,
+    shed_detail="Too many database requests in progress",
+)
+
+
+def _timed_pool_class(pool_class: type[Pool], engine_name: str) -> type[Pool]:
+    class TimedPool(pool_class):
+        def _do_get(self):
+            started_at = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                metrics.observe("db_pool_checkout_wait_seconds", time.perf_counter() - started_at, engine=engine_name)
+
+    return TimedPool
+
+
+def _pool_options(default_pool_class: type[Pool], engine_name: str) -> dict[str, Any]:
+    pool_options = dict(pool_profile)
+    pool_options["poolclass"] = _timed_pool_class(pool_options.get("poolclass", default_pool_class), engine_name)
+    return pool_options
+
+
+def _instrument_pool(pool: Pool, engine_name: str):
+    def on_connect(dbapi_connection, connection_record):
+        metrics.increment("db_connections_opened_total", engine=engine_name)
+        metrics.adjust_gauge("db_connections_open", 1, engine=engine_name)
+
+    def on_close(dbapi_connection, connection_record):
+        metrics.adjust_gauge("db_connections_open", -1, engine=engine_name)
+
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.adjust_gauge("db_pool_checked_out", 1, engine=engine_name)
+
+    def on_checkin(dbapi_connection, connection_record):
+        metrics.adjust_gauge("db_pool_checked_out", -1, engine=engine_name)
+
+    event.listen(pool, "connect", on_connect)
+    event.listen(pool, "close", on_close)
+    event.listen(pool, "checkout", on_checkout)
+    event.listen(pool, "checkin", on_checkin)
+
+
+def _use_current_db_credentials(engine: Engine):
+    # New connections read the credentials from the secrets cache rather than the URL the engine was created
+    # with, so a rotated database password is picked up without recreating the engine
+    def on_do_connect(dialect, connection_record, connection_args, connection_params):
+        db_credentials = get_db_credentials()
+        if db_credentials:
+            connection_params["user"], connection_params["password"] = db_credentials
+
+    event.listen(engine, "do_connect", on_do_connect)
+
+
+def _enable_sqlite_foreign_keys(engine: Engine):
+    # SQLite leaves foreign keys unenforced unless asked on every connection, and ON DELETE CASCADE with them
+    if engine.dialect.name != "sqlite":
+        return
+
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys = ON")
+        cursor.close()
+
+    event.listen(engine, "connect", on_connect)
+
+
+def _create_sync_engine(db_url: str, engine_name: str) -> Engine:
+    sync_engine = create_engine(db_url, echo=DB_ECHO, **_pool_options(QueuePool, engine_name))
+    _instrument_pool(sync_engine.pool, engine_name)
+    _use_current_db_credentials(sync_engine)
+    _enable_sqlite_foreign_keys(sync_engine)
+    instrument_engine(sync_engine)
+    logger.info(f"Created {engine_name} engine with {DB_POOL_PROFILE} pool profile")
+    return sync_engine
+
+
+def _create_async_engine(db_url: str, engine_name: str) -> AsyncEngine:
+    url = make_url(db_url)
+    async_db_url = url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+    new_async_engine = create_async_engine(
+        async_db_url, echo=DB_ECHO, **_pool_options(AsyncAdaptedQueuePool, engine_name)
+    )
+    _instrument_pool(new_async_engine.sync_engine.pool, engine_name)
+    _use_current_db_credentials(new_async_engine.sync_engine)
+    _enable_sqlite_foreign_keys(new_async_engine.sync_engine)
+    instrument_engine(new_async_engine.sync_engine)
+    logger.info(f"Created {engine_name} engine with {DB_POOL_PROFILE} pool profile")
+    return new_async_engine
 
 
 def get_engine():
     global engine
     if engine is None:
-        db_url = get_db_url()
-        engine = create_engine(db_url, echo=True)
+        engine = _create_sync_engine(get_db_url(), "sync")
     return engine
 
 
-def get_session() -> Generator[Session, None, None]:
-    engine = get_engine()
-    with Session(engine) as session:
+def get_async_engine():
+    global async_engine
+    if async_engine is None:
+        async_engine = _create_async_engine(get_db_url(), "async")
+    return async_engine
+
+
+def _get_reader_db_url() -> str | None:
+    global reader_db_url, reader_db_url_loaded
+    if not reader_db_url_loaded:
+        reader_db_url = get_reader_db_url()
+        reader_db_url_loaded = True
+    return reader_db_url
+
+
+def has_reader() -> bool:
+    return _get_reader_db_url() is not None
+
+
+def get_reader_engine():
+    global reader_engine
+    if reader_engine is None:
+        reader_engine = _create_sync_engine(_get_reader_db_url(), "sync_reader")
+    return reader_engine
+
+
+def get_async_reader_engine():
+    global async_reader_engine
+    if async_reader_engine is None:
+        async_reader_engine = _create_async_engine(_get_reader_db_url(), "async_reader")
+    return async_reader_engine
+
+
+def get_pool_metrics() -> dict[str, list[dict]]:
+    pool_metrics = metrics.snapshot()
+    return {
+        metric_type: [metric for metric in metric_list if metric["name"].startswith("db_")]
+        for metric_type, metric_list in pool_metrics.items()
+    }
+
+
+class ThreadedSession:
+    # Exposes the subset of the AsyncSession API used by the routers on top of a blocking Session,
+    # running each database call in the threadpool. Used when DB_MODE=sync.
+    def __init__(self, sync_session: Session):
+        self.sync_session = sync_session
+
+    @property
+    def bind(self):
+        return self.sync_session.bind
+
+    def add(self, instance: Any):
+        self.sync_session.add(instance)
+
+    def add_all(self, instances: list[Any]):
+        self.sync_session.add_all(instances)
+
+    async def exec(self, statement, **kwargs):
+        return await run_in_threadpool(self.sync_session.exec, statement, **kwargs)
+
+    async def execute(self, statement, params=None, **kwargs):
+        return await run_in_threadpool(self.sync_session.execute, statement, params, **kwargs)
+
+    async def scalar(self, statement, params=None, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalar, statement, params, **kwargs)
+
+    async def get(self, entity, ident, **kwargs):
+        return await run_in_threadpool(self.sync_session.get, entity, ident, **kwargs)
+
+    async def refresh(self, instance: Any, attribute_names: list[str] | None = None):
+        await run_in_threadpool(self.sync_session.refresh, instance, attribute_names)
+
+    async def delete(self, instance: Any):
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def flush(self):
+        await run_in_threadpool(self.sync_session.flush)
+
+    async def commit(self):
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self):
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def run_sync(self, fn: Callable[..., Any], *args, **kwargs):
+        return await run_in_threadpool(fn, self.sync_session, *args, **kwargs)
+
+
+def get_sync_session_limiter():
+    # A ThreadedSession holds its connection across several threadpool hops, so requests waiting on the pool
+    # must wait here instead of blocking the threads that the connection holders need to finish.
+    global sync_session_limiter
+    if sync_session_limiter is None:
+        sync_session_limiter = anyio.CapacityLimiter(DB_SYNC_SESSION_LIMIT)
+    return sync_session_limiter
+
+
+def get_reader_sync_session_limiter():
+    # The reader has a pool of its own, so a request holding a writer session never waits on writer capacity
+    # to get a reader session
+    global reader_sync_session_limiter
+    if reader_sync_session_limiter is None:
+        reader_sync_session_limiter = anyio.CapacityLimiter(DB_SYNC_SESSION_LIMIT)
+    return reader_sync_session_limiter
+
+
+@asynccontextmanager
+async def _open_session(
+    sync_engine_getter: Callable[[], Engine],
+    async_engine_getter: Callable[[], AsyncEngine],
+    limiter_getter: Callable[[], anyio.CapacityLimiter],
+) -> AsyncIterator[AsyncSession]:
+    if DB_MODE == "sync":
+        async with limiter_getter():
+            sync_session = Session(sync_engine_getter(), expire_on_commit=False)
+            try:
+                yield ThreadedSession(sync_session)
+            finally:
+                await run_in_threadpool(sync_session.close)
+    else:
+        async with AsyncSession(async_engine_getter(), expire_on_commit=False) as session:
+            yield session
+
+
+async def get_session(request: Request) -> AsyncGenerator[AsyncSession]:
+    async with (
+        db_admission.admit(route_priority(request)),
+        _open_session(get_engine, get_async_engine, get_sync_session_limiter) as session,
+    ):
+        yield session
+
+
+def reader_session_scope() -> AbstractAsyncContextManager[AsyncSession]:
+    # Session on the read-only replica. Callers check has_reader(), and that the replica has caught up, first.
+    return _open_session(get_reader_engine, get_async_reader_engine, get_reader_sync_session_limiter)
+
+
+def note_write(user_id: Any):
+    recent_writes.set(user_id, True)
+
+
+def wrote_recently(user_id: Any) -> bool:
+    return recent_writes.get(user_id) is not None
+
+
+def dialect_insert(session: AsyncSession, entity: Any):
+    # INSERT construct of the session's dialect, for ON CONFLICT clauses
+    dialect_name = session.bind.dialect.name
+    if dialect_name == "postgresql":
+        return postgresql.insert(entity)
+    if dialect_name == "sqlite":
+        return sqlite.insert(entity)
+    raise ValueError(f"ON CONFLICT inserts are not supported on {dialect_name}")
+
+
+@asynccontextmanager
+async def session_scope(priority: Priority = Priority.LIST_READ) -> AsyncIterator[AsyncSession]:
+    # get_session for work that outlives the request's dependencies, such as generating a streamed response body
+    async with (
+        db_admission.admit(priority),
+        _open_session(get_engine, get_async_engine, get_sync_session_limiter) as session,
+    ):
         yield session
 
 
-def create_tables():
-    engine = get_engine()
-    # SQLModel.metadata.drop_all(engine)
-    tables_list = ", ".join(table_name for table_name in SQLModel.metadata.tables)
-    logger.info(f"Creating tables {tables_list} from SQLModel metadata")
-    SQLModel.metadata.create_all(engine)
+async def stream_partitions(session: AsyncSession, statement, partition_size: int) -> AsyncIterator[list]:
+    # Reads a result through a server-side cursor, partition_size rows at a time
+    statement = statement.execution_options(yield_per=partition_size)
+    if isinstance(session, ThreadedSession):
+        result = await run_in_threadpool(session.sync_session.execute, statement)
+        partitions = result.partitions()
+        while partition := await run_in_threadpool(next, partitions, None):
+            yield partition
+    else:
+        result = await session.stream(statement)
+        async for partition in result.partitions():
+            yield partition
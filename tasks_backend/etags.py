@@ -0,0 +1,35 @@
+from uuid import UUID
+
+from fastapi import Depends, HTTPException, Request, Response, status
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from tasks_backend.auth import get_current_user_id
+from tasks_backend.db import get_session
+from tasks_backend.models.data_versions import get_data_version
+
+
+def _if_none_match_tags(request: Request) -> set[str]:
+    if_none_match = request.headers.get("If-None-Match")
+    if not if_none_match:
+        return set()
+    return {tag.strip() for tag in if_none_match.split(",")}
+
+
+async def check_data_version_etag(
+    request: Request,
+    response: Response,
+    current_user_id: UUID = Depends(get_current_user_id),
+    session: AsyncSession = Depends(get_session),
+):
+    # Every task and category response for a user is derived from the same data, so a single per-user version
+    # identifies them all. It is read before the route loads anything, so a concurrent write can only make the
+    # tag older than the body, which costs the client a refetch rather than a stale cache.
+    data_version = await get_data_version(current_user_id, session)
+    # Lets get_read_session check the replica against this version without reading it again
+    request.state.data_version = data_version
+    etag = f'W/"{current_user_id}-{data_version}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if_none_match_tags = _if_none_match_tags(request)
+    if etag in if_none_match_tags or "*" in if_none_match_tags:
+        raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
@@ -0,0 +1,139 @@
+import csv
+import io
+import os
+import zlib
+from collections.abc import AsyncIterator, Iterator
+from uuid import UUID
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from tasks_backend.db import session_scope, stream_partitions
+from tasks_backend.models.archived_tasks import TASK_COLUMN_NAMES, ArchivedTask, ArchivedTaskCategoryLink
+from tasks_backend.models.categories import Category
+from tasks_backend.models.links import TaskCategoryLink
+from tasks_backend.models.shared import TaskPublicWithCategories
+from tasks_backend.models.tasks import Task, TaskFileFormat
+from tasks_backend.read_sessions import read_session_scope
+from tasks_backend.utils.serialization import get_type_adapter
+
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", "500"))
+EXPORT_GZIP_LEVEL = 6
+CSV_COLUMNS = [
+    "id",
+    "name",
+    "description",
+    "due_date",
+    "status",
+    "created_at",
+    "updated_at",
+    "category_ids",
+    "category_names",
+]
+
+# Archived tasks follow the task table's, with their archived_at in the NDJSON
+EXPORT_TABLES = [
+    (Task, TaskCategoryLink, [getattr(Task, name) for name in TASK_COLUMN_NAMES]),
+    (
+        ArchivedTask,
+        ArchivedTaskCategoryLink,
+        [getattr(ArchivedTask, name) for name in TASK_COLUMN_NAMES] + [ArchivedTask.archived_at],
+    ),
+]
+
+
+async def _get_task_categories(
+    task_ids: list[UUID], link_model: type[TaskCategoryLink] | type[ArchivedTaskCategoryLink], session: AsyncSession
+) -> dict[UUID, list[dict]]:
+    statement = (
+        select(link_model.task_id, Category.id, Category.name, Category.colour)
+        .join(Category, Category.id == link_model.category_id)
+        .where(link_model.task_id.in_(task_ids))
+        .order_by(Category.name)
+    )
+    task_categories: dict[UUID, list[dict]] = {}
+    for task_id, category_id, name, colour in (await session.exec(statement)).all():
+        task_categories.setdefault(task_id, []).append({"id": category_id, "name": name, "colour": colour})
+    return task_categories
+
+
+def _ndjson_lines(tasks: list[dict]) -> Iterator[bytes]:
+    type_adapter = get_type_adapter(TaskPublicWithCategories)
+    for task in tasks:
+        yield type_adapter.dump_json(type_adapter.validate_python(task)) + b"\n"
+
+
+def _csv_rows(tasks: list[dict], include_header: bool) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if include_header:
+        writer.writerow(CSV_COLUMNS)
+    for task in tasks:
+        writer.writerow(
+            [
+                task["id"],
+                task["name"],
+                task["description"] or "",
+                task["due_date"].isoformat() if task["due_date"] else "",
+                task["status"].value,
+                task["created_at"].isoformat(),
+                task["updated_at"].isoformat() if task["updated_at"] else "",
+                ";".join(str(category["id"]) for category in task["categories"]),
+                ";".join(category["name"] for category in task["categories"]),
+            ]
+        )
+    return buffer.getvalue().encode()
+
+
+async def _export_chunks(user_id: UUID, export_format: TaskFileFormat) -> AsyncIterator[bytes]:
+    # Opens its own session because the body is generated after the route has returned. Only one partition of
+    # tasks and its categories is held in memory at a time.
+    async with session_scope() as writer_session, read_session_scope(user_id, writer_session) as session:
+        include_header = True
+        for model, link_model, columns in EXPORT_TABLES:
+            statement = select(*columns).where(model.user_id == user_id).order_by(model.created_at, model.id)
+            async for partition in stream_partitions(session, statement, EXPORT_BATCH_SIZE):
+                tasks = [dict(row._mapping) for row in partition]
+                task_categories = await _get_task_categories([task["id"] for task in tasks], link_model, session)
+                for task in tasks:
+                    task["categories"] = task_categories.get(task["id"], [])
+                if export_format == TaskFileFormat.NDJSON:
+                    yield b"".join(_ndjson_lines(tasks))
+                else:
+                    yield _csv_rows(tasks, include_header)
+                    include_header = False
+        if include_header and export_format == TaskFileFormat.CSV:
+            yield _csv_rows([], include_header)
+
+
+async def _gzip_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(EXPORT_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        compressed_chunk = compressor.compress(chunk)
+        if compressed_chunk:
+            yield compressed_chunk
+    yield compressor.flush()
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    # gzip, or * when gzip is not listed, with a q-value above zero. An unparseable q-value counts as zero.
+    qualities = {}
+    for element in accept_encoding.lower().split(","):
+        coding, *parameters = (part.strip() for part in element.split(";"))
+        quality = 1.0
+        for parameter in parameters:
+            name, _, value = parameter.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value.strip())
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            qualities[coding] = quality
+    quality = qualities.get("gzip", qualities.get("x-gzip", qualities.get("*", 0.0)))
+    return quality > 0
+
+
+def stream_task_export(user_id: UUID, export_format: TaskFileFormat, gzip: bool) -> AsyncIterator[bytes]:
+    chunks = _export_chunks(user_id, export_format)
+    return _gzip_chunks(chunks) if gzip else chunks
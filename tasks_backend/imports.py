@@ -0,0 +1,250 @@
+import codecs
+import csv
+import json
+import os
+import zlib
+from collections.abc import AsyncIterator
+from typing import Any
+from uuid import UUID, uuid4
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from tasks_backend.models.categories import Category
+from tasks_backend.models.data_versions import bump_data_version
+from tasks_backend.models.links import TaskCategoryLink
+from tasks_backend.models.task_stats import update_task_stats
+from tasks_backend.models.tasks import Task, TaskFileFormat, TaskImport, TaskImportError, TaskImportResult
+from tasks_backend.utils.utils import get_current_utc_time
+
+IMPORT_BATCH_SIZE = int(os.environ.get("IMPORT_BATCH_SIZE", "1000"))
+MAX_IMPORT_ROW_BYTES = 64 * 1024
+MAX_IMPORT_ERRORS = 1000
+IMPORTED_CATEGORY_COLOUR = 0x9E9E9E
+COPY_TASK_COLUMNS = ["id", "user_id", "name", "description", "due_date", "status", "created_at", "updated_at"]
+
+
+async def _decompress(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        yield decompressor.decompress(chunk)
+    yield decompressor.flush()
+
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    # utf-8-sig drops the byte order mark spreadsheet applications put at the start of CSV files
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n"
+        if len(pending) > MAX_IMPORT_ROW_BYTES:
+            yield pending
+            pending = ""
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+class RowTooLong(ValueError):
+    def __init__(self, row: int):
+        super().__init__(f"Row is longer than {MAX_IMPORT_ROW_BYTES} bytes, the rest of the file was not imported")
+        self.row = row
+
+
+async def _ndjson_records(lines: AsyncIterator[str]) -> AsyncIterator[Any]:
+    row = 0
+    async for line in lines:
+        if not line.strip():
+            continue
+        row += 1
+        if len(line) > MAX_IMPORT_ROW_BYTES:
+            raise RowTooLong(row)
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        # Accepts the categories of an export, so exported files can be imported unchanged
+        if isinstance(record, dict) and "category_names" not in record and "categories" in record:
+            categories = record.pop("categories") or []
+            record["category_names"] = [
+                category.get("name") if isinstance(category, dict) else category for category in categories
+            ]
+        yield record
+
+
+async def _csv_records(lines: AsyncIterator[str]) -> AsyncIterator[Any]:
+    header = None
+    row = 0
+    pending = ""
+    async for line in lines:
+        pending += line
+        if len(pending) > MAX_IMPORT_ROW_BYTES:
+            raise RowTooLong(row + 1)
+        # A quoted field can span lines; the record is complete once its quotes are balanced
+        if pending.count('"') % 2:
+            continue
+        values = next(csv.reader([pending]), [])
+        pending = ""
+        if not any(value.strip() for value in values):
+            continue
+        if header is None:
+            header = [column.strip() for column in values]
+            continue
+        row += 1
+        if len(values) > len(header):
+            yield None
+            continue
+        # Empty cells mean "not set", so optional fields and the status fall back to their defaults
+        record = {column: value for column, value in zip(header, values) if value != ""}
+        category_names = record.get("category_names")
+        record["category_names"] = [name for name in category_names.split(";") if name] if category_names else []
+        yield record
+    if pending:
+        yield None
+
+
+def _validation_error_detail(e: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors())
+
+
+async def _resolve_categories(user_id: UUID, names: set[str], session: AsyncSession) -> dict[str, UUID]:
+    # Looks up every category name used in the batch at once and creates the missing ones
+    if not names:
+        return {}
+    statement = select(Category.name, Category.id).where(Category.user_id == user_id, Category.name.in_(names))
+    category_ids = {}
+    for name, category_id in (await session.exec(statement)).all():
+        category_ids.setdefault(name, category_id)
+    missing_names = sorted(names - category_ids.keys())
+    if missing_names:
+        updated_at = get_current_utc_time()
+        new_categories = [
+            {
+                "id": uuid4(),
+                "user_id": user_id,
+                "name": name,
+                "colour": IMPORTED_CATEGORY_COLOUR,
+                "updated_at": updated_at,
+            }
+            for name in missing_names
+        ]
+        await session.execute(insert(Category), new_categories)
+        category_ids.update({category["name"]: category["id"] for category in new_categories})
+    return category_ids
+
+
+async def _copy_tasks(session: AsyncSession, task_rows: list[dict]):
+    # COPY runs on the raw asyncpg connection. The stats update has already begun the session's transaction on
+    # that connection, so the copied rows commit or roll back with the rest of the batch.
+    connection = await session.connection()
+    raw_connection = await connection.get_raw_connection()
+    records = [
+        (
+            task_row["id"],
+            task_row["user_id"],
+            task_row["name"],
+            task_row["description"],
+            task_row["due_date"],
+            task_row["status"].name,
+            task_row["created_at"],
+            task_row["updated_at"],
+        )
+        for task_row in task_rows
+    ]
+    await raw_connection.driver_connection.copy_records_to_table("task", records=records, columns=COPY_TASK_COLUMNS)
+
+
+async def _insert_tasks(session: AsyncSession, task_rows: list[dict]):
+    if not task_rows:
+        return
+    if session.bind.dialect.driver == "asyncpg":
+        await _copy_tasks(session, task_rows)
+    else:
+        await session.execute(insert(Task), task_rows)
+
+
+async def _import_batch(user_id: UUID, batch: list[tuple[int, TaskImport]], session: AsyncSession):
+    category_names = {name for _, task_import in batch for name in task_import.category_names}
+    category_ids = await _resolve_categories(user_id, category_names, session)
+    created_at = get_current_utc_time()
+    task_rows = []
+    link_rows = []
+    stats_entries = []
+    for _, task_import in batch:
+        task_id = uuid4()
+        task_category_ids = {category_ids[name] for name in task_import.category_names}
+        task_rows.append(
+            {
+                "id": task_id,
+                "user_id": user_id,
+                "name": task_import.name,
+                "description": task_import.description,
+                "due_date": task_import.due_date,
+                "status": task_import.status,
+                "created_at": created_at,
+                "updated_at": created_at,
+            }
+        )
+        link_rows.extend({"task_id": task_id, "category_id": category_id} for category_id in task_category_ids)
+        stats_entries.append((task_import.status, frozenset(task_category_ids), task_import.due_date))
+    await update_task_stats(user_id, session, added=stats_entries)
+    await _insert_tasks(session, task_rows)
+    if link_rows:
+        await session.execute(insert(TaskCategoryLink), link_rows)
+    await bump_data_version(user_id, session)
+    await session.commit()
+
+
+async def import_task_stream(
+    user_id: UUID,
+    chunks: AsyncIterator[bytes],
+    import_format: TaskFileFormat,
+    gzip: bool,
+    session: AsyncSession,
+) -> TaskImportResult:
+    # Parses the upload as it arrives and commits every IMPORT_BATCH_SIZE valid rows, so memory is bounded by
+    # one batch whatever the size of the file. Rows already committed stay imported if a later batch fails.
+    if gzip:
+        chunks = _decompress(chunks)
+    lines = _lines(chunks)
+    records = _ndjson_records(lines) if import_format == TaskFileFormat.NDJSON else _csv_records(lines)
+    created = 0
+    failed = 0
+    errors: list[TaskImportError] = []
+    batch: list[tuple[int, TaskImport]] = []
+    row = 0
+
+    def add_error(row: int, detail: str):
+        nonlocal failed
+        failed += 1
+        if len(errors) < MAX_IMPORT_ERRORS:
+            errors.append(TaskImportError(row=row, detail=detail))
+
+    try:
+        async for record in records:
+            row += 1
+            if not isinstance(record, dict):
+                add_error(row, f"Row is not a valid {import_format.value} record")
+                continue
+            try:
+                batch.append((row, TaskImport.model_validate(record)))
+            except ValidationError as e:
+                add_error(row, _validation_error_detail(e))
+                continue
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                await _import_batch(user_id, batch, session)
+                created += len(batch)
+                batch = []
+    except RowTooLong as e:
+        add_error(e.row, str(e))
+    except zlib.error:
+        add_error(row + 1, "Upload is not valid gzip, the rest of the file was not imported")
+    if batch:
+        await _import_batch(user_id, batch, session)
+        created += len(batch)
+    return TaskImportResult(created=created, failed=failed, errors=errors)
@@ -0,0 +1,159 @@
+import json
+import logging
+import os
+import random
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from tasks_backend import metrics
+
+logger = logging.getLogger(__name__)
+
+REQUEST_METRICS = os.environ.get("REQUEST_METRICS", "True").lower() == "true"
+REQUEST_METRICS_SAMPLE_RATE = float(os.environ.get("REQUEST_METRICS_SAMPLE_RATE", "1.0"))
+SERVER_TIMING_HEADER = os.environ.get("SERVER_TIMING_HEADER", "True").lower() == "true"
+DEFAULT_REQUEST_METRICS_EMF = "True" if "AWS_LAMBDA_FUNCTION_NAME" in os.environ else "False"
+REQUEST_METRICS_EMF = os.environ.get("REQUEST_METRICS_EMF", DEFAULT_REQUEST_METRICS_EMF).lower() == "true"
+EMF_NAMESPACE = os.environ.get("EMF_NAMESPACE", "TasksBackend")
+
+
+@dataclass
+class RequestTimings:
+    started_at: float = field(default_factory=time.perf_counter)
+    db_statements: int = 0
+    db_seconds: float = 0.0
+    spans: dict[str, float] = field(default_factory=dict)
+
+
+_request_timings: ContextVar[RequestTimings | None] = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def timed(span: str) -> Iterator[None]:
+    request_timings = _request_timings.get()
+    if request_timings is None:
+        yield
+        return
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        request_timings.spans[span] = request_timings.spans.get(span, 0.0) + time.perf_counter() - started_at
+
+
+def instrument_engine(engine: Engine):
+    # Statement timings are only collected for sampled requests; outside one the listeners cost a contextvar read
+    def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        if _request_timings.get() is not None:
+            connection.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+    def after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        request_timings = _request_timings.get()
+        if request_timings is not None and connection.info.get("query_started_at"):
+            request_timings.db_statements += 1
+            request_timings.db_seconds += time.perf_counter() - connection.info["query_started_at"].pop()
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+
+def _route_name(scope: dict) -> str:
+    route = scope.get("route")
+    if route is not None and hasattr(route, "path"):
+        return route.path
+    endpoint = scope.get("endpoint")
+    return endpoint.__name__ if endpoint is not None else "unmatched"
+
+
+def _server_timing(request_timings: RequestTimings, total_seconds: float) -> bytes:
+    entries = [
+        f"total;dur={total_seconds * 1000:.2f}",
+        f'db;dur={request_timings.db_seconds * 1000:.2f};desc="{request_timings.db_statements} statements"',
+    ]
+    entries.extend(f"{span};dur={seconds * 1000:.2f}" for span, seconds in request_timings.spans.items())
+    return ", ".join(entries).encode()
+
+
+def _record(scope: dict, status_code: int, request_timings: RequestTimings, total_seconds: float):
+    route = _route_name(scope)
+    labels = {"route": route, "method": scope["method"]}
+    metrics.increment("http_requests_total", **labels, status_code=str(status_code))
+    metrics.observe("http_request_duration_seconds", total_seconds, **labels)
+    metrics.observe("http_request_db_seconds", request_timings.db_seconds, **labels)
+    metrics.observe("http_request_db_statements", request_timings.db_statements, **labels)
+    for span, seconds in request_timings.spans.items():
+        metrics.observe(f"http_request_{span}_seconds", seconds, **labels)
+
+    if REQUEST_METRICS_EMF:
+        span_metrics = {f"{span}_ms": round(seconds * 1000, 3) for span, seconds in request_timings.spans.items()}
+        metric_values = {
+            "latency_ms": round(total_seconds * 1000, 3),
+            "db_ms": round(request_timings.db_seconds * 1000, 3),
+            "db_statements": request_timings.db_statements,
+            **span_metrics,
+        }
+        emf_record = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [
+                    {
+                        "Namespace": EMF_NAMESPACE,
+                        "Dimensions": [["route", "method"]],
+                        "Metrics": [
+                            {"Name": name, "Unit": "Count" if name == "db_statements" else "Milliseconds"}
+                            for name in metric_values
+                        ],
+                    }
+                ],
+            },
+            **labels,
+            "status_code": status_code,
+            **metric_values,
+        }
+        # Written straight to stdout: CloudWatch only extracts EMF from lines that are pure JSON
+        print(json.dumps(emf_record), flush=True)
+
+
+class InstrumentationMiddleware:
+    # Pure ASGI middleware so un-sampled requests pay for a single random() call and no extra task or buffering
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not REQUEST_METRICS
+            or (REQUEST_METRICS_SAMPLE_RATE < 1 and random.random() >= REQUEST_METRICS_SAMPLE_RATE)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        request_timings = RequestTimings()
+        token = _request_timings.set(request_timings)
+        status_code = 500
+
+        async def send_with_server_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if SERVER_TIMING_HEADER:
+                    total_seconds = time.perf_counter() - request_timings.started_at
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", _server_timing(request_timings, total_seconds)))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_server_timing)
+        finally:
+            _request_timings.reset(token)
+            try:
+                _record(scope, status_code, request_timings, time.perf_counter() - request_timings.started_at)
+            except Exception:
+                logger.exception("Recording request metrics failed")
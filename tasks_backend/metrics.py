@@ -0,0 +1,82 @@
+import threading
+from collections import defaultdict
+
+MetricKey = tuple[str, tuple[tuple[str, str], ...]]
+
+_lock = threading.Lock()
+_counters: dict[MetricKey, float] = defaultdict(float)
+_gauges: dict[MetricKey, float] = defaultdict(float)
+_summaries: dict[MetricKey, dict[str, float]] = {}
+
+
+def _key(name: str, labels: dict[str, str]) -> MetricKey:
+    return name, tuple(sorted(labels.items()))
+
+
+def increment(name: str, value: float = 1, **labels: str):
+    with _lock:
+        _counters[_key(name, labels)] += value
+
+
+def set_gauge(name: str, value: float, **labels: str):
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def adjust_gauge(name: str, delta: float, **labels: str):
+    with _lock:
+        _gauges[_key(name, labels)] += delta
+
+
+def observe(name: str, value: float, **labels: str):
+    with _lock:
+        summary = _summaries.setdefault(_key(name, labels), {"count": 0, "sum": 0.0, "max": 0.0})
+        summary["count"] += 1
+        summary["sum"] += value
+        summary["max"] = max(summary["max"], value)
+
+
+def snapshot() -> dict[str, list[dict]]:
+    with _lock:
+        return {
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value} for (name, labels), value in _counters.items()
+            ],
+            "gauges": [
+                {"name": name, "labels": dict(labels), "value": value} for (name, labels), value in _gauges.items()
+            ],
+            "summaries": [
+                {"name": name, "labels": dict(labels), **summary} for (name, labels), summary in _summaries.items()
+            ],
+        }
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _prometheus_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in labels.items()) + "}"
+
+
+def render_prometheus() -> str:
+    # Prometheus text exposition format. Summaries export _count and _sum, plus the maximum as a _max gauge.
+    metrics_snapshot = snapshot()
+    series_by_name: dict[tuple[str, str], list[str]] = defaultdict(list)
+    for metric_type, metric_list in (("counter", metrics_snapshot["counters"]), ("gauge", metrics_snapshot["gauges"])):
+        for metric in metric_list:
+            labels = _prometheus_labels(metric["labels"])
+            series_by_name[metric["name"], metric_type].append(f"{metric['name']}{labels} {metric['value']}")
+    for metric in metrics_snapshot["summaries"]:
+        labels = _prometheus_labels(metric["labels"])
+        series_by_name[metric["name"], "summary"].extend(
+            [f"{metric['name']}_count{labels} {metric['count']}", f"{metric['name']}_sum{labels} {metric['sum']}"]
+        )
+        series_by_name[f"{metric['name']}_max", "gauge"].append(f"{metric['name']}_max{labels} {metric['max']}")
+    lines = []
+    for (name, metric_type), series in sorted(series_by_name.items()):
+        lines.append(f"# TYPE {name} {metric_type}")
+        lines.extend(series)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,70 @@
+import logging
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+from tasks_backend.migrations.versions import MIGRATIONS
+from tasks_backend.utils.utils import get_current_utc_time
+
+logger = logging.getLogger(__name__)
+
+LATEST_SCHEMA_VERSION = MIGRATIONS[-1].VERSION
+MIGRATION_LOCK_KEY = 7_261_001
+
+schema_version_table = Table(
+    "schema_version",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime(timezone=True), nullable=False),
+)
+
+
+def get_schema_version(connection: Connection) -> int:
+    try:
+        return connection.execute(select(func.max(schema_version_table.c.version))).scalar() or 0
+    except (OperationalError, ProgrammingError):
+        connection.rollback()
+        return 0
+
+
+def check_schema_version(engine: Engine) -> int:
+    with engine.connect() as connection:
+        schema_version = get_schema_version(connection)
+    if schema_version < LATEST_SCHEMA_VERSION:
+        raise RuntimeError(
+            f"Database schema is at version {schema_version}, expected {LATEST_SCHEMA_VERSION}. "
+            "Run `migrate upgrade` to apply pending migrations."
+        )
+    if schema_version > LATEST_SCHEMA_VERSION:
+        logger.warning(f"Database schema version {schema_version} is ahead of code version {LATEST_SCHEMA_VERSION}")
+    return schema_version
+
+
+def _acquire_migration_lock(connection: Connection):
+    if connection.dialect.name == "postgresql":
+        connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+
+
+def upgrade(engine: Engine, target_version: int = LATEST_SCHEMA_VERSION) -> list[int]:
+    with engine.begin() as connection:
+        schema_version_table.create(connection, checkfirst=True)
+
+    applied_versions = []
+    for migration in MIGRATIONS:
+        if migration.VERSION > target_version:
+            break
+        with engine.begin() as connection:
+            _acquire_migration_lock(connection)
+            if migration.VERSION <= get_schema_version(connection):
+                continue
+            logger.info(f"Applying migration {migration.VERSION}: {migration.DESCRIPTION}")
+            migration.upgrade(connection)
+            connection.execute(
+                schema_version_table.insert().values(
+                    version=migration.VERSION, description=migration.DESCRIPTION, applied_at=get_current_utc_time()
+                )
+            )
+        applied_versions.append(migration.VERSION)
+    return applied_versions
@@ -0,0 +1,41 @@
+import argparse
+import logging
+
+from tasks_backend.db import get_engine
+from tasks_backend.migrations import LATEST_SCHEMA_VERSION, MIGRATIONS, get_schema_version, upgrade
+
+logger = logging.getLogger(__name__)
+
+
+def _print_status():
+    with get_engine().connect() as connection:
+        schema_version = get_schema_version(connection)
+    for migration in MIGRATIONS:
+        state = "applied" if migration.VERSION <= schema_version else "pending"
+        print(f"{migration.VERSION:04d} [{state}] {migration.DESCRIPTION}")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="migrate", description="Apply versioned database schema migrations.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    upgrade_parser = subparsers.add_parser("upgrade", help="Apply pending migrations")
+    upgrade_parser.add_argument("--to", type=int, default=LATEST_SCHEMA_VERSION, help="Target schema version")
+    subparsers.add_parser("status", help="List migrations and whether they have been applied")
+    args = parser.parse_args()
+
+    if args.command == "upgrade":
+        applied_versions = upgrade(get_engine(), target_version=args.to)
+        print(f"Applied migrations: {applied_versions}" if applied_versions else "Database schema is up to date")
+    else:
+        _print_status()
+
+
+def lambda_handler(event, context):
+    target_version = (event or {}).get("target_version", LATEST_SCHEMA_VERSION)
+    applied_versions = upgrade(get_engine(), target_version=target_version)
+    logger.info(f"Applied migrations: {applied_versions}")
+    return {"applied_versions": applied_versions}
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+from tasks_backend.migrations.versions import (
+    v0001_initial_schema,
+    v0002_task_pagination_indexes,
+    v0003_user_data_version,
+    v0004_sync_change_tracking,
+    v0005_task_full_text_search,
+    v0006_task_stats,
+    v0007_reverse_lookup_indexes,
+    v0008_cascading_deletes,
+    v0009_task_archive,
+    v0010_timezone_aware_timestamps,
+    v0011_tombstone_retention,
+    v0012_stable_task_search_key,
+)
+
+MIGRATIONS = [
+    v0001_initial_schema,
+    v0002_task_pagination_indexes,
+    v0003_user_data_version,
+    v0004_sync_change_tracking,
+    v0005_task_full_text_search,
+    v0006_task_stats,
+    v0007_reverse_lookup_indexes,
+    v0008_cascading_deletes,
+    v0009_task_archive,
+    v0010_timezone_aware_timestamps,
+    v0011_tombstone_retention,
+    v0012_stable_task_search_key,
+]
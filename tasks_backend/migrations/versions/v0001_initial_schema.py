@@ -0,0 +1,65 @@
+from sqlalchemy import (
+    Column,
+    Date,
+    DateTime,
+    Enum,
+    ForeignKey,
+    Integer,
+    LargeBinary,
+    MetaData,
+    String,
+    Table,
+    Uuid,
+)
+from sqlalchemy.engine import Connection
+
+VERSION = 1
+DESCRIPTION = "Create user, category, task and taskcategorylink tables"
+
+metadata = MetaData()
+
+Table(
+    "user",
+    metadata,
+    Column("first_name", String(50)),
+    Column("last_name", String(50)),
+    Column("id", Uuid, primary_key=True),
+    Column("email", String, nullable=False, unique=True),
+    Column("hashed_password", LargeBinary, nullable=False),
+    Column("created_at", DateTime(timezone=True), nullable=False),
+    Column("updated_at", DateTime(timezone=True)),
+    Column("last_login_at", DateTime(timezone=True)),
+)
+
+Table(
+    "category",
+    metadata,
+    Column("name", String(20), nullable=False),
+    Column("colour", Integer, nullable=False),
+    Column("id", Uuid, primary_key=True, unique=True),
+    Column("user_id", Uuid, ForeignKey("user.id"), primary_key=True),
+)
+
+Table(
+    "task",
+    metadata,
+    Column("name", String(50), nullable=False),
+    Column("description", String(500)),
+    Column("due_date", Date),
+    Column("status", Enum("NOT_STARTED", "IN_PROGRESS", "DONE", name="status"), nullable=False),
+    Column("id", Uuid, primary_key=True),
+    Column("user_id", Uuid, ForeignKey("user.id"), nullable=False),
+    Column("created_at", DateTime(timezone=True), nullable=False),
+    Column("updated_at", DateTime(timezone=True)),
+)
+
+Table(
+    "taskcategorylink",
+    metadata,
+    Column("task_id", Uuid, ForeignKey("task.id"), primary_key=True),
+    Column("category_id", Uuid, ForeignKey("category.id"), primary_key=True),
+)
+
+
+def upgrade(connection: Connection):
+    metadata.create_all(connection, checkfirst=True)
@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Index, MetaData, Table
+from sqlalchemy.engine import Connection
+
+VERSION = 2
+DESCRIPTION = "Add composite indexes for task keyset pagination and filters"
+
+task = Table(
+    "task", MetaData(), *(Column(name) for name in ("id", "user_id", "name", "status", "due_date", "created_at"))
+)
+
+INDEXES = [
+    Index("ix_task_user_id_created_at_id", task.c.user_id, task.c.created_at, task.c.id),
+    Index("ix_task_user_id_name_id", task.c.user_id, task.c.name, task.c.id),
+    Index("ix_task_user_id_status_created_at_id", task.c.user_id, task.c.status, task.c.created_at, task.c.id),
+    Index("ix_task_user_id_due_date", task.c.user_id, task.c.due_date),
+]
+
+
+def upgrade(connection: Connection):
+    for index in INDEXES:
+        index.create(connection, checkfirst=True)
@@ -0,0 +1,26 @@
+from sqlalchemy import Column, ForeignKey, Integer, MetaData, Table, Uuid, literal, select
+from sqlalchemy.engine import Connection
+
+VERSION = 3
+DESCRIPTION = "Add per-user data version used for task and category ETags"
+
+metadata = MetaData()
+
+user = Table("user", metadata, Column("id", Uuid, primary_key=True))
+
+user_data_version = Table(
+    "user_data_version",
+    metadata,
+    Column("user_id", Uuid, ForeignKey("user.id", ondelete="CASCADE"), primary_key=True),
+    Column("version", Integer, nullable=False),
+)
+
+
+def upgrade(connection: Connection):
+    user_data_version.create(connection, checkfirst=True)
+    connection.execute(
+        user_data_version.insert().from_select(
+            ["user_id", "version"],
+            select(user.c.id, literal(0)).where(user.c.id.not_in(select(user_data_version.c.user_id))),
+        )
+    )
@@ -0,0 +1,53 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Index, MetaData, String, Table, Uuid, inspect, text
+from sqlalchemy.engine import Connection
+
+from tasks_backend.utils.utils import get_current_utc_time
+
+VERSION = 4
+DESCRIPTION = "Track task and category changes by updated_at and record deletions as tombstones"
+
+metadata = MetaData()
+
+Table("user", metadata, Column("id", Uuid, primary_key=True))
+
+task = Table(
+    "task",
+    metadata,
+    Column("user_id", Uuid),
+    Column("created_at", DateTime(timezone=True)),
+    Column("updated_at", DateTime(timezone=True)),
+)
+
+category = Table("category", metadata, Column("user_id", Uuid), Column("updated_at", DateTime(timezone=True)))
+
+tombstone = Table(
+    "tombstone",
+    metadata,
+    Column("id", Uuid, primary_key=True),
+    Column("user_id", Uuid, ForeignKey("user.id", ondelete="CASCADE"), nullable=False),
+    Column("entity", String(20), nullable=False),
+    Column("entity_id", Uuid, nullable=False),
+    Column("deleted_at", DateTime(timezone=True), nullable=False),
+)
+
+INDEXES = [
+    Index("ix_task_user_id_updated_at", task.c.user_id, task.c.updated_at),
+    Index("ix_category_user_id_updated_at", category.c.user_id, category.c.updated_at),
+    Index("ix_tombstone_user_id_deleted_at", tombstone.c.user_id, tombstone.c.deleted_at),
+]
+
+
+def upgrade(connection: Connection):
+    category_columns = {column["name"] for column in inspect(connection).get_columns("category")}
+    if "updated_at" not in category_columns:
+        column_type = DateTime(timezone=True).compile(dialect=connection.dialect)
+        connection.execute(text(f"ALTER TABLE category ADD COLUMN updated_at {column_type}"))
+
+    connection.execute(task.update().where(task.c.updated_at.is_(None)).values(updated_at=task.c.created_at))
+    connection.execute(
+        category.update().where(category.c.updated_at.is_(None)).values(updated_at=get_current_utc_time())
+    )
+
+    tombstone.create(connection, checkfirst=True)
+    for index in INDEXES:
+        index.create(connection, checkfirst=True)
@@ -0,0 +1,54 @@
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+VERSION = 5
+DESCRIPTION = "Add full-text search over task names and descriptions"
+
+POSTGRES_STATEMENTS = [
+    """
+    ALTER TABLE task ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(name, '')), 'A')
+        || setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_task_search_vector ON task USING GIN (search_vector)",
+]
+
+# SQLite has no tsvector, so local runs index tasks in an external-content FTS5 table kept in step by triggers
+SQLITE_STATEMENTS = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS task_fts USING fts5(
+        name, description, content='task', content_rowid='rowid', tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS task_fts_after_insert AFTER INSERT ON task BEGIN
+        INSERT INTO task_fts (rowid, name, description) VALUES (new.rowid, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS task_fts_after_delete AFTER DELETE ON task BEGIN
+        INSERT INTO task_fts (task_fts, rowid, name, description)
+        VALUES ('delete', old.rowid, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS task_fts_after_update AFTER UPDATE OF name, description ON task BEGIN
+        INSERT INTO task_fts (task_fts, rowid, name, description)
+        VALUES ('delete', old.rowid, old.name, old.description);
+        INSERT INTO task_fts (rowid, name, description) VALUES (new.rowid, new.name, new.description);
+    END
+    """,
+    "INSERT INTO task_fts (task_fts) VALUES ('rebuild')",
+]
+
+
+def upgrade(connection: Connection):
+    if connection.dialect.name == "postgresql":
+        statements = POSTGRES_STATEMENTS
+    elif connection.dialect.name == "sqlite":
+        statements = SQLITE_STATEMENTS
+    else:
+        raise NotImplementedError(f"Full-text search is not supported on {connection.dialect.name}")
+    for statement in statements:
+        connection.execute(text(statement))
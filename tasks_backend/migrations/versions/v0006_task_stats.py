@@ -0,0 +1,24 @@
+from sqlalchemy import JSON, Column, ForeignKey, Integer, MetaData, Table, Uuid
+from sqlalchemy.engine import Connection
+
+VERSION = 6
+DESCRIPTION = "Add per-user task statistics summary"
+
+metadata = MetaData()
+
+Table("user", metadata, Column("id", Uuid, primary_key=True))
+
+task_stats = Table(
+    "task_stats",
+    metadata,
+    Column("user_id", Uuid, ForeignKey("user.id", ondelete="CASCADE"), primary_key=True),
+    Column("total", Integer, nullable=False),
+    Column("status_counts", JSON, nullable=False),
+    Column("category_counts", JSON, nullable=False),
+    Column("open_due_date_counts", JSON, nullable=False),
+)
+
+
+# Rows are built from each user's tasks on their first stats read, or up front with `task-stats rebuild`
+def upgrade(connection: Connection):
+    task_stats.create(connection, checkfirst=True)
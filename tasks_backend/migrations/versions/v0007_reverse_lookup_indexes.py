@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Index, MetaData, Table
+from sqlalchemy.engine import Connection
+
+VERSION = 7
+DESCRIPTION = "Add indexes for category name lookups and category-to-task links"
+
+metadata = MetaData()
+
+category = Table("category", metadata, Column("user_id"), Column("name"))
+taskcategorylink = Table("taskcategorylink", metadata, Column("task_id"), Column("category_id"))
+
+# The primary keys lead with category.id and taskcategorylink.task_id, so neither serves lookups by user and
+# name (imports, restoring defaults) or from a category to its tasks (category reads, deletes and filters)
+INDEXES = [
+    Index("ix_category_user_id_name", category.c.user_id, category.c.name),
+    Index("ix_taskcategorylink_category_id_task_id", taskcategorylink.c.category_id, taskcategorylink.c.task_id),
+]
+
+
+def upgrade(connection: Connection):
+    for index in INDEXES:
+        index.create(connection, checkfirst=True)
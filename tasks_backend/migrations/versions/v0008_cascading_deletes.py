@@ -0,0 +1,145 @@
+from sqlalchemy import (
+    Column,
+    Date,
+    DateTime,
+    Enum,
+    ForeignKey,
+    ForeignKeyConstraint,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Uuid,
+    inspect,
+    text,
+)
+from sqlalchemy.engine import Connection
+
+from tasks_backend.migrations.versions.v0005_task_full_text_search import SQLITE_STATEMENTS as SQLITE_FTS_STATEMENTS
+
+VERSION = 8
+DESCRIPTION = "Cascade deletes from users to their data and mark accounts awaiting a background purge"
+
+metadata = MetaData()
+
+user = Table(
+    "user",
+    metadata,
+    Column("id", Uuid, primary_key=True),
+    Column("deleted_at", DateTime(timezone=True)),
+)
+
+category = Table(
+    "category",
+    metadata,
+    Column("name", String(20), nullable=False),
+    Column("colour", Integer, nullable=False),
+    Column("id", Uuid, primary_key=True, unique=True),
+    Column("user_id", Uuid, ForeignKey("user.id", ondelete="CASCADE"), primary_key=True),
+    Column("updated_at", DateTime(timezone=True)),
+)
+
+task = Table(
+    "task",
+    metadata,
+    Column("name", String(50), nullable=False),
+    Column("description", String(500)),
+    Column("due_date", Date),
+    Column("status", Enum("NOT_STARTED", "IN_PROGRESS", "DONE", name="status"), nullable=False),
+    Column("id", Uuid, primary_key=True),
+    Column("user_id", Uuid, ForeignKey("user.id", ondelete="CASCADE"), nullable=False),
+    Column("created_at", DateTime(timezone=True), nullable=False),
+    Column("updated_at", DateTime(timezone=True)),
+)
+
+taskcategorylink = Table(
+    "taskcategorylink",
+    metadata,
+    Column("task_id", Uuid, ForeignKey("task.id", ondelete="CASCADE"), primary_key=True),
+    Column("category_id", Uuid, ForeignKey("category.id", ondelete="CASCADE"), primary_key=True),
+)
+
+user_deleted_at_index = Index("ix_user_deleted_at", user.c.deleted_at)
+
+# Rows left behind by user deletions before the foreign keys cascaded, which the new constraints would reject
+ORPHAN_STATEMENTS = [
+    (
+        'DELETE FROM taskcategorylink WHERE task_id NOT IN (SELECT id FROM task WHERE user_id IN (SELECT id FROM "user")) '
+        'OR category_id NOT IN (SELECT id FROM category WHERE user_id IN (SELECT id FROM "user"))'
+    ),
+    'DELETE FROM task WHERE user_id NOT IN (SELECT id FROM "user")',
+    'DELETE FROM category WHERE user_id NOT IN (SELECT id FROM "user")',
+]
+
+
+def _add_deleted_at_column(connection: Connection):
+    user_columns = {column["name"] for column in inspect(connection).get_columns("user")}
+    if "deleted_at" not in user_columns:
+        column_type = DateTime(timezone=True).compile(dialect=connection.dialect)
+        connection.execute(text(f'ALTER TABLE "user" ADD COLUMN deleted_at {column_type}'))
+    user_deleted_at_index.create(connection, checkfirst=True)
+
+
+def _replace_postgres_foreign_keys(connection: Connection):
+    preparer = connection.dialect.identifier_preparer
+    for table in (task, category, taskcategorylink):
+        for foreign_key in inspect(connection).get_foreign_keys(table.name):
+            connection.execute(
+                text(f"ALTER TABLE {preparer.quote(table.name)} DROP CONSTRAINT {preparer.quote(foreign_key['name'])}")
+            )
+        for constraint in table.constraints:
+            if isinstance(constraint, ForeignKeyConstraint):
+                columns = ", ".join(preparer.quote(column.name) for column in constraint.columns)
+                referred_columns = ", ".join(preparer.quote(element.column.name) for element in constraint.elements)
+                connection.execute(
+                    text(
+                        f"ALTER TABLE {preparer.quote(table.name)} ADD FOREIGN KEY ({columns}) "
+                        f"REFERENCES {preparer.quote(constraint.referred_table.name)} ({referred_columns}) "
+                        "ON DELETE CASCADE"
+                    )
+                )
+
+
+def _rebuild_sqlite_tables(connection: Connection):
+    # SQLite cannot alter a foreign key, so the tables are rebuilt. The link table goes first and comes back
+    # last, so dropping the old task and category tables never cascades into it or trips its constraints.
+    index_statements = (
+        connection.execute(
+            text(
+                "SELECT sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL "
+                "AND tbl_name IN ('task', 'category', 'taskcategorylink')"
+            )
+        )
+        .scalars()
+        .all()
+    )
+    connection.execute(text("CREATE TEMPORARY TABLE taskcategorylink_copy AS SELECT * FROM taskcategorylink"))
+    connection.execute(text("DROP TABLE taskcategorylink"))
+    for table in (category, task):
+        columns = ", ".join(column.name for column in table.columns)
+        connection.execute(text(f"ALTER TABLE {table.name} RENAME TO {table.name}_old"))
+        table.create(connection)
+        connection.execute(text(f"INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {table.name}_old"))
+        # Also drops the old table's indexes and, for task, the triggers keeping task_fts in step
+        connection.execute(text(f"DROP TABLE {table.name}_old"))
+    taskcategorylink.create(connection)
+    connection.execute(text("INSERT INTO taskcategorylink SELECT task_id, category_id FROM taskcategorylink_copy"))
+    connection.execute(text("DROP TABLE taskcategorylink_copy"))
+    for index_statement in index_statements:
+        connection.execute(text(index_statement))
+    # Recreates the full-text triggers and reindexes, as the rebuilt task table has new rowids
+    for statement in SQLITE_FTS_STATEMENTS:
+        connection.execute(text(statement))
+
+
+def upgrade(connection: Connection):
+    _add_deleted_at_column(connection)
+    for statement in ORPHAN_STATEMENTS:
+        connection.execute(text(statement))
+    if connection.dialect.name == "postgresql":
+        _replace_postgres_foreign_keys(connection)
+    elif connection.dialect.name == "sqlite":
+        _rebuild_sqlite_tables(connection)
+    else:
+        raise NotImplementedError(f"Cascading deletes are not supported on {connection.dialect.name}")
@@ -0,0 +1,44 @@
+from sqlalchemy import Column, Date, DateTime, Enum, ForeignKey, Index, MetaData, String, Table, Uuid
+from sqlalchemy.engine import Connection
+
+VERSION = 9
+DESCRIPTION = "Add archive tables for long-done tasks and an index for finding them"
+
+metadata = MetaData()
+
+Table("user", metadata, Column("id", Uuid, primary_key=True))
+Table("category", metadata, Column("id", Uuid, primary_key=True))
+task = Table("task", metadata, Column("status"), Column("updated_at"))
+
+archived_task = Table(
+    "archived_task",
+    metadata,
+    Column("name", String(50), nullable=False),
+    Column("description", String(500)),
+    Column("due_date", Date),
+    Column("status", Enum("NOT_STARTED", "IN_PROGRESS", "DONE", name="status"), nullable=False),
+    Column("id", Uuid, primary_key=True),
+    Column("user_id", Uuid, ForeignKey("user.id", ondelete="CASCADE"), nullable=False),
+    Column("created_at", DateTime(timezone=True), nullable=False),
+    Column("updated_at", DateTime(timezone=True)),
+    Column("archived_at", DateTime(timezone=True), nullable=False),
+    Index("ix_archived_task_user_id_created_at_id", "user_id", "created_at", "id"),
+    Index("ix_archived_task_user_id_name_id", "user_id", "name", "id"),
+)
+
+archived_task_category_link = Table(
+    "archived_task_category_link",
+    metadata,
+    Column("task_id", Uuid, ForeignKey("archived_task.id", ondelete="CASCADE"), primary_key=True),
+    Column("category_id", Uuid, ForeignKey("category.id", ondelete="CASCADE"), primary_key=True),
+    Index("ix_archived_task_category_link_category_id_task_id", "category_id", "task_id"),
+)
+
+# Lets the archive job find done tasks past the cutoff across all users without scanning the task table
+task_status_updated_at_index = Index("ix_task_status_updated_at", task.c.status, task.c.updated_at)
+
+
+def upgrade(connection: Connection):
+    archived_task.create(connection, checkfirst=True)
+    archived_task_category_link.create(connection, checkfirst=True)
+    task_status_updated_at_index.create(connection, checkfirst=True)
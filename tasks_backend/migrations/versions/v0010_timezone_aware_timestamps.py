@@ -0,0 +1,38 @@
+from sqlalchemy import DateTime, inspect, text
+from sqlalchemy.engine import Connection
+
+VERSION = 10
+DESCRIPTION = "Convert timestamps created without a time zone to timestamptz"
+
+# Every column holding a point in time. Tables made by create_all before migration 1 existed have naive
+# timestamps, which migration 1's checkfirst left in place; naive values in them are UTC.
+TIMESTAMP_COLUMNS = {
+    "user": ["created_at", "updated_at", "last_login_at", "deleted_at"],
+    "category": ["updated_at"],
+    "task": ["created_at", "updated_at"],
+    "tombstone": ["deleted_at"],
+    "archived_task": ["created_at", "updated_at", "archived_at"],
+    "schema_version": ["applied_at"],
+}
+
+
+def upgrade(connection: Connection):
+    # SQLite stores timestamps as text either way
+    if connection.dialect.name != "postgresql":
+        return
+    preparer = connection.dialect.identifier_preparer
+    inspector = inspect(connection)
+    for table_name, column_names in TIMESTAMP_COLUMNS.items():
+        naive_columns = [
+            column["name"]
+            for column in inspector.get_columns(table_name)
+            if column["name"] in column_names and isinstance(column["type"], DateTime) and not column["type"].timezone
+        ]
+        if not naive_columns:
+            continue
+        # One statement per table, so each table is rewritten once
+        alterations = ", ".join(
+            f"ALTER COLUMN {preparer.quote(name)} TYPE timestamptz USING {preparer.quote(name)} AT TIME ZONE 'UTC'"
+            for name in naive_columns
+        )
+        connection.execute(text(f"ALTER TABLE {preparer.quote(table_name)} {alterations}"))
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Index, MetaData, Table
+from sqlalchemy.engine import Connection
+
+VERSION = 11
+DESCRIPTION = "Add an index for pruning tombstones past the retention period"
+
+metadata = MetaData()
+
+tombstone = Table("tombstone", metadata, Column("deleted_at"))
+
+# The existing tombstone index leads with user_id, so it cannot find old tombstones across all users
+tombstone_deleted_at_index = Index("ix_tombstone_deleted_at", tombstone.c.deleted_at)
+
+
+def upgrade(connection: Connection):
+    tombstone_deleted_at_index.create(connection, checkfirst=True)
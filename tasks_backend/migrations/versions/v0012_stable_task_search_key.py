@@ -0,0 +1,50 @@
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+VERSION = 12
+DESCRIPTION = "Key the SQLite full-text index on task ids rather than task rowids"
+
+# The task_fts index from migration 5 pointed at task rowids, which VACUUM and table rebuilds renumber, leaving
+# matches pointing at the wrong tasks. It is replaced by an FTS5 table holding its own copy of the text, keyed
+# through task_search_key, whose rowid is an INTEGER PRIMARY KEY and so never renumbered.
+SQLITE_STATEMENTS = [
+    "DROP TRIGGER IF EXISTS task_fts_after_insert",
+    "DROP TRIGGER IF EXISTS task_fts_after_delete",
+    "DROP TRIGGER IF EXISTS task_fts_after_update",
+    "DROP TABLE IF EXISTS task_fts",
+    "DROP TABLE IF EXISTS task_search_key",
+    "CREATE TABLE task_search_key (rowid INTEGER PRIMARY KEY, task_id CHAR(32) NOT NULL UNIQUE)",
+    "CREATE VIRTUAL TABLE task_fts USING fts5(name, description, tokenize='porter unicode61')",
+    """
+    CREATE TRIGGER task_fts_after_insert AFTER INSERT ON task BEGIN
+        INSERT INTO task_search_key (task_id) VALUES (new.id);
+        INSERT INTO task_fts (rowid, name, description)
+        VALUES ((SELECT rowid FROM task_search_key WHERE task_id = new.id), new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER task_fts_after_delete AFTER DELETE ON task BEGIN
+        DELETE FROM task_fts WHERE rowid = (SELECT rowid FROM task_search_key WHERE task_id = old.id);
+        DELETE FROM task_search_key WHERE task_id = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER task_fts_after_update AFTER UPDATE OF name, description ON task BEGIN
+        UPDATE task_fts SET name = new.name, description = new.description
+        WHERE rowid = (SELECT rowid FROM task_search_key WHERE task_id = new.id);
+    END
+    """,
+    "INSERT INTO task_search_key (task_id) SELECT id FROM task",
+    """
+    INSERT INTO task_fts (rowid, name, description)
+    SELECT task_search_key.rowid, task.name, task.description
+    FROM task JOIN task_search_key ON task_search_key.task_id = task.id
+    """,
+]
+
+
+def upgrade(connection: Connection):
+    # Postgres searches a generated column on the task row itself, which has no such key to go stale
+    if connection.dialect.name == "sqlite":
+        for statement in SQLITE_STATEMENTS:
+            connection.execute(text(statement))
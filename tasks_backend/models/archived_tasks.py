@@ -0,0 +1,159 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import TYPE_CHECKING
+from uuid import UUID, uuid4
+
+from fastapi import HTTPException, status
+from sqlalchemy import DateTime, Index, delete, insert, literal
+from sqlalchemy.orm import selectinload
+from sqlmodel import Field, Relationship, Session, SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from tasks_backend.models.data_versions import bump_data_versions, lock_data_versions
+from tasks_backend.models.links import TaskCategoryLink
+from tasks_backend.models.task_stats import TaskStats, TaskStatsEntry, apply_task_stats_entries
+from tasks_backend.models.tasks import Status, Task, TaskBase
+from tasks_backend.models.tombstones import Tombstone, TombstoneEntity
+from tasks_backend.utils.utils import get_current_utc_time
+
+if TYPE_CHECKING:
+    from tasks_backend.models.categories import Category
+
+# Columns copied between task and archived_task
+TASK_COLUMN_NAMES = ["id", "user_id", "name", "description", "due_date", "status", "created_at", "updated_at"]
+
+
+class ArchivedTaskCategoryLink(SQLModel, table=True):
+    __tablename__ = "archived_task_category_link"
+    __table_args__ = (Index("ix_archived_task_category_link_category_id_task_id", "category_id", "task_id"),)
+
+    task_id: UUID = Field(foreign_key="archived_task.id", primary_key=True, ondelete="CASCADE")
+    category_id: UUID = Field(foreign_key="category.id", primary_key=True, ondelete="CASCADE")
+
+
+class ArchivedTask(TaskBase, table=True):
+    # Done tasks moved out of the task table once they are old enough, so it only holds what users work with.
+    # Only listing with include_archived, exports and restoring read from here.
+    __tablename__ = "archived_task"
+    __table_args__ = (
+        Index("ix_archived_task_user_id_created_at_id", "user_id", "created_at", "id"),
+        Index("ix_archived_task_user_id_name_id", "user_id", "name", "id"),
+    )
+
+    id: UUID = Field(primary_key=True)
+    user_id: UUID = Field(foreign_key="user.id", ondelete="CASCADE")
+    created_at: datetime = Field(sa_type=DateTime(timezone=True))
+    updated_at: datetime | None = Field(default=None, sa_type=DateTime(timezone=True))
+    archived_at: datetime = Field(default_factory=get_current_utc_time, sa_type=DateTime(timezone=True))
+    categories: list["Category"] = Relationship(link_model=ArchivedTaskCategoryLink)
+
+
+def archive_done_tasks(session: Session, done_before: datetime, batch_size: int) -> int:
+    # Moves one batch of tasks, links included, in a single transaction and returns how many it moved. A done
+    # task's updated_at stands in for when it was completed, as marking it done is normally its last change.
+    archived_at = get_current_utc_time()
+    statement = (
+        select(Task.id, Task.user_id)
+        .where(Task.status == Status.DONE, Task.updated_at < done_before)
+        .order_by(Task.updated_at)
+        .limit(batch_size)
+        # Rows a request is writing to are left for the next batch rather than waited on
+        .with_for_update(skip_locked=True)
+    )
+    task_user_ids = dict(session.exec(statement).all())
+    if not task_user_ids:
+        return 0
+    task_ids = list(task_user_ids)
+    user_ids = set(task_user_ids.values())
+    _remove_from_task_stats(session, task_user_ids)
+    task_columns = [getattr(Task, name) for name in TASK_COLUMN_NAMES]
+    session.execute(
+        insert(ArchivedTask).from_select(
+            [*TASK_COLUMN_NAMES, "archived_at"],
+            select(*task_columns, literal(archived_at, DateTime(timezone=True))).where(Task.id.in_(task_ids)),
+        )
+    )
+    session.execute(
+        insert(ArchivedTaskCategoryLink).from_select(
+            ["task_id", "category_id"],
+            select(TaskCategoryLink.task_id, TaskCategoryLink.category_id).where(
+                TaskCategoryLink.task_id.in_(task_ids)
+            ),
+        )
+    )
+    # The task links go with the tasks through ON DELETE CASCADE
+    session.execute(delete(Task).where(Task.id.in_(task_ids)).execution_options(synchronize_session=False))
+    # Sync clients drop archived tasks as if they were deleted, and get them back as changes if they are restored
+    tombstone_rows = [
+        {
+            "id": uuid4(),
+            "user_id": user_id,
+            "entity": TombstoneEntity.TASK.value,
+            "entity_id": task_id,
+            "deleted_at": archived_at,
+        }
+        for task_id, user_id in task_user_ids.items()
+    ]
+    session.execute(insert(Tombstone), tombstone_rows)
+    bump_data_versions(user_ids, session)
+    session.commit()
+    return len(task_ids)
+
+
+def _remove_from_task_stats(session: Session, task_user_ids: dict[UUID, UUID]):
+    # The stats count only the task table, so archived tasks come out of them like deleted ones
+    lock_data_versions(set(task_user_ids.values()), session)
+    category_links = session.exec(
+        select(TaskCategoryLink.task_id, TaskCategoryLink.category_id).where(
+            TaskCategoryLink.task_id.in_(list(task_user_ids))
+        )
+    ).all()
+    category_ids = defaultdict(set)
+    for task_id, category_id in category_links:
+        category_ids[task_id].add(category_id)
+    removed: dict[UUID, list[TaskStatsEntry]] = defaultdict(list)
+    for task_id, user_id in task_user_ids.items():
+        # Done tasks are left out of the due date counts, so their due dates do not matter here
+        removed[user_id].append((Status.DONE, frozenset(category_ids[task_id]), None))
+    statement = select(TaskStats).where(TaskStats.user_id.in_(removed)).with_for_update()
+    for task_stats in session.exec(statement).all():
+        apply_task_stats_entries(task_stats, removed=removed[task_stats.user_id])
+        session.add(task_stats)
+
+
+async def restore_archived_task(user_id: UUID, task_id: UUID, session: AsyncSession) -> Task:
+    # Moves the task back into the task table without committing. It comes back with updated_at set to now, so
+    # sync clients see it as changed and it is not archived again until it has been left alone for another period.
+    statement = (
+        select(ArchivedTask)
+        .where(ArchivedTask.id == task_id, ArchivedTask.user_id == user_id)
+        .options(selectinload(ArchivedTask.categories))
+        .with_for_update()
+    )
+    archived_task = (await session.exec(statement)).first()
+    if archived_task is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Archived task not found")
+    task = Task.model_validate(
+        archived_task.model_dump(include=set(TASK_COLUMN_NAMES)), update={"updated_at": get_current_utc_time()}
+    )
+    task.categories = archived_task.categories
+    await session.delete(archived_task)
+    session.add(task)
+    await session.execute(
+        delete(Tombstone).where(
+            Tombstone.user_id == user_id, Tombstone.entity == TombstoneEntity.TASK.value, Tombstone.entity_id == task_id
+        )
+    )
+    return task
+
+
+async def delete_archived_tasks(user_id: UUID, task_ids: set[UUID], session: AsyncSession) -> set[UUID]:
+    # Archived tasks already have tombstones and are not in the stats, so deleting them needs neither
+    if not task_ids:
+        return set()
+    statement = (
+        delete(ArchivedTask)
+        .where(ArchivedTask.user_id == user_id, ArchivedTask.id.in_(task_ids))
+        .returning(ArchivedTask.id)
+    )
+    return set((await session.execute(statement)).scalars().all())
@@ -1,12 +1,18 @@
+from datetime import datetime
 from enum import StrEnum
 from typing import TYPE_CHECKING
 from uuid import UUID, uuid4
 
 from fastapi import HTTPException, status
+from sqlalchemy import DateTime, Index
 from sqlalchemy.exc import MultipleResultsFound, NoResultFound
-from sqlmodel import Field, Relationship, Session, SQLModel, select
+from sqlalchemy.orm import selectinload
+from sqlmodel import Field, Relationship, SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
+from tasks_backend.models.data_versions import bump_data_version
 from tasks_backend.models.links import TaskCategoryLink
+from tasks_backend.utils.utils import get_current_utc_time
 
 if TYPE_CHECKING:
     from tasks_backend.models.tasks import Task
@@ -35,8 +41,14 @@ class CategoryBase(SQLModel):
 
 
 class Category(CategoryBase, table=True):
+    __table_args__ = (
+        Index("ix_category_user_id_updated_at", "user_id", "updated_at"),
+        Index("ix_category_user_id_name", "user_id", "name"),
+    )
+
     id: UUID = Field(default_factory=uuid4, primary_key=True, unique=True)
-    user_id: UUID = Field(foreign_key="user.id", primary_key=True)
+    user_id: UUID = Field(foreign_key="user.id", primary_key=True, ondelete="CASCADE")
+    updated_at: datetime = Field(default_factory=get_current_utc_time, sa_type=DateTime(timezone=True))
     tasks: list["Task"] = Relationship(back_populates="categories", link_model=TaskCategoryLink)
 
 
@@ -53,25 +65,41 @@ class CategoryPublic(CategoryBase):
     id: UUID
 
 
-def create_default_categories(user_id: UUID, session: Session):
-    default_categories = [
-        Category(name=category.value, user_id=user_id, colour=DEFAULT_COLOURS[category]) for category in DefaultCategory
-    ]
-    session.add_all(default_categories)
-    session.commit()
+def _default_category(user_id: UUID, default_category: DefaultCategory) -> Category:
+    return Category(name=default_category.value, user_id=user_id, colour=DEFAULT_COLOURS[default_category])
 
 
-def restore_default_categories(user_id: UUID, session: Session):
-    for category in DefaultCategory:
-        existing_default_category = session.exec(select(Category).where(Category.name == category.value))
-        if not existing_default_category:
-            session.add(Category(name=category.value, user_id=user_id))
-    session.commit()
+async def create_default_categories(user_id: UUID, session: AsyncSession):
+    # Leaves the commit to the caller so the categories are created in the same transaction as the user
+    session.add_all([_default_category(user_id, default_category) for default_category in DefaultCategory])
+    await bump_data_version(user_id, session)
 
 
-def get_category_or_raise_404(user_id: UUID, category_id: UUID, session: Session):
+async def restore_default_categories(user_id: UUID, session: AsyncSession) -> list[Category]:
+    statement = select(Category.name).where(
+        Category.user_id == user_id, Category.name.in_([default_category.value for default_category in DefaultCategory])
+    )
+    existing_names = set((await session.exec(statement)).all())
+    restored_categories = [
+        _default_category(user_id, default_category)
+        for default_category in DefaultCategory
+        if default_category.value not in existing_names
+    ]
+    if restored_categories:
+        session.add_all(restored_categories)
+        await bump_data_version(user_id, session)
+        await session.commit()
+    return restored_categories
+
+
+async def get_category_or_raise_404(user_id: UUID, category_id: UUID, session: AsyncSession):
+    statement = (
+        select(Category)
+        .where(Category.id == category_id, Category.user_id == user_id)
+        .options(selectinload(Category.tasks))
+    )
     try:
-        category = session.exec(select(Category).where(Category.id == category_id, Category.user_id == user_id)).one()
+        category = (await session.exec(statement)).one()
     except NoResultFound:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category not found")
     except MultipleResultsFound:
@@ -0,0 +1,63 @@
+from uuid import UUID
+
+from sqlalchemy import insert, update
+from sqlmodel import Field, Session, SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from tasks_backend.db import note_write
+
+
+class UserDataVersion(SQLModel, table=True):
+    __tablename__ = "user_data_version"
+
+    user_id: UUID = Field(foreign_key="user.id", primary_key=True, ondelete="CASCADE")
+    version: int = 0
+
+
+async def get_data_version(user_id: UUID, session: AsyncSession) -> int:
+    statement = select(UserDataVersion.version).where(UserDataVersion.user_id == user_id)
+    return (await session.exec(statement)).first() or 0
+
+
+async def bump_data_version(user_id: UUID, session: AsyncSession):
+    # Called before committing any write to a user's tasks or categories, so the new version becomes visible
+    # in the same transaction as the change it describes
+    statement = (
+        update(UserDataVersion).where(UserDataVersion.user_id == user_id).values(version=UserDataVersion.version + 1)
+    )
+    result = await session.execute(statement)
+    if result.rowcount == 0:
+        await session.execute(insert(UserDataVersion).values(user_id=user_id, version=1))
+    note_write(user_id)
+
+
+async def lock_data_version(user_id: UUID, session: AsyncSession):
+    # Held until commit by every change to a user's task stats, rebuilds included, and taken before the stats row
+    # is read. A rebuild therefore never counts the tasks while a write it cannot see yet is skipping the stats.
+    statement = select(UserDataVersion.user_id).where(UserDataVersion.user_id == user_id).with_for_update()
+    await session.exec(statement)
+
+
+def lock_data_versions(user_ids: set[UUID], session: Session):
+    # lock_data_version for background jobs, in a fixed order so two jobs never wait on each other
+    statement = (
+        select(UserDataVersion.user_id)
+        .where(UserDataVersion.user_id.in_(user_ids))
+        .order_by(UserDataVersion.user_id)
+        .with_for_update()
+    )
+    session.exec(statement).all()
+
+
+def bump_data_versions(user_ids: set[UUID], session: Session):
+    # Bumps many users at once for background jobs, which run in their own process and so skip note_write
+    statement = (
+        update(UserDataVersion).where(UserDataVersion.user_id.in_(user_ids)).values(version=UserDataVersion.version + 1)
+    )
+    session.execute(statement)
+    existing_user_ids = set(
+        session.exec(select(UserDataVersion.user_id).where(UserDataVersion.user_id.in_(user_ids))).all()
+    )
+    missing_rows = [{"user_id": user_id, "version": 1} for user_id in user_ids - existing_user_ids]
+    if missing_rows:
+        session.execute(insert(UserDataVersion), missing_rows)
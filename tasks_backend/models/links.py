@@ -1,8 +1,11 @@
 from uuid import UUID
 
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel
 
 
 class TaskCategoryLink(SQLModel, table=True):
-    task_id: UUID = Field(foreign_key="task.id", primary_key=True)
-    category_id: UUID = Field(foreign_key="category.id", primary_key=True)
+    __table_args__ = (Index("ix_taskcategorylink_category_id_task_id", "category_id", "task_id"),)
+
+    task_id: UUID = Field(foreign_key="task.id", primary_key=True, ondelete="CASCADE")
+    category_id: UUID = Field(foreign_key="category.id", primary_key=True, ondelete="CASCADE")
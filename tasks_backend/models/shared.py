@@ -1,7 +1,11 @@
+from datetime import datetime
+from uuid import UUID
+
 from pydantic import BaseModel
 
 from tasks_backend.models.categories import CategoryPublic
 from tasks_backend.models.tasks import TaskPublic
+from tasks_backend.models.tombstones import TombstonePublic
 
 
 class AccessTokenResponse(BaseModel):
@@ -15,3 +19,31 @@ class CategoryPublicWithTasks(CategoryPublic):
 
 class TaskPublicWithCategories(TaskPublic):
     categories: list["CategoryPublic"]
+    # Only set on archived tasks, which are listed with include_archived
+    archived_at: datetime | None = None
+
+
+class TasksPage(BaseModel):
+    items: list[TaskPublicWithCategories]
+    next_cursor: str | None
+
+
+class TaskBatchResult(BaseModel):
+    index: int
+    task_id: UUID
+    status_code: int
+    detail: str | None = None
+    task: TaskPublicWithCategories | None = None
+
+
+class SyncTask(TaskPublic):
+    category_ids: list[UUID]
+
+
+class SyncResponse(BaseModel):
+    tasks: list[SyncTask]
+    categories: list[CategoryPublic]
+    deleted: list[TombstonePublic]
+    next_token: str
+    # When set, next_token continues this sync and should be sent straight back for the next page
+    has_more: bool = False
@@ -0,0 +1,148 @@
+from datetime import date, timedelta
+from uuid import UUID
+
+from sqlalchemy import JSON, Column, delete, func
+from sqlmodel import Field, Session, SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from tasks_backend.models.data_versions import lock_data_version, lock_data_versions
+from tasks_backend.models.links import TaskCategoryLink
+from tasks_backend.models.tasks import Status, Task
+from tasks_backend.utils.utils import get_current_utc_time
+
+# (status, category ids, due date) of a task, i.e. everything about it that the stats count
+TaskStatsEntry = tuple[Status, frozenset[UUID], date | None]
+
+DUE_THIS_WEEK_DAYS = 7
+
+
+class TaskStats(SQLModel, table=True):
+    __tablename__ = "task_stats"
+
+    user_id: UUID = Field(foreign_key="user.id", primary_key=True, ondelete="CASCADE")
+    total: int = 0
+    status_counts: dict[str, int] = Field(default_factory=dict, sa_column=Column(JSON, nullable=False))
+    category_counts: dict[str, int] = Field(default_factory=dict, sa_column=Column(JSON, nullable=False))
+    # Open (not done) tasks per due date. Overdue and due-this-week counts depend on the day they are read,
+    # so they are summed from this histogram instead of being stored.
+    open_due_date_counts: dict[str, int] = Field(default_factory=dict, sa_column=Column(JSON, nullable=False))
+
+
+class TaskStatsPublic(SQLModel):
+    total: int
+    by_status: dict[Status, int]
+    by_category: dict[UUID, int]
+    overdue: int
+    due_this_week: int
+
+
+def task_stats_entry(task: Task, category_ids: list[UUID] | None = None) -> TaskStatsEntry:
+    if category_ids is None:
+        category_ids = [category.id for category in task.categories]
+    return task.status, frozenset(category_ids), task.due_date
+
+
+def _adjust(counts: dict[str, int], key: str, delta: int):
+    counts[key] = counts.get(key, 0) + delta
+    if counts[key] <= 0:
+        del counts[key]
+
+
+def apply_task_stats_entries(
+    task_stats: TaskStats, removed: list[TaskStatsEntry] | None = None, added: list[TaskStatsEntry] | None = None
+):
+    status_counts = dict(task_stats.status_counts)
+    category_counts = dict(task_stats.category_counts)
+    open_due_date_counts = dict(task_stats.open_due_date_counts)
+    for delta, entries in ((-1, removed or []), (1, added or [])):
+        for task_status, category_ids, due_date in entries:
+            task_stats.total += delta
+            _adjust(status_counts, task_status.value, delta)
+            for category_id in category_ids:
+                _adjust(category_counts, str(category_id), delta)
+            if due_date and task_status != Status.DONE:
+                _adjust(open_due_date_counts, due_date.isoformat(), delta)
+    # Assign new dicts so the JSON columns are marked as changed
+    task_stats.status_counts = status_counts
+    task_stats.category_counts = category_counts
+    task_stats.open_due_date_counts = open_due_date_counts
+
+
+async def update_task_stats(
+    user_id: UUID,
+    session: AsyncSession,
+    removed: list[TaskStatsEntry] | None = None,
+    added: list[TaskStatsEntry] | None = None,
+):
+    # Runs in the transaction of the write it accounts for. A missing row means the stats have not been
+    # materialised yet; they will be built from the tasks themselves on the next read, which waits for this
+    # transaction's lock on the data version row so that it counts this write too.
+    await lock_data_version(user_id, session)
+    statement = select(TaskStats).where(TaskStats.user_id == user_id).with_for_update()
+    task_stats = (await session.exec(statement)).first()
+    if task_stats is None:
+        return
+    apply_task_stats_entries(task_stats, removed, added)
+    session.add(task_stats)
+
+
+async def remove_category_from_task_stats(user_id: UUID, category_id: UUID, session: AsyncSession):
+    await lock_data_version(user_id, session)
+    statement = select(TaskStats).where(TaskStats.user_id == user_id).with_for_update()
+    task_stats = (await session.exec(statement)).first()
+    if task_stats is None or str(category_id) not in task_stats.category_counts:
+        return
+    task_stats.category_counts = {
+        key: count for key, count in task_stats.category_counts.items() if key != str(category_id)
+    }
+    session.add(task_stats)
+
+
+def rebuild_task_stats(session: Session, user_id: UUID) -> TaskStats:
+    # Recounts a user's stats from their tasks. Synchronous so the rebuild command can share it; routes call it
+    # through session.run_sync.
+    lock_data_versions({user_id}, session)
+    status_counts = session.exec(
+        select(Task.status, func.count()).where(Task.user_id == user_id).group_by(Task.status)
+    ).all()
+    category_counts = session.exec(
+        select(TaskCategoryLink.category_id, func.count())
+        .join(Task, Task.id == TaskCategoryLink.task_id)
+        .where(Task.user_id == user_id)
+        .group_by(TaskCategoryLink.category_id)
+    ).all()
+    open_due_date_counts = session.exec(
+        select(Task.due_date, func.count())
+        .where(Task.user_id == user_id, Task.status != Status.DONE, Task.due_date.is_not(None))
+        .group_by(Task.due_date)
+    ).all()
+    task_stats = TaskStats(
+        user_id=user_id,
+        total=sum(count for _, count in status_counts),
+        status_counts={task_status.value: count for task_status, count in status_counts},
+        category_counts={str(category_id): count for category_id, count in category_counts},
+        open_due_date_counts={due_date.isoformat(): count for due_date, count in open_due_date_counts},
+    )
+    session.execute(delete(TaskStats).where(TaskStats.user_id == user_id))
+    session.add(task_stats)
+    return task_stats
+
+
+def to_task_stats_public(task_stats: TaskStats) -> TaskStatsPublic:
+    today = get_current_utc_time().date()
+    due_this_week_until = today + timedelta(days=DUE_THIS_WEEK_DAYS - 1)
+    overdue = 0
+    due_this_week = 0
+    for due_date, count in task_stats.open_due_date_counts.items():
+        due_date = date.fromisoformat(due_date)
+        if due_date < today:
+            overdue += count
+        elif due_date <= due_this_week_until:
+            due_this_week += count
+    return TaskStatsPublic(
+        total=task_stats.total,
+        by_status={task_status: task_stats.status_counts.get(task_status.value, 0) for task_status in Status},
+        by_category={UUID(category_id): count for category_id, count in task_stats.category_counts.items()},
+        overdue=overdue,
+        due_this_week=due_this_week,
+    )
@@ -1,11 +1,16 @@
+import re
 from datetime import date, datetime
-from enum import Enum
-from typing import TYPE_CHECKING
+from enum import Enum, StrEnum
+from typing import TYPE_CHECKING, Annotated
 from uuid import UUID, uuid4
 
 from fastapi import HTTPException, status
+from sqlalchemy import DateTime, Index, column, false, func, literal_column, table
 from sqlalchemy.exc import MultipleResultsFound, NoResultFound
-from sqlmodel import Field, Relationship, Session, SQLModel, select
+from sqlalchemy.orm import selectinload
+from sqlalchemy.sql import Select
+from sqlmodel import Field, Relationship, SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from tasks_backend.models.links import TaskCategoryLink
 from tasks_backend.utils.utils import get_current_utc_time
@@ -20,6 +25,30 @@ class Status(Enum):
     DONE = "done"
 
 
+class TaskSort(StrEnum):
+    CREATED_AT = "created_at"
+    CREATED_AT_DESC = "-created_at"
+    NAME = "name"
+    NAME_DESC = "-name"
+
+    @property
+    def field_name(self) -> str:
+        return self.value.removeprefix("-")
+
+    @property
+    def descending(self) -> bool:
+        return self.value.startswith("-")
+
+
+class TaskFileFormat(StrEnum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+    @property
+    def media_type(self) -> str:
+        return "application/x-ndjson" if self == TaskFileFormat.NDJSON else "text/csv"
+
+
 class TaskBase(SQLModel):
     name: str = Field(min_length=3, max_length=50)
     description: str | None = Field(default=None, max_length=500)
@@ -28,10 +57,19 @@ class TaskBase(SQLModel):
 
 
 class Task(TaskBase, table=True):
+    __table_args__ = (
+        Index("ix_task_user_id_created_at_id", "user_id", "created_at", "id"),
+        Index("ix_task_user_id_name_id", "user_id", "name", "id"),
+        Index("ix_task_user_id_status_created_at_id", "user_id", "status", "created_at", "id"),
+        Index("ix_task_user_id_due_date", "user_id", "due_date"),
+        Index("ix_task_user_id_updated_at", "user_id", "updated_at"),
+        Index("ix_task_status_updated_at", "status", "updated_at"),
+    )
+
     id: UUID = Field(default_factory=uuid4, primary_key=True)
-    user_id: UUID = Field(foreign_key="user.id")
-    created_at: datetime = Field(default_factory=get_current_utc_time)
-    updated_at: datetime | None = None
+    user_id: UUID = Field(foreign_key="user.id", ondelete="CASCADE")
+    created_at: datetime = Field(default_factory=get_current_utc_time, sa_type=DateTime(timezone=True))
+    updated_at: datetime | None = Field(default=None, sa_type=DateTime(timezone=True))
     categories: list["Category"] = Relationship(back_populates="tasks", link_model=TaskCategoryLink)
 
 
@@ -47,6 +85,25 @@ class TaskUpdate(SQLModel):
     category_ids: list[UUID] | None = None
 
 
+class TaskBatchUpdate(TaskUpdate):
+    id: UUID
+
+
+class TaskImport(TaskBase):
+    category_names: list[Annotated[str, Field(min_length=3, max_length=20)]] = []
+
+
+class TaskImportError(SQLModel):
+    row: int
+    detail: str
+
+
+class TaskImportResult(SQLModel):
+    created: int
+    failed: int
+    errors: list[TaskImportError]
+
+
 class TaskPublic(TaskBase):
     id: UUID
     user_id: UUID
@@ -55,9 +112,38 @@ class TaskPublic(TaskBase):
     updated_at: datetime | None
 
 
-def get_task_or_raise_404(user_id: UUID, task_id: UUID, session: Session) -> Task:
+def _fts5_query(query: str) -> str:
+    # Quote each word so user input can never be parsed as FTS5 query syntax, and prefix-match the words
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", query))
+
+
+def apply_task_search(statement: Select, query: str, dialect_name: str) -> Select:
+    # Filters to tasks matching query and orders them best match first. The search index lives outside the ORM
+    # model: a generated tsvector column on Postgres and the task_fts FTS5 table on SQLite (see migrations 5 and 12).
+    if dialect_name == "postgresql":
+        search_vector = literal_column("task.search_vector")
+        ts_query = func.websearch_to_tsquery("english", query)
+        return statement.where(search_vector.op("@@")(ts_query)).order_by(
+            func.ts_rank(search_vector, ts_query).desc(), Task.id
+        )
+    fts5_query = _fts5_query(query)
+    if not fts5_query:
+        return statement.where(false())
+    task_fts = table("task_fts", column("rowid"))
+    task_search_key = table("task_search_key", column("rowid"), column("task_id"))
+    # bm25 scores are negative with the best match lowest; name matches weigh ten times description matches
+    return (
+        statement.join(task_search_key, task_search_key.c.task_id == Task.id)
+        .join(task_fts, task_fts.c.rowid == task_search_key.c.rowid)
+        .where(literal_column("task_fts").op("MATCH")(fts5_query))
+        .order_by(func.bm25(literal_column("task_fts"), 10.0, 1.0), Task.id)
+    )
+
+
+async def get_task_or_raise_404(user_id: UUID, task_id: UUID, session: AsyncSession) -> Task:
+    statement = select(Task).where(Task.id == task_id, Task.user_id == user_id).options(selectinload(Task.categories))
     try:
-        task = session.exec(select(Task).where(Task.id == task_id, Task.user_id == user_id)).one()
+        task = (await session.exec(statement)).one()
     except NoResultFound:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
     except MultipleResultsFound:
@@ -0,0 +1,60 @@
+import os
+from datetime import datetime
+from enum import StrEnum
+from uuid import UUID, uuid4
+
+from sqlalchemy import DateTime, Index, delete, insert
+from sqlmodel import Field, Session, SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from tasks_backend.utils.utils import get_current_utc_time
+
+# Sync tokens older than this are refused, so tombstones past it are no longer needed by any client
+TOMBSTONE_RETENTION_DAYS = float(os.environ.get("TOMBSTONE_RETENTION_DAYS", "30"))
+
+
+class TombstoneEntity(StrEnum):
+    TASK = "task"
+    CATEGORY = "category"
+
+
+class Tombstone(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_tombstone_user_id_deleted_at", "user_id", "deleted_at"),
+        Index("ix_tombstone_deleted_at", "deleted_at"),
+    )
+
+    id: UUID = Field(default_factory=uuid4, primary_key=True)
+    user_id: UUID = Field(foreign_key="user.id", ondelete="CASCADE")
+    entity: str = Field(max_length=20)
+    entity_id: UUID
+    deleted_at: datetime = Field(default_factory=get_current_utc_time, sa_type=DateTime(timezone=True))
+
+
+class TombstonePublic(SQLModel):
+    entity: TombstoneEntity
+    entity_id: UUID
+    deleted_at: datetime
+
+
+async def add_tombstones(user_id: UUID, entity: TombstoneEntity, entity_ids: list[UUID], session: AsyncSession):
+    deleted_at = get_current_utc_time()
+    tombstone_rows = [
+        {"id": uuid4(), "user_id": user_id, "entity": entity.value, "entity_id": entity_id, "deleted_at": deleted_at}
+        for entity_id in entity_ids
+    ]
+    if tombstone_rows:
+        await session.execute(insert(Tombstone), tombstone_rows)
+
+
+def prune_tombstones(session: Session, deleted_before: datetime, batch_size: int) -> int:
+    # Deletes one batch of tombstones older than deleted_before in its own transaction and returns how many it deleted
+    statement = select(Tombstone.id).where(Tombstone.deleted_at < deleted_before).limit(batch_size)
+    tombstone_ids = session.exec(statement).all()
+    if not tombstone_ids:
+        return 0
+    session.execute(
+        delete(Tombstone).where(Tombstone.id.in_(tombstone_ids)).execution_options(synchronize_session=False)
+    )
+    session.commit()
+    return len(tombstone_ids)
@@ -3,9 +3,12 @@ from uuid import UUID, uuid4
 
 from fastapi import HTTPException, status
 from pydantic import EmailStr
-from sqlmodel import Field, Session, SQLModel
+from sqlalchemy import DateTime
+from sqlmodel import Field, SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from tasks_backend.auth import AccessTokenResponse
+from tasks_backend.db import dialect_insert
 from tasks_backend.utils.utils import get_current_utc_time
 
 
@@ -19,9 +22,11 @@ class User(UserBase, table=True):
     id: UUID = Field(default_factory=uuid4, primary_key=True)
     email: EmailStr = Field(unique=True)
     hashed_password: bytes = Field(max_length=60)
-    created_at: datetime = Field(default_factory=get_current_utc_time)
-    updated_at: datetime | None = None
-    last_login_at: datetime | None = None
+    created_at: datetime = Field(default_factory=get_current_utc_time, sa_type=DateTime(timezone=True))
+    updated_at: datetime | None = Field(default=None, sa_type=DateTime(timezone=True))
+    last_login_at: datetime | None = Field(default=None, sa_type=DateTime(timezone=True))
+    # Set when the account is too large to delete within a request; the purge job deletes it in batches
+    deleted_at: datetime | None = Field(default=None, index=True, sa_type=DateTime(timezone=True))
 
 
 class UserCreate(UserBase):
@@ -46,8 +51,20 @@ class UserUpdate(SQLModel):
     password: str | None = Field(default=None, min_length=8, max_length=50)
 
 
-def get_user_or_raise_404(user_id: UUID, session: Session) -> User:
-    user = session.get(User, user_id)
-    if not user:
+async def get_user_or_raise_404(user_id: UUID, session: AsyncSession) -> User:
+    user = await session.get(User, user_id)
+    if not user or user.deleted_at:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     return user
+
+
+async def insert_user(user: User, session: AsyncSession) -> bool:
+    # Relies on the unique email constraint rather than checking for the email first, so two concurrent signups
+    # with the same email cannot both pass the check. Returns False if the email is already in use.
+    statement = (
+        dialect_insert(session, User)
+        .values(**user.model_dump())
+        .on_conflict_do_nothing(index_elements=[User.email])
+        .returning(User.id)
+    )
+    return (await session.execute(statement)).first() is not None
@@ -0,0 +1,86 @@
+import argparse
+import logging
+import os
+import time
+from uuid import UUID
+
+from sqlalchemy import delete
+from sqlmodel import Session, select
+
+import tasks_backend.app  # noqa: F401 - registers every model with the ORM before the mappers are configured
+from tasks_backend.db import get_engine
+from tasks_backend.models.archived_tasks import ArchivedTask
+from tasks_backend.models.categories import Category
+from tasks_backend.models.tasks import Task
+from tasks_backend.models.tombstones import Tombstone
+from tasks_backend.models.users import User
+
+logger = logging.getLogger(__name__)
+
+PURGE_BATCH_SIZE = int(os.environ.get("PURGE_BATCH_SIZE", "1000"))
+# Stops starting batches this long before the Lambda timeout, so the last one can commit
+PURGE_TIME_MARGIN_SECONDS = 10
+
+# Deleted in this order so each batch cascades into as little as possible: a task batch takes its links with it,
+# leaving categories and tombstones with nothing referencing them
+PURGE_TABLES = [
+    (ArchivedTask, ArchivedTask.id, ArchivedTask.user_id),
+    (Task, Task.id, Task.user_id),
+    (Category, Category.id, Category.user_id),
+    (Tombstone, Tombstone.id, Tombstone.user_id),
+]
+
+
+def purge_user(session: Session, user_id: UUID, batch_size: int, deadline: float | None = None) -> bool:
+    # Each batch is its own transaction, so the account is deleted a little at a time without holding locks on
+    # the user's rows. Returns False if the deadline passed first; the next run carries on where this one stopped.
+    for table, id_column, user_id_column in PURGE_TABLES:
+        while True:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            batch = select(id_column).where(user_id_column == user_id).limit(batch_size)
+            statement = delete(table).where(id_column.in_(batch)).execution_options(synchronize_session=False)
+            deleted_count = session.execute(statement).rowcount
+            session.commit()
+            if deleted_count < batch_size:
+                break
+    # Whatever is left, such as the stats and data version rows, goes with the user through ON DELETE CASCADE
+    session.execute(delete(User).where(User.id == user_id))
+    session.commit()
+    return True
+
+
+def purge(batch_size: int = PURGE_BATCH_SIZE, time_limit_seconds: float | None = None) -> tuple[int, int]:
+    deadline = time.monotonic() + time_limit_seconds if time_limit_seconds is not None else None
+    with Session(get_engine()) as session:
+        statement = select(User.id).where(User.deleted_at.is_not(None)).order_by(User.deleted_at)
+        user_ids = session.exec(statement).all()
+        purged_count = 0
+        for user_id in user_ids:
+            if not purge_user(session, user_id, batch_size, deadline):
+                break
+            purged_count += 1
+    return purged_count, len(user_ids) - purged_count
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="purge-users", description="Delete the accounts scheduled for deletion, in bounded batches."
+    )
+    parser.add_argument("--batch-size", type=int, default=PURGE_BATCH_SIZE, help="Rows deleted per transaction")
+    parser.add_argument("--time-limit", type=float, help="Seconds after which no further batch is started")
+    args = parser.parse_args()
+
+    purged_count, remaining_count = purge(args.batch_size, args.time_limit)
+    print(f"Purged {purged_count} users, {remaining_count} still scheduled for deletion")
+
+
+def lambda_handler(event, context):
+    time_limit_seconds = context.get_remaining_time_in_millis() / 1000 - PURGE_TIME_MARGIN_SECONDS
+    purged_count, remaining_count = purge(time_limit_seconds=time_limit_seconds)
+    logger.info(f"Purged {purged_count} users, {remaining_count} still scheduled for deletion")
+    return {"purged_users": purged_count, "remaining_users": remaining_count}
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import logging
+from collections.abc import AsyncGenerator, AsyncIterator
+from contextlib import asynccontextmanager
+from uuid import UUID
+
+from fastapi import Depends, Request
+from sqlalchemy.exc import DBAPIError
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from tasks_backend import metrics
+from tasks_backend.auth import get_current_user_id
+from tasks_backend.db import get_session, has_reader, reader_session_scope, wrote_recently
+from tasks_backend.models.data_versions import get_data_version
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def read_session_scope(
+    user_id: UUID, writer_session: AsyncSession, writer_version: int | None = None
+) -> AsyncIterator[AsyncSession]:
+    # Serves a user's reads from the replica only once it has every write the writer has for them. Every write
+    # bumps the user's data version, so comparing the version on both sides is exact however many containers
+    # took the writes; a user who just wrote through this container goes straight to the writer.
+    if not has_reader():
+        yield writer_session
+        return
+    if wrote_recently(user_id):
+        metrics.increment("db_reads_total", target="writer", reason="recent_write")
+        yield writer_session
+        return
+    if writer_version is None:
+        writer_version = await get_data_version(user_id, writer_session)
+    async with reader_session_scope() as reader_session:
+        try:
+            reader_is_current = await get_data_version(user_id, reader_session) >= writer_version
+        except DBAPIError:
+            logger.exception("Reader unavailable, reading from the writer")
+            reader_is_current = False
+        if reader_is_current:
+            # Ends the writer session's read-only transaction so its connection goes back to the pool while the
+            # route reads from the replica
+            await writer_session.rollback()
+            metrics.increment("db_reads_total", target="reader", reason="current")
+            yield reader_session
+            return
+    metrics.increment("db_reads_total", target="writer", reason="replica_lag")
+    yield writer_session
+
+
+async def get_read_session(
+    request: Request,
+    current_user_id: UUID = Depends(get_current_user_id),
+    session: AsyncSession = Depends(get_session),
+) -> AsyncGenerator[AsyncSession]:
+    writer_version = getattr(request.state, "data_version", None)
+    async with read_session_scope(current_user_id, session, writer_version) as read_session:
+        yield read_session
@@ -1,8 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from tasks_backend.auth import authenticate_user, create_access_token
+from tasks_backend.admission import check_rate_limit
+from tasks_backend.auth import (
+    authenticate_user,
+    create_access_token,
+    hash_password,
+    invalidate_principal,
+    password_needs_rehash,
+)
 from tasks_backend.db import get_session
 from tasks_backend.models.auth import LoginResponse
 from tasks_backend.utils.utils import get_current_utc_time
@@ -11,20 +18,24 @@ router = APIRouter(prefix="/auth")
 
 
 @router.post("/login")
-def login_for_access_token(
-    form_data: OAuth2PasswordRequestForm = Depends(), session: Session = Depends(get_session)
+async def login_for_access_token(
+    form_data: OAuth2PasswordRequestForm = Depends(), session: AsyncSession = Depends(get_session)
 ) -> LoginResponse:
-    user = authenticate_user(email=form_data.username, password=form_data.password, session=session)
+    # Per account rather than per client, so guessing one account's password is slowed wherever it comes from
+    await check_rate_limit(f"login:{form_data.username.lower()}")
+    user = await authenticate_user(email=form_data.username, password=form_data.password, session=session)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if password_needs_rehash(user.hashed_password):
+        user.hashed_password = await hash_password(form_data.password)
     user.last_login_at = get_current_utc_time()
     session.add(user)
-    session.commit()
-    session.refresh(user)
+    await session.commit()
+    invalidate_principal(user.id)
     access_token_response = create_access_token(user)
     return LoginResponse(
         access_token=access_token_response.access_token,
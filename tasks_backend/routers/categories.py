@@ -1,65 +1,140 @@
 from uuid import UUID
 
-from fastapi import APIRouter, Depends
-from sqlmodel import Session, select
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy import delete, update
+from sqlalchemy.orm import noload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from tasks_backend.auth import get_current_user
+from tasks_backend.auth import get_current_user, get_current_user_id
 from tasks_backend.db import get_session
-from tasks_backend.models.categories import Category, CategoryCreate, CategoryUpdate, get_category_or_raise_404
+from tasks_backend.etags import check_data_version_etag
+from tasks_backend.models.categories import (
+    Category,
+    CategoryCreate,
+    CategoryUpdate,
+    get_category_or_raise_404,
+    restore_default_categories,
+)
+from tasks_backend.models.data_versions import bump_data_version
+from tasks_backend.models.links import TaskCategoryLink
 from tasks_backend.models.shared import CategoryPublicWithTasks
-from tasks_backend.models.users import User
+from tasks_backend.models.task_stats import remove_category_from_task_stats
+from tasks_backend.models.tasks import Task
+from tasks_backend.models.tombstones import TombstoneEntity, add_tombstones
+from tasks_backend.models.users import UserPublic
+from tasks_backend.read_sessions import get_read_session
+from tasks_backend.utils.include import parse_include
+from tasks_backend.utils.serialization import json_response
+from tasks_backend.utils.utils import get_current_utc_time
 
 router = APIRouter(prefix="/categories")
 
+CATEGORY_INCLUDE_FIELDS = {"tasks"}
+
+
+async def _load_category_tasks(categories: list[Category], session: AsyncSession):
+    # selectinload would match the categories on their (id, user_id) key as a list of row values, which SQLite
+    # answers by scanning every link. Category ids are unique on their own, so the tasks are loaded by id instead.
+    tasks_by_category_id = {category.id: [] for category in categories}
+    if tasks_by_category_id:
+        statement = (
+            select(TaskCategoryLink.category_id, Task)
+            .join(Task, Task.id == TaskCategoryLink.task_id)
+            .where(TaskCategoryLink.category_id.in_(list(tasks_by_category_id)))
+        )
+        for category_id, task in (await session.exec(statement)).all():
+            tasks_by_category_id[category_id].append(task)
+    for category in categories:
+        set_committed_value(category, "tasks", tasks_by_category_id[category.id])
+
 
 @router.post("", response_model=CategoryPublicWithTasks)
-def create_category(
+async def create_category(
     category_create: CategoryCreate,
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session),
+    current_user: UserPublic = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
 ):
-    category = Category.model_validate(category_create, update={"user_id": current_user.id})
+    category = Category.model_validate(category_create, update={"tasks": [], "user_id": current_user.id})
     session.add(category)
-    session.commit()
-    session.refresh(category)
+    await bump_data_version(current_user.id, session)
+    await session.commit()
     return category
 
 
-@router.get("", response_model=list[CategoryPublicWithTasks])
-def read_categories(current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
-    categories = session.exec(select(Category).where(Category.user_id == current_user.id)).all()
-    return categories
+@router.post("/restore-defaults", response_model=list[CategoryPublicWithTasks])
+async def restore_defaults(
+    current_user: UserPublic = Depends(get_current_user), session: AsyncSession = Depends(get_session)
+):
+    # Recreates whichever default categories the user has deleted and returns only those
+    restored_categories = await restore_default_categories(current_user.id, session)
+    return [CategoryPublicWithTasks.model_validate(category, update={"tasks": []}) for category in restored_categories]
 
 
-@router.get("/{category_id}", response_model=CategoryPublicWithTasks)
-def read_category(
-    category_id: UUID, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)
+@router.get("", response_model=list[CategoryPublicWithTasks], dependencies=[Depends(check_data_version_etag)])
+async def read_categories(
+    response: Response,
+    include: str = "tasks",
+    current_user_id: UUID = Depends(get_current_user_id),
+    session: AsyncSession = Depends(get_read_session),
 ):
-    category = get_category_or_raise_404(current_user.id, category_id, session)
+    include_tasks = "tasks" in parse_include(include, CATEGORY_INCLUDE_FIELDS)
+    statement = select(Category).where(Category.user_id == current_user_id).options(noload(Category.tasks))
+    categories = (await session.exec(statement)).all()
+    if include_tasks:
+        await _load_category_tasks(categories, session)
+    return json_response(list[CategoryPublicWithTasks], categories, headers=response.headers)
+
+
+@router.get("/{category_id}", response_model=CategoryPublicWithTasks, dependencies=[Depends(check_data_version_etag)])
+async def read_category(
+    category_id: UUID,
+    current_user_id: UUID = Depends(get_current_user_id),
+    session: AsyncSession = Depends(get_read_session),
+):
+    category = await get_category_or_raise_404(current_user_id, category_id, session)
     return category
 
 
 @router.patch("/{category_id}", response_model=CategoryPublicWithTasks)
-def update_category(
+async def update_category(
     category_id: UUID,
     category_update: CategoryUpdate,
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session),
+    current_user: UserPublic = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
 ):
-    category = get_category_or_raise_404(current_user.id, category_id, session)
+    category = await get_category_or_raise_404(current_user.id, category_id, session)
     category_update_data = category_update.model_dump(exclude_unset=True)
     category.sqlmodel_update(category_update_data)
+    category.updated_at = get_current_utc_time()
     session.add(category)
-    session.commit()
-    session.refresh(category)
+    await bump_data_version(current_user.id, session)
+    await session.commit()
     return category
 
 
 @router.delete("/{category_id}")
-def delete_category(
-    category_id: UUID, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)
+async def delete_category(
+    category_id: UUID,
+    current_user: UserPublic = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
 ):
-    category = get_category_or_raise_404(current_user.id, category_id, session)
-    session.delete(category)
-    session.commit()
+    # Marks the category's tasks as changed for sync before ON DELETE CASCADE removes their links
+    linked_task_ids = select(TaskCategoryLink.task_id).where(TaskCategoryLink.category_id == category_id)
+    await session.execute(
+        update(Task)
+        .where(Task.user_id == current_user.id, Task.id.in_(linked_task_ids))
+        .values(updated_at=get_current_utc_time())
+    )
+    statement = (
+        delete(Category).where(Category.user_id == current_user.id, Category.id == category_id).returning(Category.id)
+    )
+    if (await session.execute(statement)).first() is None:
+        await session.rollback()
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category not found")
+    await add_tombstones(current_user.id, TombstoneEntity.CATEGORY, [category_id], session)
+    await remove_category_from_task_stats(current_user.id, category_id, session)
+    await bump_data_version(current_user.id, session)
+    await session.commit()
     return {"message": "Category deleted", "category_id": category_id}
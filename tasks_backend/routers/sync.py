@@ -0,0 +1,139 @@
+from datetime import UTC, datetime, timedelta
+from typing import Annotated
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import tuple_
+from sqlalchemy.orm import selectinload
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from tasks_backend.auth import get_current_user_id
+from tasks_backend.models.categories import Category
+from tasks_backend.models.shared import SyncResponse, SyncTask
+from tasks_backend.models.tasks import Task
+from tasks_backend.models.tombstones import TOMBSTONE_RETENTION_DAYS, Tombstone
+from tasks_backend.read_sessions import get_read_session
+from tasks_backend.utils.pagination import decode_cursor, encode_cursor
+from tasks_backend.utils.serialization import json_response
+from tasks_backend.utils.utils import get_current_utc_time
+
+router = APIRouter(prefix="/sync")
+
+# updated_at is set when a request starts, not when it commits, so a write that commits after a sync can
+# carry an earlier timestamp. Re-reading this window on every sync picks such writes up; clients apply
+# changes by id, so the repeated rows are harmless.
+SYNC_OVERLAP = timedelta(seconds=30)
+SYNC_DEFAULT_PAGE_SIZE = 500
+SYNC_MAX_PAGE_SIZE = 1000
+
+# Each page is filled from these in order, categories first so a task never arrives before its categories.
+# Every one is paged by keyset on its change time and id.
+SYNC_SECTIONS = ["categories", "tasks", "deleted"]
+
+# (started_at, changed_after, section, cursor key) of a sync in progress
+SyncPosition = tuple[datetime, datetime | None, int, tuple[datetime, UUID] | None]
+
+
+def _parse_token_time(value) -> datetime:
+    if not isinstance(value, str):
+        raise TypeError("Sync token time is not a string")
+    parsed_time = datetime.fromisoformat(value)
+    # Change times read back from SQLite carry no time zone; every stored time is UTC
+    return parsed_time if parsed_time.tzinfo else parsed_time.replace(tzinfo=UTC)
+
+
+def _parse_sync_token(since: str) -> SyncPosition:
+    # A "sync" token ends a completed sync and starts the next one from the changes after it; a "sync-page" token
+    # continues a sync that has more pages to send
+    try:
+        token_type, *values = decode_cursor(since)
+        if token_type == "sync":
+            (synced_at,) = values
+            return get_current_utc_time(), _parse_token_time(synced_at) - SYNC_OVERLAP, 0, None
+        if token_type != "sync-page":
+            raise ValueError("Not a sync token")
+        started_at, changed_after, section, cursor_changed_at, cursor_id = values
+        if type(section) is not int or section not in range(len(SYNC_SECTIONS)):
+            raise ValueError(f"Unknown sync section {section}")
+        if cursor_id is None and cursor_changed_at is None:
+            cursor_key = None
+        elif isinstance(cursor_id, str):
+            cursor_key = (_parse_token_time(cursor_changed_at), UUID(cursor_id))
+        else:
+            raise TypeError("Sync token id is not a string")
+        return (
+            _parse_token_time(started_at),
+            _parse_token_time(changed_after) if changed_after is not None else None,
+            section,
+            cursor_key,
+        )
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid sync token")
+
+
+def _section_statement(section: str, user_id: UUID):
+    if section == "categories":
+        return select(Category).where(Category.user_id == user_id), Category.updated_at, Category.id
+    if section == "tasks":
+        statement = select(Task).where(Task.user_id == user_id).options(selectinload(Task.categories))
+        return statement, Task.updated_at, Task.id
+    return select(Tombstone).where(Tombstone.user_id == user_id), Tombstone.deleted_at, Tombstone.id
+
+
+@router.get("", response_model=SyncResponse)
+async def sync(
+    since: str | None = None,
+    limit: Annotated[int, Query(ge=1, le=SYNC_MAX_PAGE_SIZE)] = SYNC_DEFAULT_PAGE_SIZE,
+    current_user_id: UUID = Depends(get_current_user_id),
+    session: AsyncSession = Depends(get_read_session),
+):
+    if since:
+        started_at, changed_after, first_section, cursor_key = _parse_sync_token(since)
+    else:
+        started_at, changed_after, first_section, cursor_key = get_current_utc_time(), None, 0, None
+    # Tombstones older than the retention period may have been pruned, so changes that far back are incomplete
+    if changed_after is not None and changed_after < get_current_utc_time() - timedelta(days=TOMBSTONE_RETENTION_DAYS):
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Sync token expired, start a full sync")
+
+    rows: dict[str, list] = {section: [] for section in SYNC_SECTIONS}
+    remaining = limit
+    next_token = encode_cursor("sync", started_at)
+    has_more = False
+    for section_index in range(first_section, len(SYNC_SECTIONS)):
+        section = SYNC_SECTIONS[section_index]
+        # A full sync has nothing to delete
+        if section == "deleted" and changed_after is None:
+            break
+        statement, changed_column, id_column = _section_statement(section, current_user_id)
+        if changed_after is not None:
+            statement = statement.where(changed_column > changed_after)
+        if cursor_key is not None and section_index == first_section:
+            statement = statement.where(tuple_(changed_column, id_column) > tuple_(*cursor_key))
+        statement = statement.order_by(changed_column, id_column).limit(remaining + 1)
+        section_rows = (await session.exec(statement)).all()
+        if len(section_rows) > remaining:
+            rows[section] = section_rows[:remaining]
+            # The page can fill up exactly at the end of the previous section, leaving this one to start the next
+            if rows[section]:
+                last_row = rows[section][-1]
+                cursor_values = [getattr(last_row, changed_column.key), last_row.id]
+            else:
+                cursor_values = [None, None]
+            next_token = encode_cursor("sync-page", started_at, changed_after, section_index, *cursor_values)
+            has_more = True
+            break
+        rows[section] = section_rows
+        remaining -= len(section_rows)
+
+    sync_response = SyncResponse(
+        tasks=[
+            SyncTask.model_validate(task, update={"category_ids": [category.id for category in task.categories]})
+            for task in rows["tasks"]
+        ],
+        categories=rows["categories"],
+        deleted=rows["deleted"],
+        next_token=next_token,
+        has_more=has_more,
+    )
+    return json_response(SyncResponse, sync_response)
@@ -1,69 +1,497 @@
+from datetime import date, datetime
+from typing import Annotated
 from uuid import UUID
 
-from fastapi import APIRouter, Depends
-from sqlmodel import Session, select
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import delete, insert, literal, tuple_, union_all
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import noload, selectinload
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from tasks_backend.auth import get_current_user
-from tasks_backend.db import get_session
+from tasks_backend.auth import get_current_user, get_current_user_id, oauth2_scheme
+from tasks_backend.db import get_session, session_scope
+from tasks_backend.etags import check_data_version_etag
+from tasks_backend.exports import accepts_gzip, stream_task_export
+from tasks_backend.imports import import_task_stream
+from tasks_backend.models.archived_tasks import (
+    ArchivedTask,
+    ArchivedTaskCategoryLink,
+    delete_archived_tasks,
+    restore_archived_task,
+)
 from tasks_backend.models.categories import Category
-from tasks_backend.models.shared import TaskPublicWithCategories
-from tasks_backend.models.tasks import Task, TaskCreate, TaskUpdate, get_task_or_raise_404
-from tasks_backend.models.users import User
+from tasks_backend.models.data_versions import bump_data_version
+from tasks_backend.models.links import TaskCategoryLink
+from tasks_backend.models.shared import TaskBatchResult, TaskPublicWithCategories, TasksPage
+from tasks_backend.models.task_stats import (
+    TaskStats,
+    TaskStatsEntry,
+    TaskStatsPublic,
+    rebuild_task_stats,
+    task_stats_entry,
+    to_task_stats_public,
+    update_task_stats,
+)
+from tasks_backend.models.tasks import (
+    Status,
+    Task,
+    TaskBatchUpdate,
+    TaskCreate,
+    TaskFileFormat,
+    TaskImportResult,
+    TaskSort,
+    TaskUpdate,
+    apply_task_search,
+    get_task_or_raise_404,
+)
+from tasks_backend.models.tombstones import TombstoneEntity, add_tombstones
+from tasks_backend.models.users import UserPublic
+from tasks_backend.read_sessions import get_read_session
+from tasks_backend.utils.include import parse_include
+from tasks_backend.utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, encode_cursor
+from tasks_backend.utils.serialization import json_response
 from tasks_backend.utils.utils import get_current_utc_time
 
 router = APIRouter(prefix="/tasks")
 
+TASK_INCLUDE_FIELDS = {"categories"}
+MAX_TASK_BATCH_SIZE = 500
+
+
+def _task_loader_options(include: str, model: type[Task] | type[ArchivedTask] = Task):
+    if "categories" in parse_include(include, TASK_INCLUDE_FIELDS):
+        return [selectinload(model.categories)]
+    return [noload(model.categories)]
+
+
+async def _get_categories_by_id(user_id: UUID, category_ids: set[UUID], session: AsyncSession) -> dict[UUID, Category]:
+    if not category_ids:
+        return {}
+    statement = select(Category).where(Category.user_id == user_id, Category.id.in_(category_ids))
+    return {category.id: category for category in (await session.exec(statement)).all()}
+
 
 @router.post("", response_model=TaskPublicWithCategories)
-def create_task(
-    task_create: TaskCreate, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)
+async def create_task(
+    task_create: TaskCreate,
+    current_user: UserPublic = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
 ):
-    categories = session.exec(
-        select(Category).where(Category.user_id == current_user.id, Category.id.in_(task_create.category_ids))
+    categories = (
+        await session.exec(
+            select(Category).where(Category.user_id == current_user.id, Category.id.in_(task_create.category_ids))
+        )
     ).all()
-    task = Task.model_validate(task_create, update={"categories": categories, "user_id": current_user.id})
+    created_at = get_current_utc_time()
+    task = Task.model_validate(
+        task_create,
+        update={
+            "categories": categories,
+            "user_id": current_user.id,
+            "created_at": created_at,
+            "updated_at": created_at,
+        },
+    )
     session.add(task)
-    session.commit()
-    session.refresh(task)
+    await update_task_stats(current_user.id, session, added=[task_stats_entry(task)])
+    await bump_data_version(current_user.id, session)
+    await session.commit()
     return task
 
 
-@router.get("", response_model=list[TaskPublicWithCategories])
-def read_tasks(current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
-    tasks = session.exec(select(Task).where(Task.user_id == current_user.id)).all()
-    return tasks
+def _parse_task_cursor(cursor: str, sort: TaskSort) -> tuple[datetime | str, UUID]:
+    try:
+        cursor_sort, sort_value, task_id = decode_cursor(cursor)
+        if cursor_sort != sort.value or not isinstance(sort_value, str) or not isinstance(task_id, str):
+            raise ValueError(f"Cursor does not match sort {sort.value}")
+        if sort.field_name == "created_at":
+            sort_value = datetime.fromisoformat(sort_value)
+        return sort_value, UUID(task_id)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def _task_list_filters(
+    model: type[Task] | type[ArchivedTask],
+    link_model: type[TaskCategoryLink] | type[ArchivedTaskCategoryLink],
+    user_id: UUID,
+    sort: TaskSort,
+    cursor_key: tuple[datetime | str, UUID] | None,
+    task_status: Status | None,
+    due_from: date | None,
+    due_to: date | None,
+    category_id: UUID | None,
+) -> list:
+    filters = [model.user_id == user_id]
+    if task_status:
+        filters.append(model.status == task_status)
+    if due_from:
+        filters.append(model.due_date >= due_from)
+    if due_to:
+        filters.append(model.due_date <= due_to)
+    if category_id:
+        category_task_ids = select(link_model.task_id).where(link_model.category_id == category_id)
+        filters.append(model.id.in_(category_task_ids))
+    if cursor_key:
+        sort_key = tuple_(getattr(model, sort.field_name), model.id)
+        filters.append(sort_key < tuple_(*cursor_key) if sort.descending else sort_key > tuple_(*cursor_key))
+    return filters
+
+
+def _task_list_order(sort: TaskSort, sort_column, id_column) -> tuple:
+    if sort.descending:
+        return sort_column.desc(), id_column.desc()
+    return sort_column, id_column
+
+
+async def _read_tasks_with_archived(
+    filter_args: tuple, sort: TaskSort, include: str, limit: int, session: AsyncSession
+) -> list[Task | ArchivedTask]:
+    # Pages through both tables as one in the database, so the order matches its collation for names, then loads
+    # the page's tasks from whichever table each one is in
+    page_keys = union_all(
+        select(Task.id, getattr(Task, sort.field_name).label("sort_value"), literal(False).label("archived")).where(
+            *_task_list_filters(Task, TaskCategoryLink, *filter_args)
+        ),
+        select(
+            ArchivedTask.id, getattr(ArchivedTask, sort.field_name).label("sort_value"), literal(True).label("archived")
+        ).where(*_task_list_filters(ArchivedTask, ArchivedTaskCategoryLink, *filter_args)),
+    ).subquery()
+    statement = (
+        select(page_keys.c.id, page_keys.c.archived)
+        .order_by(*_task_list_order(sort, page_keys.c.sort_value, page_keys.c.id))
+        .limit(limit + 1)
+    )
+    page = (await session.exec(statement)).all()
+    tasks_by_id = {}
+    for model, archived in ((Task, False), (ArchivedTask, True)):
+        task_ids = [task_id for task_id, task_archived in page if task_archived == archived]
+        if task_ids:
+            statement = select(model).where(model.id.in_(task_ids)).options(*_task_loader_options(include, model))
+            tasks_by_id.update((task.id, task) for task in (await session.exec(statement)).all())
+    # A task archived or restored between the two reads is left off this page rather than shown twice
+    return [tasks_by_id[task_id] for task_id, _ in page if task_id in tasks_by_id]
+
 
+@router.get("", response_model=TasksPage, dependencies=[Depends(check_data_version_etag)])
+async def read_tasks(
+    response: Response,
+    cursor: str | None = None,
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    sort: TaskSort = TaskSort.CREATED_AT,
+    task_status: Annotated[Status | None, Query(alias="status")] = None,
+    due_from: date | None = None,
+    due_to: date | None = None,
+    category_id: UUID | None = None,
+    include: str = "categories",
+    include_archived: bool = False,
+    current_user_id: UUID = Depends(get_current_user_id),
+    session: AsyncSession = Depends(get_read_session),
+):
+    cursor_key = _parse_task_cursor(cursor, sort) if cursor else None
+    filter_args = (current_user_id, sort, cursor_key, task_status, due_from, due_to, category_id)
+    if include_archived:
+        tasks = await _read_tasks_with_archived(filter_args, sort, include, limit, session)
+    else:
+        statement = (
+            select(Task)
+            .where(*_task_list_filters(Task, TaskCategoryLink, *filter_args))
+            .options(*_task_loader_options(include))
+            .order_by(*_task_list_order(sort, getattr(Task, sort.field_name), Task.id))
+            .limit(limit + 1)
+        )
+        tasks = (await session.exec(statement)).all()
+    next_cursor = None
+    if len(tasks) > limit:
+        tasks = tasks[:limit]
+        last_task = tasks[-1]
+        next_cursor = encode_cursor(sort.value, getattr(last_task, sort.field_name), last_task.id)
+    return json_response(TasksPage, {"items": tasks, "next_cursor": next_cursor}, headers=response.headers)
+
+
+def _parse_search_cursor(cursor: str, q: str) -> int:
+    try:
+        cursor_type, cursor_q, offset = decode_cursor(cursor)
+        if cursor_type != "search" or cursor_q != q or not isinstance(offset, int) or offset < 0:
+            raise ValueError(f"Cursor does not match search {q}")
+        return offset
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+@router.get("/search", response_model=TasksPage, dependencies=[Depends(check_data_version_etag)])
+async def search_tasks(
+    response: Response,
+    q: Annotated[str, Query(min_length=1, max_length=200)],
+    cursor: str | None = None,
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    task_status: Annotated[Status | None, Query(alias="status")] = None,
+    category_id: UUID | None = None,
+    include: str = "categories",
+    current_user_id: UUID = Depends(get_current_user_id),
+    session: AsyncSession = Depends(get_read_session),
+):
+    # Ranked results have no stable keyset to resume from, so search pages by offset
+    offset = _parse_search_cursor(cursor, q) if cursor else 0
+    statement = select(Task).where(Task.user_id == current_user_id).options(*_task_loader_options(include))
+    if task_status:
+        statement = statement.where(Task.status == task_status)
+    if category_id:
+        category_task_ids = select(TaskCategoryLink.task_id).where(TaskCategoryLink.category_id == category_id)
+        statement = statement.where(Task.id.in_(category_task_ids))
+    statement = apply_task_search(statement, q, session.bind.dialect.name)
 
-@router.get("/{task_id}", response_model=TaskPublicWithCategories)
-def read_task(task_id: UUID, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
-    task = get_task_or_raise_404(current_user.id, task_id, session)
+    tasks = (await session.exec(statement.offset(offset).limit(limit + 1))).all()
+    next_cursor = None
+    if len(tasks) > limit:
+        tasks = tasks[:limit]
+        next_cursor = encode_cursor("search", q, offset + limit)
+    return json_response(TasksPage, {"items": tasks, "next_cursor": next_cursor}, headers=response.headers)
+
+
+@router.get("/stats", response_model=TaskStatsPublic)
+async def read_task_stats(
+    current_user: UserPublic = Depends(get_current_user), session: AsyncSession = Depends(get_session)
+):
+    # Not covered by the data version ETag: overdue and due-this-week counts change with the date alone. Writes
+    # the stats row on first read, so it authenticates like the routes that write.
+    task_stats = await session.get(TaskStats, current_user.id)
+    if task_stats is None:
+        task_stats = await session.run_sync(rebuild_task_stats, current_user.id)
+        try:
+            await session.commit()
+        except IntegrityError:
+            # A concurrent request materialised the stats first
+            await session.rollback()
+            task_stats = await session.get(TaskStats, current_user.id)
+    return to_task_stats_public(task_stats)
+
+
+@router.get("/export")
+async def export_tasks(
+    request: Request,
+    export_format: Annotated[TaskFileFormat, Query(alias="format")],
+    token: str = Depends(oauth2_scheme),
+):
+    # Authenticates with a session of its own that is closed before the body streams, so the export never holds
+    # two sessions at once whatever point FastAPI tears request dependencies down at
+    async with session_scope() as session:
+        current_user_id = await get_current_user_id(token, session)
+    gzip = accepts_gzip(request.headers.get("Accept-Encoding", ""))
+    headers = {"Content-Disposition": f'attachment; filename="tasks.{export_format.value}"', "Vary": "Accept-Encoding"}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        stream_task_export(current_user_id, export_format, gzip), media_type=export_format.media_type, headers=headers
+    )
+
+
+@router.post("/import", response_model=TaskImportResult)
+async def import_tasks(
+    request: Request,
+    import_format: Annotated[TaskFileFormat, Query(alias="format")],
+    current_user: UserPublic = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
+):
+    # The raw request body is the file, read as it arrives rather than buffered as a form upload
+    gzip = request.headers.get("Content-Encoding", "").lower() == "gzip"
+    return await import_task_stream(current_user.id, request.stream(), import_format, gzip, session)
+
+
+@router.post("/batch", response_model=list[TaskBatchResult])
+async def create_tasks(
+    task_creates: Annotated[list[TaskCreate], Body(min_length=1, max_length=MAX_TASK_BATCH_SIZE)],
+    current_user: UserPublic = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
+):
+    categories_by_id = await _get_categories_by_id(
+        current_user.id,
+        {category_id for task_create in task_creates for category_id in task_create.category_ids},
+        session,
+    )
+    created_at = get_current_utc_time()
+    task_rows = []
+    link_rows = []
+    stats_entries = []
+    results = []
+    for index, task_create in enumerate(task_creates):
+        task = Task.model_validate(
+            task_create, update={"user_id": current_user.id, "created_at": created_at, "updated_at": created_at}
+        )
+        categories = [
+            categories_by_id[category_id]
+            for category_id in dict.fromkeys(task_create.category_ids)
+            if category_id in categories_by_id
+        ]
+        task_rows.append(task.model_dump())
+        link_rows.extend({"task_id": task.id, "category_id": category.id} for category in categories)
+        stats_entries.append(task_stats_entry(task, [category.id for category in categories]))
+        task_public = TaskPublicWithCategories.model_validate(task, update={"categories": categories})
+        results.append(
+            TaskBatchResult(index=index, task_id=task.id, status_code=status.HTTP_201_CREATED, task=task_public)
+        )
+    await session.execute(insert(Task), task_rows)
+    if link_rows:
+        await session.execute(insert(TaskCategoryLink), link_rows)
+    await update_task_stats(current_user.id, session, added=stats_entries)
+    await bump_data_version(current_user.id, session)
+    await session.commit()
+    return results
+
+
+@router.patch("/batch", response_model=list[TaskBatchResult])
+async def update_tasks(
+    task_updates: Annotated[list[TaskBatchUpdate], Body(min_length=1, max_length=MAX_TASK_BATCH_SIZE)],
+    current_user: UserPublic = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
+):
+    statement = (
+        select(Task)
+        .where(Task.user_id == current_user.id, Task.id.in_({task_update.id for task_update in task_updates}))
+        .options(selectinload(Task.categories))
+    )
+    tasks_by_id = {task.id: task for task in (await session.exec(statement)).all()}
+    categories_by_id = await _get_categories_by_id(
+        current_user.id,
+        {category_id for task_update in task_updates for category_id in task_update.category_ids or []},
+        session,
+    )
+    updated_at = get_current_utc_time()
+    removed_stats_entries = []
+    added_stats_entries = []
+    results = []
+    for index, task_update in enumerate(task_updates):
+        task = tasks_by_id.get(task_update.id)
+        if task is None:
+            results.append(
+                TaskBatchResult(
+                    index=index, task_id=task_update.id, status_code=status.HTTP_404_NOT_FOUND, detail="Task not found"
+                )
+            )
+            continue
+        removed_stats_entries.append(task_stats_entry(task))
+        if task_update.category_ids:
+            task.categories = [
+                categories_by_id[category_id]
+                for category_id in dict.fromkeys(task_update.category_ids)
+                if category_id in categories_by_id
+            ]
+        task.sqlmodel_update(task_update.model_dump(exclude_unset=True, exclude={"id", "category_ids"}))
+        task.updated_at = updated_at
+        added_stats_entries.append(task_stats_entry(task))
+        results.append(TaskBatchResult(index=index, task_id=task.id, status_code=status.HTTP_200_OK))
+    if tasks_by_id:
+        await update_task_stats(current_user.id, session, removed=removed_stats_entries, added=added_stats_entries)
+        await bump_data_version(current_user.id, session)
+    await session.commit()
+    for result in results:
+        if result.status_code == status.HTTP_200_OK:
+            result.task = TaskPublicWithCategories.model_validate(tasks_by_id[result.task_id])
+    return results
+
+
+async def _delete_tasks(user_id: UUID, task_ids: set[UUID], session: AsyncSession) -> dict[UUID, TaskStatsEntry]:
+    # Deletes the tasks in one statement and leaves their links to ON DELETE CASCADE. The links are read first
+    # because the stats still need each task's categories.
+    link_statement = select(TaskCategoryLink.task_id, TaskCategoryLink.category_id).where(
+        TaskCategoryLink.task_id.in_(task_ids)
+    )
+    task_category_ids: dict[UUID, set[UUID]] = {}
+    for task_id, category_id in (await session.exec(link_statement)).all():
+        task_category_ids.setdefault(task_id, set()).add(category_id)
+    statement = (
+        delete(Task)
+        .where(Task.user_id == user_id, Task.id.in_(task_ids))
+        .returning(Task.id, Task.status, Task.due_date)
+    )
+    deleted_tasks = (await session.execute(statement)).all()
+    return {
+        task_id: (task_status, frozenset(task_category_ids.get(task_id, ())), due_date)
+        for task_id, task_status, due_date in deleted_tasks
+    }
+
+
+@router.delete("/batch", response_model=list[TaskBatchResult])
+async def delete_tasks(
+    task_ids: Annotated[list[UUID], Body(min_length=1, max_length=MAX_TASK_BATCH_SIZE)],
+    current_user: UserPublic = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
+):
+    deleted_tasks = await _delete_tasks(current_user.id, set(task_ids), session)
+    deleted_archived_task_ids = await delete_archived_tasks(
+        current_user.id, set(task_ids) - set(deleted_tasks), session
+    )
+    if deleted_tasks:
+        await add_tombstones(current_user.id, TombstoneEntity.TASK, list(deleted_tasks), session)
+        await update_task_stats(current_user.id, session, removed=list(deleted_tasks.values()))
+    if deleted_tasks or deleted_archived_task_ids:
+        await bump_data_version(current_user.id, session)
+        await session.commit()
+    return [
+        TaskBatchResult(index=index, task_id=task_id, status_code=status.HTTP_200_OK)
+        if task_id in deleted_tasks or task_id in deleted_archived_task_ids
+        else TaskBatchResult(
+            index=index, task_id=task_id, status_code=status.HTTP_404_NOT_FOUND, detail="Task not found"
+        )
+        for index, task_id in enumerate(task_ids)
+    ]
+
+
+@router.get("/{task_id}", response_model=TaskPublicWithCategories, dependencies=[Depends(check_data_version_etag)])
+async def read_task(
+    task_id: UUID,
+    current_user_id: UUID = Depends(get_current_user_id),
+    session: AsyncSession = Depends(get_read_session),
+):
+    task = await get_task_or_raise_404(current_user_id, task_id, session)
     return task
 
 
 @router.patch("/{task_id}", response_model=TaskPublicWithCategories)
-def update_task(
+async def update_task(
     task_id: UUID,
     task_update: TaskUpdate,
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session),
+    current_user: UserPublic = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
 ):
-    task = get_task_or_raise_404(current_user.id, task_id, session)
+    task = await get_task_or_raise_404(current_user.id, task_id, session)
+    removed_stats_entry = task_stats_entry(task)
     if task_update.category_ids:
-        categories = session.exec(select(Category).where(Category.id.in_(task_update.category_ids))).all()
-        task.categories = categories
+        categories_by_id = await _get_categories_by_id(current_user.id, set(task_update.category_ids), session)
+        task.categories = list(categories_by_id.values())
     task_update_data = task_update.model_dump(exclude_unset=True)
     task.sqlmodel_update(task_update_data)
     task.updated_at = get_current_utc_time()
     session.add(task)
-    session.commit()
-    session.refresh(task)
-    print(task)
+    await update_task_stats(current_user.id, session, removed=[removed_stats_entry], added=[task_stats_entry(task)])
+    await bump_data_version(current_user.id, session)
+    await session.commit()
     return task
 
 
 @router.delete("/{task_id}")
-def delete_task(task_id: UUID, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
-    task = get_task_or_raise_404(current_user.id, task_id, session)
-    session.delete(task)
-    session.commit()
+async def delete_task(
+    task_id: UUID, current_user: UserPublic = Depends(get_current_user), session: AsyncSession = Depends(get_session)
+):
+    deleted_tasks = await _delete_tasks(current_user.id, {task_id}, session)
+    if deleted_tasks:
+        await add_tombstones(current_user.id, TombstoneEntity.TASK, [task_id], session)
+        await update_task_stats(current_user.id, session, removed=list(deleted_tasks.values()))
+    elif not await delete_archived_tasks(current_user.id, {task_id}, session):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
+    await bump_data_version(current_user.id, session)
+    await session.commit()
     return {"message": "Task deleted", "task_id": task_id}
+
+
+@router.post("/{task_id}/unarchive", response_model=TaskPublicWithCategories)
+async def unarchive_task(
+    task_id: UUID, current_user: UserPublic = Depends(get_current_user), session: AsyncSession = Depends(get_session)
+):
+    task = await restore_archived_task(current_user.id, task_id, session)
+    await update_task_stats(current_user.id, session, added=[task_stats_entry(task)])
+    await bump_data_version(current_user.id, session)
+    await session.commit()
+    return task
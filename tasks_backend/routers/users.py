@@ -1,11 +1,16 @@
+import os
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import Session, select
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy import delete, func, update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from tasks_backend.auth import create_access_token, get_current_user, hash_password
+from tasks_backend.auth import create_access_token, get_current_user, hash_password, invalidate_principal
 from tasks_backend.db import get_session
+from tasks_backend.models.archived_tasks import ArchivedTask
 from tasks_backend.models.categories import create_default_categories
+from tasks_backend.models.tasks import Task
 from tasks_backend.models.users import (
     User,
     UserCreate,
@@ -13,23 +18,24 @@ from tasks_backend.models.users import (
     UserPublic,
     UserUpdate,
     get_user_or_raise_404,
+    insert_user,
 )
 from tasks_backend.utils.utils import get_current_utc_time
 
 router = APIRouter(prefix="/users")
 
+MAX_SYNCHRONOUS_DELETE_TASKS = int(os.environ.get("MAX_SYNCHRONOUS_DELETE_TASKS", "1000"))
+
 
 @router.post("", response_model=UserCreateResponse)
-def create_user(user_create: UserCreate, session: Session = Depends(get_session)):
-    existing_user = session.exec(select(User).where(User.email == user_create.email)).first()
-    if existing_user:
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Email already in use.")
-    hashed_password = hash_password(user_create.password)
+async def create_user(user_create: UserCreate, session: AsyncSession = Depends(get_session)):
+    hashed_password = await hash_password(user_create.password)
     user = User.model_validate(user_create, update={"hashed_password": hashed_password})
-    session.add(user)
-    session.commit()
-    session.refresh(user)
-    create_default_categories(user.id, session)
+    if not await insert_user(user, session):
+        await session.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Email already in use.")
+    await create_default_categories(user.id, session)
+    await session.commit()
     access_token_response = create_access_token(user)
     return UserCreateResponse(
         access_token=access_token_response.access_token,
@@ -42,29 +48,60 @@ def create_user(user_create: UserCreate, session: Session = Depends(get_session)
 
 
 @router.get("", response_model=UserPublic)
-def read_user(current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+async def read_user(current_user: UserPublic = Depends(get_current_user)):
     return current_user
 
 
 @router.patch("/{user_id}", response_model=UserPublic)
-def update_user(
-    user_update: UserUpdate, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)
+async def update_user(
+    user_update: UserUpdate,
+    current_user: UserPublic = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
 ):
-    user = current_user
+    user = await get_user_or_raise_404(current_user.id, session)
     if user_update.password:
-        user.hashed_password = hash_password(user_update.password)
+        user.hashed_password = await hash_password(user_update.password)
     user_update_data = user_update.model_dump(exclude_unset=True)
     user.sqlmodel_update(user_update_data)
     user.updated_at = get_current_utc_time()
     session.add(user)
-    session.commit()
-    session.refresh(user)
+    await session.commit()
+    invalidate_principal(user.id)
     return user
 
 
 @router.delete("/{user_id}")
-def delete_user(user_id: UUID, session: Session = Depends(get_session)):
-    user = get_user_or_raise_404(user_id, session)
-    session.delete(user)
-    session.commit()
-    return {"message": "User deleted", "user_id": user_id}
+async def delete_user(
+    user_id: UUID,
+    response: Response,
+    current_user: UserPublic = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
+):
+    if user_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Cannot delete another user")
+    # Small accounts are deleted in one statement, their data going with them through ON DELETE CASCADE. Larger
+    # ones are marked for the purge job, which deletes them in batches that keep locks and transactions short.
+    task_count = 0
+    for model in (Task, ArchivedTask):
+        task_count_statement = select(func.count()).select_from(
+            select(model.id).where(model.user_id == user_id).limit(MAX_SYNCHRONOUS_DELETE_TASKS + 1).subquery()
+        )
+        task_count += await session.scalar(task_count_statement)
+    if task_count > MAX_SYNCHRONOUS_DELETE_TASKS:
+        statement = (
+            update(User)
+            .where(User.id == user_id, User.deleted_at.is_(None))
+            .values(deleted_at=get_current_utc_time())
+            .returning(User.id)
+        )
+        message = "User deletion scheduled"
+        response.status_code = status.HTTP_202_ACCEPTED
+    else:
+        statement = delete(User).where(User.id == user_id).returning(User.id)
+        message = "User deleted"
+    if (await session.execute(statement)).first() is None:
+        await session.rollback()
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    await session.commit()
+    invalidate_principal(user_id)
+    return {"message": message, "user_id": user_id}
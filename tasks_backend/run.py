@@ -8,6 +8,7 @@ RELOAD = os.environ.get("RELOAD", "False").lower() == "true"
 
 
 def run_server():
+    os.environ.setdefault("METRICS_ENDPOINT", "True")
     uvicorn.run("tasks_backend.app:app", host="localhost", port=8000, reload=RELOAD)
 
 
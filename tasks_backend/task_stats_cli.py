@@ -0,0 +1,40 @@
+import argparse
+from uuid import UUID
+
+from sqlmodel import Session, select, union
+
+import tasks_backend.app  # noqa: F401 - registers every model with the ORM before the mappers are configured
+from tasks_backend.db import get_engine
+from tasks_backend.models.task_stats import TaskStats, rebuild_task_stats
+from tasks_backend.models.tasks import Task
+
+
+def rebuild(user_ids: list[UUID] | None = None) -> int:
+    with Session(get_engine()) as session:
+        if not user_ids:
+            # Users with neither tasks nor stats have nothing to repair; their stats are built on first read
+            user_ids = session.exec(union(select(Task.user_id), select(TaskStats.user_id))).scalars().all()
+        # One transaction per user keeps the row locks short while the application is serving writes
+        for user_id in user_ids:
+            rebuild_task_stats(session, user_id)
+            session.commit()
+    return len(user_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="task-stats", description="Rebuild the per-user task statistics from the tasks themselves."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    rebuild_parser = subparsers.add_parser("rebuild", help="Recount task statistics to repair drift")
+    rebuild_parser.add_argument(
+        "--user-id", type=UUID, action="append", dest="user_ids", help="User to rebuild (default: all users)"
+    )
+    args = parser.parse_args()
+
+    rebuilt_count = rebuild(args.user_ids)
+    print(f"Rebuilt task statistics for {rebuilt_count} users")
+
+
+if __name__ == "__main__":
+    main()
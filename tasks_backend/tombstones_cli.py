@@ -0,0 +1,65 @@
+import argparse
+import logging
+import os
+import time
+from datetime import timedelta
+
+from sqlmodel import Session
+
+import tasks_backend.app  # noqa: F401 - registers every model with the ORM before the mappers are configured
+from tasks_backend.db import get_engine
+from tasks_backend.models.tombstones import TOMBSTONE_RETENTION_DAYS, prune_tombstones
+from tasks_backend.utils.utils import get_current_utc_time
+
+logger = logging.getLogger(__name__)
+
+TOMBSTONE_PRUNE_BATCH_SIZE = int(os.environ.get("TOMBSTONE_PRUNE_BATCH_SIZE", "5000"))
+# Stops starting batches this long before the Lambda timeout, so the last one can commit
+TOMBSTONE_PRUNE_TIME_MARGIN_SECONDS = 10
+
+
+def prune(
+    retention_days: float = TOMBSTONE_RETENTION_DAYS,
+    batch_size: int = TOMBSTONE_PRUNE_BATCH_SIZE,
+    time_limit_seconds: float | None = None,
+) -> tuple[int, bool]:
+    # Returns how many tombstones were deleted and whether every one past the retention period was reached
+    deadline = time.monotonic() + time_limit_seconds if time_limit_seconds is not None else None
+    deleted_before = get_current_utc_time() - timedelta(days=retention_days)
+    pruned_count = 0
+    with Session(get_engine()) as session:
+        while True:
+            if deadline is not None and time.monotonic() > deadline:
+                return pruned_count, False
+            batch_count = prune_tombstones(session, deleted_before, batch_size)
+            pruned_count += batch_count
+            if batch_count < batch_size:
+                return pruned_count, True
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="prune-tombstones", description="Delete sync tombstones older than the retention period."
+    )
+    parser.add_argument(
+        "--retention-days", type=float, default=TOMBSTONE_RETENTION_DAYS, help="Days a tombstone is kept for"
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=TOMBSTONE_PRUNE_BATCH_SIZE, help="Tombstones deleted per transaction"
+    )
+    parser.add_argument("--time-limit", type=float, help="Seconds after which no further batch is started")
+    args = parser.parse_args()
+
+    pruned_count, finished = prune(args.retention_days, args.batch_size, args.time_limit)
+    print(f"Pruned {pruned_count} tombstones{'' if finished else ', stopped at the time limit'}")
+
+
+def lambda_handler(event, context):
+    time_limit_seconds = context.get_remaining_time_in_millis() / 1000 - TOMBSTONE_PRUNE_TIME_MARGIN_SECONDS
+    pruned_count, finished = prune(time_limit_seconds=time_limit_seconds)
+    logger.info(f"Pruned {pruned_count} tombstones{'' if finished else ', stopped at the time limit'}")
+    return {"pruned_tombstones": pruned_count, "finished": finished}
+
+
+if __name__ == "__main__":
+    main()
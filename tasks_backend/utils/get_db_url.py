@@ -1,35 +1,44 @@
-import json
 import logging
 import os
 
-import boto3
-from botocore.exceptions import ClientError
-
+from tasks_backend.utils.secrets import get_secret
 from tasks_backend.utils.utils import get_env_var
 
 
-def _get_db_credentials() -> tuple[str, str]:
-    secrets_client = boto3.client("secretsmanager")
-    secret_id = get_env_var("DBSecretArn")
-
-    try:
-        logging.info("Getting DBSecret from Secrets Manager...")
-        get_secret_value_response = secrets_client.get_secret_value(SecretId=secret_id)
-    except ClientError as e:
-        logging.error(f"Error retrieving DBSecret: {e}")
-    logging.info("Retrieved DB credentials from Secrets Manager")
-
-    db_secret = json.loads(get_secret_value_response["SecretString"])
+def get_db_credentials() -> tuple[str, str] | None:
+    if "AWS_LAMBDA_FUNCTION_NAME" not in os.environ:
+        return None
+    db_secret = get_secret("db")
     return db_secret["username"], db_secret["password"]
 
 
 def get_db_url() -> str:
-    if "AWS_LAMBDA_FUNCTION_NAME" in os.environ:
-        username, password = _get_db_credentials()
+    db_credentials = get_db_credentials()
+    if db_credentials:
+        username, password = db_credentials
         db_host = get_env_var("DBClusterEndpoint")
         db_name = get_env_var("DBName")
         db_url = f"postgresql://{username}:{password}@{db_host}/{db_name}"
+        logging.info(f"DB URL: postgresql://{username}:***@{db_host}/{db_name}")
     else:
         db_url = get_env_var("DB_URL")
-    logging.info(f"DB URL: {db_url}")
+        logging.info(f"DB URL: {db_url}")
+    return db_url
+
+
+def get_reader_db_url() -> str | None:
+    # Read-only replica. On Lambda this is the cluster's reader endpoint; locally READER_DB_URL can point at a
+    # second database, e.g. a copy of the SQLite file. None sends every query to the writer.
+    db_credentials = get_db_credentials()
+    if db_credentials:
+        db_host = os.environ.get("DBReaderEndpoint")
+        if not db_host:
+            return None
+        username, password = db_credentials
+        db_name = get_env_var("DBName")
+        logging.info(f"Reader DB URL: postgresql://{username}:***@{db_host}/{db_name}")
+        return f"postgresql://{username}:{password}@{db_host}/{db_name}"
+    db_url = os.environ.get("READER_DB_URL")
+    if db_url:
+        logging.info(f"Reader DB URL: {db_url}")
     return db_url
@@ -1,30 +1,15 @@
-import json
-import logging
-import os
-from functools import lru_cache
+from tasks_backend.utils.secrets import get_secret
 
-import boto3
-from botocore.exceptions import ClientError
 
-from tasks_backend.utils.utils import get_env_var
+def get_jwt_secret_key() -> str:
+    return get_secret("jwt")["jwt-secret-key"]
 
 
-@lru_cache()
-def get_jwt_secret_key():
-    if "AWS_LAMBDA_FUNCTION_NAME" in os.environ:
-        secrets_client = boto3.client("secretsmanager")
-        secret_id = get_env_var("JWTSecretKeySecretArn")
-
-        try:
-            get_secret_value_response = secrets_client.get_secret_value(SecretId=secret_id)
-        except ClientError as e:
-            logging.error(f"Error retrieving JWTSecretKeySecret: {e}")
-        logging.info("Retrieved JWT secret key from Secrets Manager")
-
-        jwt_secret = json.loads(get_secret_value_response["SecretString"])
-        jwt_secret_key = jwt_secret["jwt-secret-key"]
-
-    else:
-        jwt_secret_key = get_env_var("JWT_SECRET_KEY")
-
-    return jwt_secret_key
+def get_jwt_verification_keys() -> list[str]:
+    # Tokens signed before a rotation stay valid until they expire, so verification also accepts the
+    # previous key while Secrets Manager still holds one
+    jwt_secret_keys = [get_jwt_secret_key()]
+    previous_jwt_secret = get_secret("jwt", previous=True)
+    if previous_jwt_secret and previous_jwt_secret["jwt-secret-key"] not in jwt_secret_keys:
+        jwt_secret_keys.append(previous_jwt_secret["jwt-secret-key"])
+    return jwt_secret_keys
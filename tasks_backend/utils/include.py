@@ -0,0 +1,12 @@
+from fastapi import HTTPException, status
+
+
+def parse_include(include: str, allowed: set[str]) -> set[str]:
+    include_fields = {field.strip() for field in include.split(",") if field.strip()}
+    unknown_fields = include_fields - allowed
+    if unknown_fields:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Cannot include {', '.join(sorted(unknown_fields))}",
+        )
+    return include_fields
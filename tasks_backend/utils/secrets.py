@@ -0,0 +1,180 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Protocol
+
+from tasks_backend.utils.utils import get_env_var
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SECRETS_BACKEND = "secretsmanager" if "AWS_LAMBDA_FUNCTION_NAME" in os.environ else "env"
+SECRETS_BACKEND = os.environ.get("SECRETS_BACKEND", DEFAULT_SECRETS_BACKEND).lower()
+SECRETS_FILE = os.environ.get("SECRETS_FILE", "secrets.json")
+SECRETS_CACHE_TTL_SECONDS = float(os.environ.get("SECRETS_CACHE_TTL_SECONDS", "900"))
+SECRETS_REFRESH_AHEAD_SECONDS = float(os.environ.get("SECRETS_REFRESH_AHEAD_SECONDS", "120"))
+
+# Environment variables holding each secret's Secrets Manager ARN
+SECRET_ARN_ENV_VARS = {"db": "DBSecretArn", "jwt": "JWTSecretKeySecretArn"}
+# Environment variables holding each secret's fields when SECRETS_BACKEND=env. The previous version of a
+# secret is read from the same variables prefixed with PREVIOUS_.
+SECRET_FIELD_ENV_VARS = {
+    "db": {"username": "DB_USERNAME", "password": "DB_PASSWORD"},
+    "jwt": {"jwt-secret-key": "JWT_SECRET_KEY"},
+}
+
+
+class SecretsProvider(Protocol):
+    # Returns None when the requested version does not exist, e.g. the previous version of a secret that
+    # has never been rotated
+    def get_secret(self, name: str, previous: bool = False) -> dict[str, Any] | None: ...
+
+
+class SecretsManagerProvider:
+    def __init__(self):
+        import boto3
+
+        self.client = boto3.client("secretsmanager")
+
+    def get_secret(self, name: str, previous: bool = False) -> dict[str, Any] | None:
+        from botocore.exceptions import ClientError
+
+        secret_id = get_env_var(SECRET_ARN_ENV_VARS[name])
+        version_stage = "AWSPREVIOUS" if previous else "AWSCURRENT"
+        try:
+            get_secret_value_response = self.client.get_secret_value(SecretId=secret_id, VersionStage=version_stage)
+        except ClientError as e:
+            if previous and e.response["Error"]["Code"] == "ResourceNotFoundException":
+                return None
+            logger.error(f"Error retrieving {name} secret ({version_stage}) from Secrets Manager: {e}")
+            raise
+        logger.info(f"Retrieved {name} secret ({version_stage}) from Secrets Manager")
+        return json.loads(get_secret_value_response["SecretString"])
+
+
+class EnvProvider:
+    def get_secret(self, name: str, previous: bool = False) -> dict[str, Any] | None:
+        field_env_vars = SECRET_FIELD_ENV_VARS[name]
+        if previous:
+            secret = {field: os.getenv(f"PREVIOUS_{env_var}") for field, env_var in field_env_vars.items()}
+            return secret if all(secret.values()) else None
+        return {field: get_env_var(env_var) for field, env_var in field_env_vars.items()}
+
+
+class FileProvider:
+    # Reads a JSON file of the form {"jwt": {...}, "jwt:previous": {...}}, re-read on every cache refresh
+    def __init__(self, path: str):
+        self.path = path
+
+    def get_secret(self, name: str, previous: bool = False) -> dict[str, Any] | None:
+        with open(self.path) as secrets_file:
+            secrets = json.load(secrets_file)
+        key = f"{name}:previous" if previous else name
+        if key not in secrets and not previous:
+            raise KeyError(f"Secret {name} not found in {self.path}")
+        return secrets.get(key)
+
+
+class StaticProvider:
+    def __init__(self, secrets: dict[str, dict[str, Any]] | None = None):
+        self.secrets = dict(secrets or {})
+
+    def set_secret(self, name: str, secret: dict[str, Any] | None, previous: bool = False):
+        self.secrets[f"{name}:previous" if previous else name] = secret
+
+    def get_secret(self, name: str, previous: bool = False) -> dict[str, Any] | None:
+        if previous:
+            return self.secrets.get(f"{name}:previous")
+        return self.secrets[name]
+
+
+class SecretsCache:
+    # Serves secrets from memory. Within SECRETS_REFRESH_AHEAD_SECONDS of expiry a read triggers a background
+    # refresh, so rotations are picked up without a request ever waiting on the provider. If the provider
+    # fails, the last known value is served until a refresh succeeds.
+    def __init__(self, provider: SecretsProvider, ttl_seconds: float, refresh_ahead_seconds: float):
+        self.provider = provider
+        self.ttl_seconds = ttl_seconds
+        self.refresh_ahead_seconds = refresh_ahead_seconds
+        self._entries: dict[tuple[str, bool], tuple[float, dict[str, Any] | None]] = {}
+        self._refreshing: set[tuple[str, bool]] = set()
+        self._lock = threading.Lock()
+
+    def get(self, name: str, previous: bool = False) -> dict[str, Any] | None:
+        key = (name, previous)
+        entry = self._entries.get(key)
+        if entry is None:
+            return self._fetch(key)
+        fetched_at, secret = entry
+        age = time.monotonic() - fetched_at
+        if age >= self.ttl_seconds:
+            return self._fetch(key, stale_secret=secret)
+        if age >= self.ttl_seconds - self.refresh_ahead_seconds:
+            self._refresh_in_background(key)
+        return secret
+
+    def invalidate(self, name: str | None = None):
+        with self._lock:
+            for key in list(self._entries):
+                if name is None or key[0] == name:
+                    del self._entries[key]
+
+    def _fetch(self, key: tuple[str, bool], stale_secret: dict[str, Any] | None = None) -> dict[str, Any] | None:
+        name, previous = key
+        try:
+            secret = self.provider.get_secret(name, previous=previous)
+        except Exception:
+            if key not in self._entries:
+                raise
+            logger.exception(f"Refreshing {name} secret failed, serving the cached value")
+            return stale_secret
+        with self._lock:
+            self._entries[key] = (time.monotonic(), secret)
+        return secret
+
+    def _refresh_in_background(self, key: tuple[str, bool]):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self._fetch(key, stale_secret=self._entries[key][1])
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, name=f"secrets-refresh-{key[0]}", daemon=True).start()
+
+
+def _create_provider() -> SecretsProvider:
+    if SECRETS_BACKEND == "secretsmanager":
+        return SecretsManagerProvider()
+    if SECRETS_BACKEND == "env":
+        return EnvProvider()
+    if SECRETS_BACKEND == "file":
+        return FileProvider(SECRETS_FILE)
+    if SECRETS_BACKEND == "static":
+        return StaticProvider()
+    raise ValueError(f"Unknown SECRETS_BACKEND {SECRETS_BACKEND}, expected secretsmanager, env, file or static")
+
+
+secrets_cache: SecretsCache | None = None
+
+
+def get_secrets_cache() -> SecretsCache:
+    global secrets_cache
+    if secrets_cache is None:
+        secrets_cache = SecretsCache(_create_provider(), SECRETS_CACHE_TTL_SECONDS, SECRETS_REFRESH_AHEAD_SECONDS)
+    return secrets_cache
+
+
+def set_secrets_provider(provider: SecretsProvider):
+    global secrets_cache
+    secrets_cache = SecretsCache(provider, SECRETS_CACHE_TTL_SECONDS, SECRETS_REFRESH_AHEAD_SECONDS)
+
+
+def get_secret(name: str, previous: bool = False) -> dict[str, Any] | None:
+    return get_secrets_cache().get(name, previous=previous)
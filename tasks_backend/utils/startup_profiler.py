@@ -0,0 +1,103 @@
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from tasks_backend import IMPORT_STARTED_AT
+
+logger = logging.getLogger(__name__)
+
+STARTUP_PROFILE = os.environ.get("STARTUP_PROFILE", "False").lower() == "true"
+PROFILED_PATHS = {
+    "root": "/",
+    "auth": "/auth/login",
+    "categories": "/categories",
+    "sync": "/sync",
+    "tasks": "/tasks",
+    "users": "/users",
+}
+IMPORT_TIME_PATTERN = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)$")
+
+_marks: dict[str, float] = {}
+_first_response_reported = False
+
+
+def mark(name: str):
+    _marks[name] = round((time.perf_counter() - IMPORT_STARTED_AT) * 1000, 2)
+
+
+def report_first_response():
+    global _first_response_reported
+    if not STARTUP_PROFILE or _first_response_reported:
+        return
+    mark("first_response")
+    _first_response_reported = True
+    logger.info(json.dumps({"startup_profile_ms": _marks}))
+
+
+def _api_gateway_event(path: str) -> dict:
+    return {
+        "resource": "/{proxy+}",
+        "path": path,
+        "httpMethod": "GET",
+        "headers": {"Host": "localhost"},
+        "multiValueHeaders": {"Host": ["localhost"]},
+        "queryStringParameters": None,
+        "multiValueQueryStringParameters": None,
+        "requestContext": {"resourcePath": "/{proxy+}", "httpMethod": "GET", "path": f"/Prod{path}", "stage": "Prod"},
+        "body": None,
+        "isBase64Encoded": False,
+    }
+
+
+def profile_imports(module: str = "tasks_backend.app") -> dict[str, float]:
+    completed_process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True, check=True
+    )
+    self_time_by_package: dict[str, int] = defaultdict(int)
+    for line in completed_process.stderr.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        if match:
+            self_time_us, _, _, imported_module = match.groups()
+            self_time_by_package[imported_module.split(".")[0]] += int(self_time_us)
+    return {
+        package: round(self_time_us / 1000, 2)
+        for package, self_time_us in sorted(self_time_by_package.items(), key=lambda item: item[1], reverse=True)
+    }
+
+
+def profile_first_responses() -> dict[str, dict[str, float | int]]:
+    from tasks_backend.app import lambda_handler
+
+    first_responses = {}
+    for module, path in PROFILED_PATHS.items():
+        started_at = time.perf_counter()
+        response = lambda_handler(_api_gateway_event(path), None)
+        first_responses[module] = {
+            "status_code": response["statusCode"],
+            "ms": round((time.perf_counter() - started_at) * 1000, 2),
+        }
+    return first_responses
+
+
+def main():
+    os.environ.setdefault("SCHEMA_CHECK_ON_STARTUP", "False")
+    import_times = profile_imports()
+    started_at = time.perf_counter()
+    import tasks_backend.app  # noqa: F401
+
+    app_import_ms = round((time.perf_counter() - started_at) * 1000, 2)
+    profile = {
+        "app_import_ms": app_import_ms,
+        "import_ms_by_package": dict(list(import_times.items())[:20]),
+        "first_response_by_module": profile_first_responses(),
+    }
+    print(json.dumps(profile, indent=2))
+
+
+if __name__ == "__main__":
+    main()
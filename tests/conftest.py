@@ -0,0 +1,86 @@
+import os
+import tempfile
+from collections.abc import Iterator
+from contextlib import contextmanager
+from uuid import uuid4
+
+import httpx
+import pytest
+from sqlalchemy import event
+
+# Configured before the application is imported, as its modules read their settings at import time. TEST_DB_URL
+# points the suite at another scratch database, such as a local Postgres.
+_database_dir = tempfile.mkdtemp(prefix="tasks-backend-tests-")
+os.environ["DB_URL"] = os.environ.get("TEST_DB_URL", f"sqlite:///{_database_dir}/tests.db")
+os.environ["SECRETS_BACKEND"] = "env"
+os.environ["JWT_SECRET_KEY"] = "test-jwt-secret-key-that-is-long-enough-for-hs256"
+os.environ["BCRYPT_ROUNDS"] = "4"
+os.environ["SCHEMA_CHECK_ON_STARTUP"] = "False"
+
+
+@pytest.fixture(scope="session")
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+def migrated_database():
+    from tasks_backend.db import get_engine
+    from tasks_backend.migrations import upgrade
+
+    upgrade(get_engine())
+
+
+@pytest.fixture
+async def client(migrated_database):
+    from tasks_backend.app import app
+    from tasks_backend.db import get_async_engine
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testserver/Prod") as client:
+        yield client
+    # Each test runs in its own event loop, which pooled asyncpg connections cannot outlive
+    await get_async_engine().dispose()
+
+
+async def create_user(client: httpx.AsyncClient) -> tuple[str, dict[str, str]]:
+    response = await client.post("/users", json={"email": f"{uuid4().hex}@example.com", "password": "password1"})
+    assert response.status_code == 200, response.text
+    return response.json()["id"], {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def create_categories(client: httpx.AsyncClient, headers: dict[str, str], category_count: int) -> list[str]:
+    category_ids = []
+    for number in range(category_count):
+        response = await client.post("/categories", json={"name": f"Category {number}", "colour": 0}, headers=headers)
+        assert response.status_code == 200, response.text
+        category_ids.append(response.json()["id"])
+    return category_ids
+
+
+async def create_tasks(client: httpx.AsyncClient, headers: dict[str, str], task_count: int, **fields) -> list[str]:
+    category_ids = [category["id"] for category in (await client.get("/categories", headers=headers)).json()]
+    task_creates = [
+        {"name": f"Task {number}", "category_ids": category_ids[:2], **fields} for number in range(task_count)
+    ]
+    response = await client.post("/tasks/batch", json=task_creates, headers=headers)
+    assert response.status_code == 200, response.text
+    return [result["task_id"] for result in response.json()]
+
+
+@contextmanager
+def count_statements() -> Iterator[list[str]]:
+    from tasks_backend.db import get_async_engine, get_engine
+
+    statements = []
+
+    def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engines = [get_engine(), get_async_engine().sync_engine]
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
@@ -0,0 +1,153 @@
+import anyio
+import pytest
+from fastapi import HTTPException
+
+from tasks_backend import admission
+from tasks_backend.admission import AdmissionController, MemoryAdmissionStore, Priority, SQLiteAdmissionStore
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, monkeypatch, tmp_path):
+    if request.param == "memory":
+        admission_store = MemoryAdmissionStore()
+    else:
+        admission_store = SQLiteAdmissionStore(str(tmp_path / "admission.db"))
+    monkeypatch.setattr(admission, "admission_store", admission_store)
+    return admission_store
+
+
+async def wait_until(condition):
+    with anyio.fail_after(5):
+        while not condition():
+            await anyio.sleep(0.001)
+
+
+class Holder:
+    # Holds a slot of the controller until released
+    def __init__(self, controller: AdmissionController, priority: Priority = Priority.WRITE):
+        self.controller = controller
+        self.priority = priority
+        self.admitted = False
+        self.release = anyio.Event()
+
+    async def run(self):
+        async with self.controller.admit(self.priority):
+            self.admitted = True
+            await self.release.wait()
+
+
+async def test_waiters_are_admitted_most_important_first(store):
+    controller = AdmissionController("test", limit=1, queue_limit=10, max_wait_seconds=5)
+    admitted = []
+
+    async def admit(priority: Priority):
+        async with controller.admit(priority):
+            admitted.append(priority)
+
+    holder = Holder(controller)
+    async with anyio.create_task_group() as task_group:
+        task_group.start_soon(holder.run)
+        await wait_until(lambda: holder.admitted)
+        priorities = [Priority.LIST_READ, Priority.WRITE, Priority.READ, Priority.AUTH, Priority.WRITE]
+        for queue_depth, priority in enumerate(priorities, start=1):
+            task_group.start_soon(admit, priority)
+            await wait_until(lambda queue_depth=queue_depth: len(controller._waiters) == queue_depth)
+        holder.release.set()
+    assert admitted == sorted(priorities)
+
+
+async def test_a_full_queue_evicts_its_least_important_waiter(store):
+    controller = AdmissionController("test", limit=1, queue_limit=1, max_wait_seconds=5)
+    holder = Holder(controller)
+    outcomes = {}
+
+    async def admit(priority: Priority):
+        try:
+            async with controller.admit(priority):
+                outcomes[priority] = "admitted"
+        except HTTPException as exception:
+            outcomes[priority] = exception.status_code
+
+    async with anyio.create_task_group() as task_group:
+        task_group.start_soon(holder.run)
+        await wait_until(lambda: holder.admitted)
+        task_group.start_soon(admit, Priority.LIST_READ)
+        await wait_until(lambda: len(controller._waiters) == 1)
+        task_group.start_soon(admit, Priority.AUTH)
+        await wait_until(lambda: Priority.LIST_READ in outcomes)
+        # Not more important than anything queued, so it is shed rather than queued
+        with pytest.raises(HTTPException) as shed:
+            await controller._acquire(Priority.WRITE)
+        holder.release.set()
+    assert outcomes == {Priority.LIST_READ: 503, Priority.AUTH: "admitted"}
+    assert shed.value.status_code == 503
+
+
+async def test_a_request_that_waits_too_long_is_shed(store):
+    controller = AdmissionController("test", limit=1, queue_limit=10, max_wait_seconds=0.05, shed_detail="Busy")
+    holder = Holder(controller)
+    async with anyio.create_task_group() as task_group:
+        task_group.start_soon(holder.run)
+        await wait_until(lambda: holder.admitted)
+        with pytest.raises(HTTPException) as shed:
+            async with controller.admit(Priority.AUTH):
+                pass
+        holder.release.set()
+    assert shed.value.status_code == 503
+    assert shed.value.detail == "Busy"
+    assert shed.value.headers == {"Retry-After": "1"}
+    assert controller._waiters == []
+
+
+async def test_cancelled_requests_leave_no_waiter_or_slot_behind(store):
+    controller = AdmissionController("test", limit=1, queue_limit=10, max_wait_seconds=5)
+    holder = Holder(controller)
+    async with anyio.create_task_group() as task_group:
+        task_group.start_soon(holder.run)
+        await wait_until(lambda: holder.admitted)
+        with anyio.move_on_after(0.05) as waiting:
+            async with controller.admit(Priority.AUTH):
+                pass
+        assert waiting.cancelled_caught
+        assert controller._waiters == []
+        # The holder itself is cancelled while it has the slot
+        task_group.cancel_scope.cancel()
+    with anyio.fail_after(1):
+        async with controller.admit(Priority.READ):
+            pass
+    lease_id = await store.try_acquire("test", 1)
+    assert lease_id is not None
+    await store.release("test", lease_id)
+
+
+async def test_sqlite_leases_are_renewed_while_held(monkeypatch, tmp_path):
+    path = str(tmp_path / "admission.db")
+    monkeypatch.setattr(admission, "admission_store", SQLiteAdmissionStore(path, lease_seconds=0.15))
+    controller = AdmissionController("test", limit=1, queue_limit=10, max_wait_seconds=5)
+    # Another process sharing the store, which frees any lease that has expired
+    other_process_store = SQLiteAdmissionStore(path, lease_seconds=0.15)
+    async with controller.admit(Priority.WRITE):
+        await anyio.sleep(0.4)
+        assert await other_process_store.try_acquire("test", 1) is None
+    lease_id = await other_process_store.try_acquire("test", 1)
+    assert lease_id is not None
+
+
+async def test_rate_limit_sheds_requests_over_the_burst(store, monkeypatch):
+    monkeypatch.setattr(admission, "RATE_LIMIT_PER_SECOND", 0.5)
+    monkeypatch.setattr(admission, "RATE_LIMIT_BURST", 2)
+    await admission.check_rate_limit("login:1.2.3.4")
+    await admission.check_rate_limit("login:1.2.3.4")
+    with pytest.raises(HTTPException) as limited:
+        await admission.check_rate_limit("login:1.2.3.4")
+    assert limited.value.status_code == 429
+    assert limited.value.headers == {"Retry-After": "2"}
+    # Each key has a bucket of its own
+    await admission.check_rate_limit("login:5.6.7.8")
+
+
+async def test_rate_limit_is_off_by_default(store):
+    for _ in range(100):
+        await admission.check_rate_limit("login:1.2.3.4")
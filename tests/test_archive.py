@@ -0,0 +1,133 @@
+from uuid import UUID
+
+import pytest
+from sqlalchemy import func, select
+
+from tasks_backend.archive_cli import archive
+from tasks_backend.db import get_engine
+from tasks_backend.models.archived_tasks import ArchivedTask, ArchivedTaskCategoryLink
+from tasks_backend.models.links import TaskCategoryLink
+from tasks_backend.models.tasks import TaskSort
+from tasks_backend.models.tombstones import Tombstone
+from tasks_backend.models.users import User
+from tasks_backend.purge_cli import purge
+from tasks_backend.routers import users
+from tests.conftest import create_categories, create_tasks, create_user
+from tests.test_task_pagination import read_all_pages
+
+pytestmark = pytest.mark.anyio
+
+
+def count_rows(statement) -> int:
+    with get_engine().connect() as connection:
+        return connection.execute(select(func.count()).select_from(statement.subquery())).scalar()
+
+
+async def create_archived_tasks(client, headers, task_count: int, **fields) -> list[str]:
+    task_ids = await create_tasks(client, headers, task_count, status="done", **fields)
+    # Everything done before a day from now
+    archive(after_days=-1)
+    return task_ids
+
+
+async def test_archiving_moves_done_tasks_and_their_links(client):
+    user_id, headers = await create_user(client)
+    await create_categories(client, headers, 2)
+    open_task_ids = await create_tasks(client, headers, 2)
+    sync_token = (await client.get("/sync", headers=headers)).json()["next_token"]
+    archived_task_ids = await create_archived_tasks(client, headers, 3)
+
+    listed_tasks = (await client.get("/tasks", headers=headers)).json()["items"]
+    assert {task["id"] for task in listed_tasks} == set(open_task_ids)
+    archived_ids = [UUID(task_id) for task_id in archived_task_ids]
+    assert count_rows(select(ArchivedTask.id).where(ArchivedTask.user_id == UUID(user_id))) == 3
+    assert count_rows(select(ArchivedTaskCategoryLink).where(ArchivedTaskCategoryLink.task_id.in_(archived_ids))) == 6
+    assert count_rows(select(TaskCategoryLink).where(TaskCategoryLink.task_id.in_(archived_ids))) == 0
+    # Sync clients drop archived tasks as if they had been deleted
+    changes = (await client.get("/sync", params={"since": sync_token}, headers=headers)).json()
+    assert {tombstone["entity_id"] for tombstone in changes["deleted"]} == set(archived_task_ids)
+    assert all(tombstone["entity"] == "task" for tombstone in changes["deleted"])
+    assert not {task["id"] for task in changes["tasks"]} & set(archived_task_ids)
+
+    listed_tasks = await read_all_pages(client, headers, include_archived="true")
+    archived_tasks = [task for task in listed_tasks if task["archived_at"] is not None]
+    assert {task["id"] for task in archived_tasks} == set(archived_task_ids)
+    assert all(len(task["categories"]) == 2 for task in archived_tasks)
+
+
+@pytest.mark.parametrize("sort", list(TaskSort))
+async def test_include_archived_pages_through_both_tables(client, sort):
+    _, headers = await create_user(client)
+    # Separate batches give distinct created_at values, while tasks within a batch tie on it and are ordered by id
+    for batch in range(3):
+        await create_archived_tasks(client, headers, 2, name=f"Task {batch}")
+        await create_tasks(client, headers, 2, name=f"Task {batch}")
+    params = {"sort": sort.value, "include_archived": "true"}
+    single_page = (await client.get("/tasks", params={**params, "limit": 200}, headers=headers)).json()
+    paged_tasks = await read_all_pages(client, headers, **params, limit=5)
+    assert [task["id"] for task in paged_tasks] == [task["id"] for task in single_page["items"]]
+    assert len({task["id"] for task in paged_tasks}) == 12
+    assert sum(task["archived_at"] is not None for task in paged_tasks) == 6
+    sort_keys = [(task[sort.field_name], task["id"]) for task in paged_tasks]
+    assert sort_keys == sorted(sort_keys, reverse=sort.descending)
+
+
+async def test_unarchive_restores_the_task(client):
+    _, headers = await create_user(client)
+    (task_id,) = await create_archived_tasks(client, headers, 1)
+    (archived_task,) = await read_all_pages(client, headers, include_archived="true")
+    category_ids = {category["id"] for category in archived_task["categories"]}
+    assert len(category_ids) == 2
+    assert (await client.get(f"/tasks/{task_id}", headers=headers)).status_code == 404
+    assert (await client.get("/tasks/stats", headers=headers)).json()["total"] == 0
+
+    response = await client.post(f"/tasks/{task_id}/unarchive", headers=headers)
+    assert response.status_code == 200, response.text
+    assert {category["id"] for category in response.json()["categories"]} == category_ids
+    task = (await client.get(f"/tasks/{task_id}", headers=headers)).json()
+    assert task["status"] == "done"
+    assert {category["id"] for category in task["categories"]} == category_ids
+    assert count_rows(select(ArchivedTask.id).where(ArchivedTask.id == UUID(task_id))) == 0
+    assert count_rows(select(Tombstone.id).where(Tombstone.entity_id == UUID(task_id))) == 0
+    task_stats = (await client.get("/tasks/stats", headers=headers)).json()
+    assert task_stats["total"] == 1
+    assert task_stats["by_status"]["done"] == 1
+    assert task_stats["by_category"] == {category_id: 1 for category_id in category_ids}
+
+    response = await client.post(f"/tasks/{task_id}/unarchive", headers=headers)
+    assert response.status_code == 404, response.text
+
+
+async def test_deleting_an_archived_task(client):
+    _, headers = await create_user(client)
+    await create_categories(client, headers, 2)
+    task_ids = await create_archived_tasks(client, headers, 2)
+    task_stats = (await client.get("/tasks/stats", headers=headers)).json()
+
+    response = await client.delete(f"/tasks/{task_ids[0]}", headers=headers)
+    assert response.status_code == 200, response.text
+    listed_tasks = await read_all_pages(client, headers, include_archived="true")
+    assert [task["id"] for task in listed_tasks] == [task_ids[1]]
+    assert (
+        count_rows(select(ArchivedTaskCategoryLink).where(ArchivedTaskCategoryLink.task_id == UUID(task_ids[0]))) == 0
+    )
+    assert (await client.get("/tasks/stats", headers=headers)).json() == task_stats
+    assert (await client.delete(f"/tasks/{task_ids[0]}", headers=headers)).status_code == 404
+    assert (await client.post(f"/tasks/{task_ids[0]}/unarchive", headers=headers)).status_code == 404
+
+
+async def test_purging_an_account_with_archived_tasks(client, monkeypatch):
+    user_id, headers = await create_user(client)
+    await create_categories(client, headers, 2)
+    task_ids = await create_archived_tasks(client, headers, 3)
+    await create_tasks(client, headers, 2)
+    # Scheduled for the purge job whatever its size
+    monkeypatch.setattr(users, "MAX_SYNCHRONOUS_DELETE_TASKS", 0)
+
+    response = await client.delete(f"/users/{user_id}", headers=headers)
+    assert response.status_code == 202, response.text
+    purge(batch_size=2)
+    archived_ids = [UUID(task_id) for task_id in task_ids]
+    assert count_rows(select(User.id).where(User.id == UUID(user_id))) == 0
+    assert count_rows(select(ArchivedTask.id).where(ArchivedTask.user_id == UUID(user_id))) == 0
+    assert count_rows(select(ArchivedTaskCategoryLink).where(ArchivedTaskCategoryLink.task_id.in_(archived_ids))) == 0
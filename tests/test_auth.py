@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+from tests.conftest import create_tasks, create_user
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def trusted_token_claims(monkeypatch):
+    monkeypatch.setattr("tasks_backend.auth.TRUST_TOKEN_CLAIMS", True)
+
+
+async def create_deleted_user(client) -> dict[str, str]:
+    # Returns headers with a token that is still unexpired for an account that no longer exists
+    user_id, headers = await create_user(client)
+    assert (await client.delete(f"/users/{user_id}", headers=headers)).status_code == 200
+    return headers
+
+
+async def test_import_rejects_deleted_user(client, trusted_token_claims):
+    headers = await create_deleted_user(client)
+    response = await client.post(
+        "/tasks/import", params={"format": "ndjson"}, content=json.dumps({"name": "Imported"}), headers=headers
+    )
+    assert response.status_code == 401, response.text
+
+
+async def test_restore_default_categories_rejects_deleted_user(client, trusted_token_claims):
+    headers = await create_deleted_user(client)
+    response = await client.post("/categories/restore-defaults", headers=headers)
+    assert response.status_code == 401, response.text
+
+
+async def test_delete_user_requires_the_account_owner(client):
+    user_id, headers = await create_user(client)
+    _, other_headers = await create_user(client)
+    assert (await client.delete(f"/users/{user_id}")).status_code == 401
+    assert (await client.delete(f"/users/{user_id}", headers=other_headers)).status_code == 403
+    assert (await client.get("/users", headers=headers)).status_code == 200
+    assert (await client.delete(f"/users/{user_id}", headers=headers)).status_code == 200
+
+
+async def test_writes_reject_account_scheduled_for_deletion(client, trusted_token_claims, monkeypatch):
+    monkeypatch.setattr("tasks_backend.routers.users.MAX_SYNCHRONOUS_DELETE_TASKS", 0)
+    user_id, headers = await create_user(client)
+    await create_tasks(client, headers, 1)
+    assert (await client.delete(f"/users/{user_id}", headers=headers)).status_code == 202
+    assert (await client.post("/tasks", json={"name": "Task", "category_ids": []}, headers=headers)).status_code == 401
+    assert (
+        await client.post("/categories", json={"name": "Category", "colour": 0}, headers=headers)
+    ).status_code == 401
+    assert (await client.get("/tasks/stats", headers=headers)).status_code == 401
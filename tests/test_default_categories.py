@@ -0,0 +1,69 @@
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import func, select
+
+import tasks_backend.app  # noqa: F401 - registers every model with the ORM before the mappers are configured
+from tasks_backend.db import get_engine
+from tasks_backend.models.categories import DEFAULT_COLOURS, Category, DefaultCategory
+from tasks_backend.models.users import User
+
+pytestmark = pytest.mark.anyio
+
+DEFAULT_CATEGORIES = {default_category.value: DEFAULT_COLOURS[default_category] for default_category in DefaultCategory}
+
+
+async def test_signup_creates_the_default_categories(client):
+    user_create = {"email": f"{uuid4().hex}@example.com", "password": "password1"}
+    response = await client.post("/users", json=user_create)
+    assert response.status_code == 200, response.text
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    categories = (await client.get("/categories", headers=headers)).json()
+    assert {category["name"]: category["colour"] for category in categories} == DEFAULT_CATEGORIES
+
+
+async def test_signup_with_a_taken_email_is_a_conflict(client):
+    email = f"{uuid4().hex}@example.com"
+    response = await client.post("/users", json={"email": email, "password": "password1"})
+    assert response.status_code == 200, response.text
+
+    response = await client.post("/users", json={"email": email, "password": "password2"})
+    assert response.status_code == 409, response.text
+    with get_engine().connect() as connection:
+        user_ids = connection.execute(select(User.id).where(User.email == email)).scalars().all()
+        assert len(user_ids) == 1
+        category_count = connection.execute(
+            select(func.count()).select_from(Category).where(Category.user_id == user_ids[0])
+        ).scalar()
+    assert category_count == len(DefaultCategory)
+
+
+async def test_restore_defaults_recreates_only_the_missing_defaults(client):
+    response = await client.post("/users", json={"email": f"{uuid4().hex}@example.com", "password": "password1"})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    categories = {category["name"]: category for category in (await client.get("/categories", headers=headers)).json()}
+    for name in (DefaultCategory.HOME.value, DefaultCategory.WORK.value):
+        response = await client.delete(f"/categories/{categories[name]['id']}", headers=headers)
+        assert response.status_code == 200, response.text
+    # A default the user has recoloured is left as it is
+    response = await client.patch(
+        f"/categories/{categories[DefaultCategory.HEALTH.value]['id']}", json={"colour": 0}, headers=headers
+    )
+    assert response.status_code == 200, response.text
+
+    response = await client.post("/categories/restore-defaults", headers=headers)
+    assert response.status_code == 200, response.text
+    restored = {category["name"]: category["colour"] for category in response.json()}
+    assert restored == {
+        DefaultCategory.HOME.value: DEFAULT_COLOURS[DefaultCategory.HOME],
+        DefaultCategory.WORK.value: DEFAULT_COLOURS[DefaultCategory.WORK],
+    }
+    categories = (await client.get("/categories", headers=headers)).json()
+    assert {category["name"]: category["colour"] for category in categories} == {
+        **DEFAULT_CATEGORIES,
+        DefaultCategory.HEALTH.value: 0,
+    }
+
+    response = await client.post("/categories/restore-defaults", headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json() == []
@@ -0,0 +1,49 @@
+import pytest
+
+from tests.conftest import count_statements, create_tasks, create_user
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.parametrize("path", ["/tasks", "/categories"])
+async def test_unchanged_lists_are_not_modified(client, path):
+    _, headers = await create_user(client)
+    await create_tasks(client, headers, 2)
+    response = await client.get(path, headers=headers)
+    assert response.status_code == 200, response.text
+    etag = response.headers["ETag"]
+
+    with count_statements() as statements:
+        response = await client.get(path, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304, response.text
+    assert response.headers["ETag"] == etag
+    assert response.content == b""
+    # Answered from the user's data version alone
+    assert len(statements) == 1, statements
+    assert "user_data_version" in statements[0]
+    response = await client.get(path, headers={**headers, "If-None-Match": f'W/"other", {etag}'})
+    assert response.status_code == 304, response.text
+
+
+@pytest.mark.parametrize("path", ["/tasks", "/categories"])
+async def test_a_write_changes_the_etag(client, path):
+    _, headers = await create_user(client)
+    (task_id,) = await create_tasks(client, headers, 1)
+    etag = (await client.get(path, headers=headers)).headers["ETag"]
+
+    response = await client.patch(f"/tasks/{task_id}", json={"name": "Renamed"}, headers=headers)
+    assert response.status_code == 200, response.text
+    response = await client.get(path, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200, response.text
+    assert response.headers["ETag"] != etag
+    response = await client.get(path, headers={**headers, "If-None-Match": response.headers["ETag"]})
+    assert response.status_code == 304, response.text
+
+
+async def test_etags_are_per_user(client):
+    _, headers = await create_user(client)
+    _, other_headers = await create_user(client)
+    etag = (await client.get("/tasks", headers=headers)).headers["ETag"]
+    response = await client.get("/tasks", headers={**other_headers, "If-None-Match": etag})
+    assert response.status_code == 200, response.text
+    assert response.headers["ETag"] != etag
@@ -0,0 +1,106 @@
+import csv
+import io
+import json
+import zlib
+
+import pytest
+
+from tasks_backend.exports import CSV_COLUMNS, accepts_gzip
+from tests.conftest import create_tasks, create_user
+from tests.test_archive import create_archived_tasks
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_ndjson_export_includes_archived_tasks(client):
+    _, headers = await create_user(client)
+    task_ids = await create_tasks(client, headers, 3)
+    archived_task_ids = await create_archived_tasks(client, headers, 2)
+
+    response = await client.get(
+        "/tasks/export", params={"format": "ndjson"}, headers={**headers, "Accept-Encoding": "identity"}
+    )
+    assert response.status_code == 200, response.text
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["Content-Disposition"] == 'attachment; filename="tasks.ndjson"'
+    tasks = [json.loads(line) for line in response.content.splitlines()]
+    # Tasks follow their table's, and tasks within a batch tie on created_at
+    assert {task["id"] for task in tasks[:3]} == set(task_ids)
+    assert {task["id"] for task in tasks[3:]} == set(archived_task_ids)
+    assert all(task["archived_at"] is not None for task in tasks[3:])
+    assert all(len(task["categories"]) == 2 for task in tasks)
+
+
+async def test_csv_export(client):
+    _, headers = await create_user(client)
+    task_ids = await create_tasks(client, headers, 3)
+
+    response = await client.get(
+        "/tasks/export", params={"format": "csv"}, headers={**headers, "Accept-Encoding": "identity"}
+    )
+    assert response.status_code == 200, response.text
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows[0] == CSV_COLUMNS
+    assert {row[0] for row in rows[1:]} == set(task_ids)
+    assert len(rows) == 4
+    assert all(len(row[CSV_COLUMNS.index("category_ids")].split(";")) == 2 for row in rows[1:])
+
+
+async def test_csv_export_of_no_tasks_is_just_the_header(client):
+    _, headers = await create_user(client)
+    response = await client.get(
+        "/tasks/export", params={"format": "csv"}, headers={**headers, "Accept-Encoding": "identity"}
+    )
+    assert response.status_code == 200, response.text
+    assert list(csv.reader(io.StringIO(response.text))) == [CSV_COLUMNS]
+
+
+async def test_export_is_gzipped_when_accepted(client):
+    _, headers = await create_user(client)
+    task_ids = await create_tasks(client, headers, 3)
+
+    async with client.stream(
+        "GET", "/tasks/export", params={"format": "ndjson"}, headers={**headers, "Accept-Encoding": "br, gzip;q=0.5"}
+    ) as response:
+        assert response.status_code == 200
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["Vary"]
+        body = b"".join([chunk async for chunk in response.aiter_raw()])
+    tasks = [json.loads(line) for line in zlib.decompress(body, 16 + zlib.MAX_WBITS).splitlines()]
+    assert {task["id"] for task in tasks} == set(task_ids)
+
+
+async def test_export_is_not_gzipped_when_refused(client):
+    _, headers = await create_user(client)
+    task_ids = await create_tasks(client, headers, 1)
+
+    response = await client.get(
+        "/tasks/export", params={"format": "ndjson"}, headers={**headers, "Accept-Encoding": "gzip;q=0, identity"}
+    )
+    assert response.status_code == 200, response.text
+    assert "Content-Encoding" not in response.headers
+    assert [json.loads(line)["id"] for line in response.content.splitlines()] == task_ids
+
+
+@pytest.mark.parametrize(
+    ("accept_encoding", "expected"),
+    [
+        ("", False),
+        ("identity", False),
+        ("gzip", True),
+        ("GZIP", True),
+        ("x-gzip", True),
+        ("deflate, gzip;q=1.0", True),
+        ("gzip;q=0.001", True),
+        ("gzip;q=0", False),
+        ("gzip; q=0.000", False),
+        ("gzip;q=abc", False),
+        ("*", True),
+        ("*;q=0", False),
+        ("gzip;q=0, *", False),
+        ("gzip, *;q=0", True),
+        ("br, deflate", False),
+    ],
+)
+def test_accepts_gzip(accept_encoding, expected):
+    assert accepts_gzip(accept_encoding) is expected
@@ -0,0 +1,44 @@
+import pytest
+
+from tests.conftest import count_statements, create_categories, create_tasks, create_user
+
+pytestmark = pytest.mark.anyio
+
+LIST_PATHS = [
+    "/tasks",
+    "/tasks?include=",
+    "/tasks?include=categories",
+    "/categories",
+    "/categories?include=",
+    "/categories?include=tasks",
+]
+
+
+@pytest.mark.parametrize("path", LIST_PATHS)
+async def test_list_statement_count_does_not_grow_with_rows(client, path):
+    statement_counts = []
+    for row_count in (3, 30):
+        _, headers = await create_user(client)
+        await create_categories(client, headers, row_count)
+        await create_tasks(client, headers, row_count)
+        # Loads the principal, so both measured requests find it cached
+        await client.get(path, headers=headers)
+        with count_statements() as statements:
+            response = await client.get(path, headers=headers)
+        assert response.status_code == 200, response.text
+        statement_counts.append(len(statements))
+    assert statement_counts[0] == statement_counts[1], statement_counts
+
+
+async def test_list_returns_every_row_with_its_relationships(client):
+    _, headers = await create_user(client)
+    await create_tasks(client, headers, 30)
+
+    tasks = (await client.get("/tasks", headers=headers)).json()["items"]
+    assert len(tasks) == 30
+    assert all(len(task["categories"]) == 2 for task in tasks)
+    categories = (await client.get("/categories", headers=headers)).json()
+    assert sorted(len(category["tasks"]) for category in categories) == [0, 0, 0, 30, 30]
+
+    tasks = (await client.get("/tasks?include=", headers=headers)).json()["items"]
+    assert all(task["categories"] == [] for task in tasks)
@@ -0,0 +1,18 @@
+import pytest
+
+from benchmarks.query_plans import check_query_plans
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_statements_the_app_issues_use_indexes(migrated_database):
+    from tasks_backend.db import get_async_engine
+
+    try:
+        results = await check_query_plans(users=3, tasks=200, categories=5, large_account_tasks=5000)
+    finally:
+        await get_async_engine().dispose()
+    failures = {
+        result.name: [result.statement, *result.plan, *result.problems] for result in results if result.problems
+    }
+    assert not failures, failures
@@ -0,0 +1,81 @@
+import sqlite3
+from uuid import UUID
+
+import pytest
+
+from tasks_backend import db, metrics
+from tests.conftest import create_tasks, create_user
+
+pytestmark = pytest.mark.anyio
+
+
+def read_count(target: str, reason: str) -> float:
+    counters = metrics.snapshot()["counters"]
+    labels = {"target": target, "reason": reason}
+    return sum(
+        counter["value"] for counter in counters if counter["name"] == "db_reads_total" and counter["labels"] == labels
+    )
+
+
+@pytest.fixture
+async def reader(client, monkeypatch, tmp_path):
+    if db.get_engine().dialect.name != "sqlite":
+        pytest.skip("The reader is a copy of the SQLite test database")
+    reader_path = tmp_path / "reader.db"
+    monkeypatch.setenv("READER_DB_URL", f"sqlite:///{reader_path}")
+    monkeypatch.setattr(db, "reader_db_url_loaded", False)
+    monkeypatch.setattr(db, "reader_engine", None)
+    monkeypatch.setattr(db, "async_reader_engine", None)
+
+    def replicate():
+        # What the replica has applied so far: everything the writer has committed up to now
+        with sqlite3.connect(db.get_engine().url.database) as writer, sqlite3.connect(reader_path) as replica:
+            writer.backup(replica)
+
+    yield replicate
+    if db.async_reader_engine is not None:
+        await db.async_reader_engine.dispose()
+    if db.reader_engine is not None:
+        db.reader_engine.dispose()
+
+
+async def test_reads_go_to_a_current_reader(client, reader):
+    user_id, headers = await create_user(client)
+    task_ids = await create_tasks(client, headers, 3)
+    reader()
+    db.recent_writes.pop(UUID(user_id))
+
+    reader_reads = read_count("reader", "current")
+    response = await client.get("/tasks", headers=headers)
+    assert response.status_code == 200, response.text
+    assert {task["id"] for task in response.json()["items"]} == set(task_ids)
+    assert read_count("reader", "current") == reader_reads + 1
+
+
+async def test_reads_fall_back_to_the_writer_while_the_reader_lags(client, reader):
+    user_id, headers = await create_user(client)
+    task_ids = await create_tasks(client, headers, 3)
+    reader()
+    response = await client.patch(f"/tasks/{task_ids[0]}", json={"name": "Renamed"}, headers=headers)
+    assert response.status_code == 200, response.text
+    db.recent_writes.pop(UUID(user_id))
+
+    lagging_reads = read_count("writer", "replica_lag")
+    response = await client.get(f"/tasks/{task_ids[0]}", headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["name"] == "Renamed"
+    assert read_count("writer", "replica_lag") == lagging_reads + 1
+
+
+async def test_a_user_who_just_wrote_reads_from_the_writer(client, reader):
+    _, headers = await create_user(client)
+    reader()
+    task_ids = await create_tasks(client, headers, 3)
+
+    reader_reads = read_count("reader", "current")
+    recent_write_reads = read_count("writer", "recent_write")
+    response = await client.get("/tasks", headers=headers)
+    assert response.status_code == 200, response.text
+    assert {task["id"] for task in response.json()["items"]} == set(task_ids)
+    assert read_count("writer", "recent_write") == recent_write_reads + 1
+    assert read_count("reader", "current") == reader_reads
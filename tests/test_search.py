@@ -0,0 +1,23 @@
+import pytest
+from sqlalchemy import text
+
+from tasks_backend.db import get_engine
+from tests.conftest import create_tasks, create_user
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_search_survives_renumbered_task_rowids(client):
+    if get_engine().dialect.name != "sqlite":
+        pytest.skip("Only the SQLite search index lives outside the task table")
+    _, headers = await create_user(client)
+    task_ids = await create_tasks(client, headers, 10)
+    # What VACUUM or a rebuild of the task table may do
+    with get_engine().begin() as connection:
+        connection.execute(text("UPDATE task SET rowid = rowid + 1000000"))
+    response = await client.get("/tasks/search", params={"q": "Task 7"}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["items"][0]["id"] == task_ids[7]
+    assert (await client.patch(f"/tasks/{task_ids[7]}", json={"name": "Renamed"}, headers=headers)).status_code == 200
+    response = await client.get("/tasks/search", params={"q": "Renamed"}, headers=headers)
+    assert [task["id"] for task in response.json()["items"]] == [task_ids[7]]
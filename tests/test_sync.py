@@ -0,0 +1,76 @@
+from datetime import timedelta
+
+import pytest
+
+from tasks_backend.models.tombstones import TOMBSTONE_RETENTION_DAYS
+from tasks_backend.utils.pagination import encode_cursor
+from tasks_backend.utils.utils import get_current_utc_time
+from tests.conftest import create_tasks, create_user
+
+pytestmark = pytest.mark.anyio
+
+
+async def sync_pages(client, headers, since=None, limit=None) -> tuple[list[dict], str]:
+    pages = []
+    while True:
+        params = {key: value for key, value in {"since": since, "limit": limit}.items() if value is not None}
+        response = await client.get("/sync", params=params, headers=headers)
+        assert response.status_code == 200, response.text
+        pages.append(response.json())
+        since = pages[-1]["next_token"]
+        if not pages[-1]["has_more"]:
+            return pages, since
+
+
+async def test_full_sync_is_paged(client):
+    _, headers = await create_user(client)
+    task_ids = await create_tasks(client, headers, 12)
+    pages, _ = await sync_pages(client, headers, limit=4)
+    # 5 default categories and 12 tasks in pages of 4
+    assert [len(page["categories"]) + len(page["tasks"]) for page in pages] == [4, 4, 4, 4, 1]
+    assert sorted(task["id"] for page in pages for task in page["tasks"]) == sorted(task_ids)
+    assert len({category["id"] for page in pages for category in page["categories"]}) == 5
+
+
+async def test_incremental_sync_after_paged_sync(client):
+    _, headers = await create_user(client)
+    task_ids = await create_tasks(client, headers, 6)
+    _, token = await sync_pages(client, headers, limit=4)
+    assert (await client.delete(f"/tasks/{task_ids[0]}", headers=headers)).status_code == 200
+    pages, _ = await sync_pages(client, headers, since=token, limit=2)
+    deleted_ids = [tombstone["entity_id"] for page in pages for tombstone in page["deleted"]]
+    assert deleted_ids == [task_ids[0]]
+
+
+async def test_expired_sync_token_requires_full_sync(client):
+    _, headers = await create_user(client)
+    synced_at = get_current_utc_time() - timedelta(days=TOMBSTONE_RETENTION_DAYS + 1)
+    response = await client.get("/sync", params={"since": encode_cursor("sync", synced_at)}, headers=headers)
+    assert response.status_code == 410, response.text
+
+
+@pytest.mark.parametrize(
+    "since",
+    [
+        "not a token",
+        encode_cursor("sync"),
+        encode_cursor("sync", 5),
+        encode_cursor("sync", "not a time"),
+        encode_cursor("sync-page", "2026-01-01T00:00:00+00:00", None, 5, None, None),
+        encode_cursor("sync-page", "2026-01-01T00:00:00+00:00", None, True, None, None),
+        encode_cursor("sync-page", "2026-01-01T00:00:00+00:00", None, 1, "2026-01-01T00:00:00+00:00", 5),
+        encode_cursor("sync-page", "2026-01-01T00:00:00+00:00", None, 1, 5, "00000000-0000-0000-0000-000000000000"),
+        encode_cursor("sync-page", 5, None, 1, None, None),
+    ],
+)
+async def test_malformed_sync_token_is_rejected(client, since):
+    _, headers = await create_user(client)
+    response = await client.get("/sync", params={"since": since}, headers=headers)
+    assert response.status_code == 400, response.text
+
+
+async def test_sync_token_without_time_zone_is_read_as_utc(client):
+    _, headers = await create_user(client)
+    synced_at = get_current_utc_time().replace(tzinfo=None)
+    response = await client.get("/sync", params={"since": encode_cursor("sync", synced_at)}, headers=headers)
+    assert response.status_code == 200, response.text
@@ -0,0 +1,97 @@
+import pytest
+
+from tests.conftest import create_categories, create_tasks, create_user
+
+pytestmark = pytest.mark.anyio
+
+MISSING_TASK_ID = "00000000-0000-0000-0000-000000000000"
+
+
+async def test_batch_create_returns_a_result_per_task(client):
+    _, headers = await create_user(client)
+    category_ids = await create_categories(client, headers, 2)
+    _, other_headers = await create_user(client)
+    (other_category_id,) = await create_categories(client, other_headers, 1)
+    task_creates = [
+        {"name": "First task", "category_ids": category_ids},
+        {"name": "Second task", "category_ids": [category_ids[0], category_ids[0]]},
+        # Categories the user does not own are left off
+        {"name": "Third task", "category_ids": [other_category_id], "status": "done"},
+    ]
+
+    response = await client.post("/tasks/batch", json=task_creates, headers=headers)
+    assert response.status_code == 200, response.text
+    results = response.json()
+    assert [result["index"] for result in results] == [0, 1, 2]
+    assert all(result["status_code"] == 201 for result in results)
+    assert [result["task"]["name"] for result in results] == ["First task", "Second task", "Third task"]
+    assert [len(result["task"]["categories"]) for result in results] == [2, 1, 0]
+    for result in results:
+        task = (await client.get(f"/tasks/{result['task_id']}", headers=headers)).json()
+        assert (task["name"], task["status"]) == (result["task"]["name"], result["task"]["status"])
+        assert {category["id"] for category in task["categories"]} == {
+            category["id"] for category in result["task"]["categories"]
+        }
+    assert (await client.get("/tasks/stats", headers=headers)).json()["total"] == 3
+
+
+async def test_batch_create_rejects_the_whole_batch_if_any_task_is_invalid(client):
+    _, headers = await create_user(client)
+    task_creates = [{"name": "Valid task", "category_ids": []}, {"name": "x", "category_ids": []}]
+    response = await client.post("/tasks/batch", json=task_creates, headers=headers)
+    assert response.status_code == 422, response.text
+    assert (await client.get("/tasks", headers=headers)).json()["items"] == []
+
+
+async def test_batch_update_returns_a_result_per_task(client):
+    _, headers = await create_user(client)
+    task_ids = await create_tasks(client, headers, 2)
+    _, other_headers = await create_user(client)
+    (other_task_id,) = await create_tasks(client, other_headers, 1)
+    task_updates = [
+        {"id": task_ids[0], "status": "done"},
+        {"id": MISSING_TASK_ID, "status": "done"},
+        {"id": other_task_id, "status": "done"},
+        {"id": task_ids[1], "name": "Renamed", "category_ids": []},
+    ]
+
+    response = await client.patch("/tasks/batch", json=task_updates, headers=headers)
+    assert response.status_code == 200, response.text
+    results = response.json()
+    assert [(result["index"], result["task_id"], result["status_code"]) for result in results] == [
+        (0, task_ids[0], 200),
+        (1, MISSING_TASK_ID, 404),
+        (2, other_task_id, 404),
+        (3, task_ids[1], 200),
+    ]
+    assert results[0]["task"]["status"] == "done"
+    # An empty category list leaves the task's categories as they are, as in PATCH /tasks/{task_id}
+    assert results[3]["task"]["name"] == "Renamed"
+    assert len(results[3]["task"]["categories"]) == 2
+    assert results[1]["task"] is None
+    assert results[1]["detail"] == "Task not found"
+    assert (await client.get(f"/tasks/{other_task_id}", headers=other_headers)).json()["status"] == "not_started"
+    task_stats = (await client.get("/tasks/stats", headers=headers)).json()
+    assert task_stats["by_status"]["done"] == 1
+
+
+async def test_batch_delete_returns_a_result_per_task(client):
+    _, headers = await create_user(client)
+    task_ids = await create_tasks(client, headers, 3)
+    _, other_headers = await create_user(client)
+    (other_task_id,) = await create_tasks(client, other_headers, 1)
+
+    response = await client.request(
+        "DELETE", "/tasks/batch", json=[task_ids[0], MISSING_TASK_ID, other_task_id, task_ids[2]], headers=headers
+    )
+    assert response.status_code == 200, response.text
+    assert [(result["index"], result["task_id"], result["status_code"]) for result in response.json()] == [
+        (0, task_ids[0], 200),
+        (1, MISSING_TASK_ID, 404),
+        (2, other_task_id, 404),
+        (3, task_ids[2], 200),
+    ]
+    remaining_tasks = (await client.get("/tasks", headers=headers)).json()["items"]
+    assert [task["id"] for task in remaining_tasks] == [task_ids[1]]
+    assert (await client.get(f"/tasks/{other_task_id}", headers=other_headers)).status_code == 200
+    assert (await client.get("/tasks/stats", headers=headers)).json()["total"] == 1
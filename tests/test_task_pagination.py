@@ -0,0 +1,84 @@
+import pytest
+
+from tasks_backend.models.tasks import TaskSort
+from tasks_backend.utils.pagination import encode_cursor
+from tests.conftest import create_tasks, create_user
+
+pytestmark = pytest.mark.anyio
+
+
+async def read_all_pages(client, headers, **params) -> list[dict]:
+    tasks = []
+    cursor = None
+    while True:
+        page_params = {**params, "cursor": cursor} if cursor else params
+        response = await client.get("/tasks", params=page_params, headers=headers)
+        assert response.status_code == 200, response.text
+        tasks.extend(response.json()["items"])
+        cursor = response.json()["next_cursor"]
+        if cursor is None:
+            return tasks
+
+
+@pytest.mark.parametrize("sort", list(TaskSort))
+async def test_cursor_round_trip(client, sort):
+    _, headers = await create_user(client)
+    # Separate batches give distinct created_at values, while tasks within a batch tie on it and are ordered by id
+    for batch in range(3):
+        await create_tasks(client, headers, 3, name=f"Task {batch}")
+    single_page = (await client.get("/tasks", params={"sort": sort.value, "limit": 200}, headers=headers)).json()
+    paged_tasks = await read_all_pages(client, headers, sort=sort.value, limit=2)
+    assert [task["id"] for task in paged_tasks] == [task["id"] for task in single_page["items"]]
+    assert len({task["id"] for task in paged_tasks}) == 9
+    sort_keys = [(task[sort.field_name], task["id"]) for task in paged_tasks]
+    assert sort_keys == sorted(sort_keys, reverse=sort.descending)
+
+
+async def test_cursor_for_another_sort_is_rejected(client):
+    _, headers = await create_user(client)
+    await create_tasks(client, headers, 3)
+    cursor = (await client.get("/tasks", params={"sort": "name", "limit": 1}, headers=headers)).json()["next_cursor"]
+    response = await client.get("/tasks", params={"sort": "-name", "cursor": cursor}, headers=headers)
+    assert response.status_code == 400, response.text
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not a cursor",
+        encode_cursor("created_at"),
+        encode_cursor("created_at", "not a date", "00000000-0000-0000-0000-000000000000"),
+        encode_cursor("created_at", "2026-01-01T00:00:00+00:00", 5),
+        encode_cursor("created_at", 5, "00000000-0000-0000-0000-000000000000"),
+        encode_cursor("created_at", "2026-01-01T00:00:00+00:00", "not a uuid"),
+    ],
+)
+async def test_malformed_cursor_is_rejected(client, cursor):
+    _, headers = await create_user(client)
+    response = await client.get("/tasks", params={"cursor": cursor}, headers=headers)
+    assert response.status_code == 400, response.text
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+async def test_filters(client):
+    _, headers = await create_user(client)
+    category_ids = [category["id"] for category in (await client.get("/categories", headers=headers)).json()]
+    task_creates = [
+        {"name": "Done early", "status": "done", "due_date": "2026-01-05", "category_ids": [category_ids[0]]},
+        {"name": "Open early", "due_date": "2026-01-10", "category_ids": [category_ids[1]]},
+        {"name": "Open late", "due_date": "2026-02-01", "category_ids": [category_ids[0], category_ids[1]]},
+        {"name": "No due date", "category_ids": []},
+    ]
+    response = await client.post("/tasks/batch", json=task_creates, headers=headers)
+    assert response.status_code == 200, response.text
+
+    async def names(**params) -> list[str]:
+        return sorted(task["name"] for task in await read_all_pages(client, headers, limit=1, **params))
+
+    assert await names(status="done") == ["Done early"]
+    assert await names(status="not_started") == ["No due date", "Open early", "Open late"]
+    assert await names(due_from="2026-01-06") == ["Open early", "Open late"]
+    assert await names(due_to="2026-01-10") == ["Done early", "Open early"]
+    assert await names(due_from="2026-01-06", due_to="2026-01-31") == ["Open early"]
+    assert await names(category_id=category_ids[0]) == ["Done early", "Open late"]
+    assert await names(category_id=category_ids[1], status="not_started") == ["Open early", "Open late"]
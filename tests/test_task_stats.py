@@ -0,0 +1,30 @@
+from uuid import UUID
+
+import pytest
+from sqlalchemy import delete, select
+
+from tasks_backend.archive_cli import archive
+from tasks_backend.db import get_engine
+from tasks_backend.models.task_stats import TaskStats
+from tests.conftest import create_categories, create_tasks, create_user
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_archiving_adjusts_task_stats(client):
+    user_id, headers = await create_user(client)
+    await create_categories(client, headers, 2)
+    await create_tasks(client, headers, 3, status="done")
+    await create_tasks(client, headers, 2)
+    assert (await client.get("/tasks/stats", headers=headers)).json()["total"] == 5
+    # Everything done before a day from now
+    archive(after_days=-1)
+    with get_engine().connect() as connection:
+        assert connection.execute(select(TaskStats.total).where(TaskStats.user_id == UUID(user_id))).scalar() == 2
+    task_stats = (await client.get("/tasks/stats", headers=headers)).json()
+    assert task_stats["total"] == 2
+    assert task_stats["by_status"]["done"] == 0
+    # The adjusted stats match a recount from the tasks left
+    with get_engine().begin() as connection:
+        connection.execute(delete(TaskStats).where(TaskStats.user_id == UUID(user_id)))
+    assert (await client.get("/tasks/stats", headers=headers)).json() == task_stats